@@ -0,0 +1,316 @@
+import asyncio
+import concurrent.futures
+import csv
+import io
+import itertools
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pandas as pd
+import config
+from checkpoint import clear_pending_export, save_checkpoint
+from export_cache import get_export_cache
+from instrumentation import stage
+from json_export import read_json_chunks
+from logger import setup_logger
+from bigquery_uploader import StagedLoad
+from pipeline import (abort_staged, await_export, commit_staged, start_export, start_rollups, upload_rollups,
+                      upload_validated)
+from qualtrics_api import iter_export_file, read_csv_chunks
+from schema_drift import check_header_rows
+from schema_registry import TransformPlan
+from transformer import clean_dataframe
+
+log = setup_logger()
+
+# End-of-stream marker on every queue
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a worker thread once another stage of the run has failed."""
+
+
+class _Bridge:
+    """Lets worker threads put to and get from asyncio queues.
+
+    A full queue blocks the producing thread (backpressure all the way back to
+    the socket); once the run is cancelled every blocked thread gives up.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.cancelled = threading.Event()
+
+    def _wait(self, coro) -> Any:
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                if self.cancelled.is_set():
+                    future.cancel()
+                    raise PipelineCancelled()
+
+    def put(self, queue: asyncio.Queue, item: Any) -> None:
+        if self.cancelled.is_set():
+            raise PipelineCancelled()
+        self._wait(queue.put(item))
+
+    def get(self, queue: asyncio.Queue) -> Any:
+        return self._wait(queue.get())
+
+
+class _ZipMemberStream(io.RawIOBase):
+    """The first member of a ZIP, inflated as its compressed bytes arrive.
+
+    Reads the local file header instead of the central directory (which sits
+    at the end of the archive), so parsing can start with the first block.
+    The inflated bytes are checked against the member's CRC-32 and size at
+    its end, as zipfile does.
+    """
+
+    def __init__(self, next_block: Callable[[], Optional[bytes]]):
+        self._next_block = next_block
+        self._exhausted = False
+        self._compressed = b""
+        self._inflater = None
+        self._out = b""
+        self._pos = 0
+        self._expected_crc: Optional[int] = None
+        self._expected_size: Optional[int] = None
+        self._crc = 0
+        self._size = 0
+        self._verified = False
+
+    def _pull(self) -> bytes:
+        block = None if self._exhausted else self._next_block()
+        if block is None:
+            self._exhausted = True
+            raise EOFError("Export stream ended inside the ZIP member")
+        return block
+
+    def _start(self) -> None:
+        while len(self._compressed) < 30:
+            self._compressed += self._pull()
+        signature, _, flags, method, _, _, crc, _, size, name_len, extra_len = struct.unpack(
+            "<4sHHHHHIIIHH", self._compressed[:30]
+        )
+        if signature != b"PK\x03\x04" or method != zipfile.ZIP_DEFLATED:
+            raise ValueError("Export is not a deflated ZIP; it can't be parsed while downloading")
+        if not flags & 0x08:
+            # Otherwise they follow the member, in its data descriptor
+            self._expected_crc = crc
+            self._expected_size = None if size == 0xFFFFFFFF else size
+        while len(self._compressed) < 30 + name_len + extra_len:
+            self._compressed += self._pull()
+        self._compressed = self._compressed[30 + name_len + extra_len:]
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._inflater is None:
+            self._start()
+        while self._pos == len(self._out):
+            if self._inflater.eof:
+                if not self._verified:
+                    self._verify()
+                return 0
+            data = self._compressed or self._pull()
+            # Inflate at most 1 MiB at a time so a highly compressed block can't balloon memory
+            self._out, self._pos = self._inflater.decompress(data, 1 << 20), 0
+            self._compressed = self._inflater.unconsumed_tail
+            self._crc = zlib.crc32(self._out, self._crc)
+            self._size += len(self._out)
+        n = min(len(buffer), len(self._out) - self._pos)
+        buffer[:n] = self._out[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def _verify(self) -> None:
+        """Check the inflated member against the CRC-32 and size the archive records for it."""
+        self._verified = True
+        crc, size = self._expected_crc, self._expected_size
+        if crc is None:
+            trailer = self._inflater.unused_data
+            while len(trailer) < 16 and not self._exhausted:
+                block = self._next_block()
+                if block is None:
+                    self._exhausted = True
+                else:
+                    trailer += block
+            if trailer[:4] == b"PK\x07\x08":
+                trailer = trailer[4:]
+            if len(trailer) < 4:
+                raise zipfile.BadZipFile("Export ZIP ended before its data descriptor")
+            # Sizes in a descriptor may be 4 or 8 bytes wide; the CRC always comes first
+            crc = struct.unpack("<I", trailer[:4])[0]
+        if crc != self._crc or (size is not None and size != self._size & 0xFFFFFFFF):
+            raise zipfile.BadZipFile(f"Export member failed its integrity check "
+                                     f"(CRC-32 {self._crc:08x}, expected {crc:08x}; {self._size:,} bytes)")
+
+    def unread(self, data: bytes) -> None:
+        self._out, self._pos = data + self._out[self._pos:], 0
+
+    def drain(self) -> None:
+        """Consume the rest of the archive (data descriptor, central directory) so the producer can finish."""
+        while not self._exhausted:
+            if self._next_block() is None:
+                self._exhausted = True
+
+
+def _read_header_rows(stream: _ZipMemberStream, n_rows: int = 3) -> Tuple[List[List[str]], bytes]:
+    """Read just enough of the CSV to hold its first n_rows records; returns them and the bytes read."""
+    prefix = b""
+    while True:
+        chunk = stream.read(1 << 16)
+        prefix += chunk
+        try:
+            text = prefix.decode("utf-8-sig", errors="replace")
+            rows = list(itertools.islice(csv.reader(io.StringIO(text, newline="")), n_rows + 1))
+        except csv.Error:
+            rows = []
+        # One row more than needed guarantees the first n_rows are complete
+        if len(rows) > n_rows or not chunk:
+            return rows[:n_rows], prefix
+
+
+def _download(bridge: _Bridge, blocks: asyncio.Queue, survey_id: str, file_id: Optional[str],
+              source: Optional[io.BufferedIOBase], spool: Optional[io.BufferedIOBase]) -> None:
+    """Push the export ZIP onto `blocks` as it arrives, from Qualtrics or an already cached file."""
+    with stage("download", survey_id=survey_id) as record:
+        size = 0
+        if source is not None:
+            for block in iter(lambda: source.read(1 << 20), b""):
+                bridge.put(blocks, block)
+                size += len(block)
+        else:
+            # Dropped connections are resumed where they stopped, so the parser never sees a gap
+            for block in iter_export_file(survey_id, file_id):
+                if spool is not None:
+                    spool.write(block)
+                bridge.put(blocks, block)
+                size += len(block)
+        record["bytes"] = size
+    bridge.put(blocks, _DONE)
+    log.info(f"Downloaded export file ({size:,} bytes)")
+
+
+def _parse_and_clean(bridge: _Bridge, blocks: asyncio.Queue, frames: asyncio.Queue,
+                     survey_id: str, plan: TransformPlan) -> None:
+    """Inflate, pre-flight, parse and clean the export chunk by chunk as blocks arrive."""
+    def next_block() -> Optional[bytes]:
+        block = bridge.get(blocks)
+        return None if block is _DONE else block
+
+    stream = _ZipMemberStream(next_block)
+    if config.EXPORT_FORMAT == "csv":
+        header_rows, prefix = _read_header_rows(stream)
+        stream.unread(prefix)
+        plan = check_header_rows(survey_id, header_rows, plan)
+        chunks = read_csv_chunks(io.BufferedReader(stream, 1 << 20), header_rows[0], config.STREAM_CHUNK_ROWS, plan)
+    else:
+        chunks = read_json_chunks(io.BufferedReader(stream, 1 << 20), config.STREAM_CHUNK_ROWS, plan,
+                                  config.EXPORT_FORMAT)
+    for chunk in chunks:
+        bridge.put(frames, (plan, clean_dataframe(chunk, plan, has_header_rows=False)))
+    stream.drain()
+    bridge.put(frames, _DONE)
+
+
+async def _upload(frames: asyncio.Queue, survey_id: str, destinations: List[Dict[str, str]],
+                  load_id: str) -> Optional[pd.Timestamp]:
+    """Load cleaned chunks as they arrive; the next chunks are parsed while a load job runs.
+
+    Chunks are staged and only written to the targets once the last one has
+    loaded, as in load_streaming_export.
+    """
+    last_recorded, total_rows, rollups, staged = None, 0, None, StagedLoad()
+    try:
+        while (item := await frames.get()) is not _DONE:
+            plan, frame = item
+            if not total_rows:
+                rollups = start_rollups(survey_id, plan)
+            chunk_max = frame["recorded_date"].max()
+            await asyncio.to_thread(upload_validated, survey_id, frame, plan, destinations, rollups, staged)
+            total_rows += len(frame)
+            if pd.notnull(chunk_max) and (last_recorded is None or chunk_max > last_recorded):
+                last_recorded = chunk_max
+            log.info(f"✅ [{survey_id}] Staged chunk of {len(frame):,} rows ({total_rows:,} total)")
+    except BaseException:
+        await asyncio.to_thread(abort_staged, survey_id, staged)
+        raise
+    await asyncio.to_thread(commit_staged, survey_id, staged)
+    if not total_rows:
+        log.info(f"[{survey_id}] No new responses in export; skipping upload.")
+    await asyncio.to_thread(upload_rollups, survey_id, rollups, destinations, load_id)
+    return last_recorded
+
+
+async def run_survey_async(survey_id: str, plan: TransformPlan, destinations: List[Dict[str, str]],
+                           export: Optional[Dict[str, Any]] = None) -> None:
+    """run_survey with download, parse/clean and upload overlapped.
+
+    The three stages run concurrently, joined by queues of at most
+    ASYNC_QUEUE_DEPTH items: blocking network reads and pandas work run in
+    worker threads, load jobs are awaited in a thread too. A slow stage stalls
+    the ones before it instead of buffering the export in memory, and a failure
+    in any stage cancels the others before the error is raised.
+    """
+    if export is None:
+        export = await asyncio.to_thread(start_export, survey_id, plan)
+    cache = get_export_cache()
+    source = spool = None
+    if export["progress_id"] is None:
+        source, meta = cache.open_export(export["cache_key"])
+        export_result = meta["result"]
+    else:
+        export_result = await asyncio.to_thread(await_export, survey_id, export)
+        if cache and config.INCREMENTAL_EXPORT:
+            # Full exports are never served from the cache, so there is nothing to keep them for
+            spool = tempfile.SpooledTemporaryFile(max_size=config.SPOOL_MAX_BYTES)
+
+    bridge = _Bridge(asyncio.get_running_loop())
+    blocks = asyncio.Queue(config.ASYNC_QUEUE_DEPTH)
+    frames = asyncio.Queue(config.ASYNC_QUEUE_DEPTH)
+    tasks = [
+        asyncio.create_task(asyncio.to_thread(
+            _download, bridge, blocks, survey_id, export_result.get("fileId"), source, spool)),
+        asyncio.create_task(asyncio.to_thread(_parse_and_clean, bridge, blocks, frames, survey_id, plan)),
+        asyncio.create_task(_upload(frames, survey_id, destinations, export["request_key"])),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+        last_recorded = tasks[2].result()
+    except BaseException:
+        log.error(f"❌ [{survey_id}] Async pipeline failed; cancelling remaining stages")
+        if spool is not None:
+            spool.close()
+        raise
+    finally:
+        bridge.cancelled.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if source is not None:
+            source.close()
+
+    if spool is not None:
+        spool.seek(0)
+        zip_file, _ = cache.put_export(export["cache_key"], spool, export_result)
+        zip_file.close()
+    if config.INCREMENTAL_EXPORT:
+        save_checkpoint(
+            config.CHECKPOINT_PATH,
+            survey_id,
+            export_result.get("continuationToken"),
+            last_recorded.strftime("%Y-%m-%dT%H:%M:%SZ") if pd.notnull(last_recorded) else None
+        )
+    clear_pending_export(config.CHECKPOINT_PATH, survey_id)
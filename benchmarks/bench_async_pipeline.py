@@ -0,0 +1,84 @@
+"""End-to-end latency of the sync pipeline vs the async runner against local fakes.
+
+benchmarks.fake_qualtrics serves the export ZIP at a throttled rate. The
+BigQuery sink serializes each chunk to Parquet and then sleeps for a
+simulated load job. Export generation is instant, so the runs differ only in
+how download, parse/clean and upload overlap. A final run makes the sink fail
+and reports how quickly the async runner cancels the rest.
+
+Usage: python -m benchmarks.bench_async_pipeline [n_rows] [mbit_per_s] [load_latency_s]
+"""
+import asyncio
+import io
+import logging
+import sys
+import threading
+import time
+import config
+import pipeline
+import async_pipeline
+from bigquery_uploader import write_parquet
+from schema_registry import default_plan
+from benchmarks.fake_qualtrics import FakeQualtrics
+
+
+def install_fakes(load_latency: float, fail_on_chunk: int = 0) -> list:
+    uploads = []
+    pipeline.initiate_export = lambda survey_id, payload: f"ES_{survey_id}"
+    wait = lambda survey_id, progress_id: {"fileId": f"F_{survey_id}", "status": "complete"}
+    pipeline.wait_for_export = wait
+
+    def fake_bigquery(df, destinations, **kwargs):
+        uploads.append(len(df))
+        if fail_on_chunk and len(uploads) == fail_on_chunk:
+            raise RuntimeError("simulated load job failure")
+        write_parquet(df, io.BytesIO(), kwargs.get("label_columns", ()))
+        time.sleep(load_latency)
+
+    pipeline.upload_to_destinations = fake_bigquery
+    return uploads
+
+
+def timed(label: str, fn) -> float:
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    print(f"{label:<22} {seconds:6.2f}s")
+    return seconds
+
+
+def main(n_rows: int, mbit_per_s: float, load_latency: float) -> None:
+    logging.disable(logging.INFO)
+    fake = FakeQualtrics(n_rows, bytes_per_second=mbit_per_s * 1e6 / 8).start()
+    config.QUALTRICS_BASE_URL = fake.base_url
+    plan, destinations = default_plan(), [{"table_id": "bench"}]
+    config.STREAM_CHUNK_ROWS = async_pipeline.config.STREAM_CHUNK_ROWS = max(n_rows // 8, 1)
+    print(f"rows={n_rows:,} zip={len(fake.export_zip()) / 1e6:.1f} MB link={mbit_per_s} Mbit/s "
+          f"load_latency={load_latency}s chunk={config.STREAM_CHUNK_ROWS:,} rows")
+
+    install_fakes(load_latency)
+    config.STREAMING_EXPORT = False
+    full = timed("sync (full)", lambda: pipeline.run_survey("SV_bench", plan, destinations))
+    config.STREAMING_EXPORT = True
+    streaming = timed("sync (streaming)", lambda: pipeline.run_survey("SV_bench", plan, destinations))
+    uploads = install_fakes(load_latency)
+    overlapped = timed("async", lambda: asyncio.run(async_pipeline.run_survey_async("SV_bench", plan, destinations)))
+    assert sum(uploads) == n_rows, uploads
+    assert overlapped < min(full, streaming), "async runner should beat both sync modes end to end"
+    print(f"async is {min(full, streaming) / overlapped:.2f}x faster than the best sync mode")
+
+    install_fakes(load_latency, fail_on_chunk=2)
+    threads_before = threading.active_count()
+    start = time.perf_counter()
+    try:
+        asyncio.run(async_pipeline.run_survey_async("SV_bench", plan, destinations))
+    except RuntimeError as e:
+        print(f"failure on chunk 2 ({e}) raised after {time.perf_counter() - start:.2f}s")
+    time.sleep(0.5)
+    print(f"worker threads left running: {max(threading.active_count() - threads_before, 0)}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200_000, float(args[1]) if len(args) > 1 else 40.0,
+         float(args[2]) if len(args) > 2 else 0.5)
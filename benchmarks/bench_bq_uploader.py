@@ -0,0 +1,118 @@
+"""Per-call BigQuery clients vs the shared uploader, offline.
+
+Loads several cleaned chunks into several destination tables. The service
+account key files are real (freshly generated RSA keys), so parsing them and
+building clients costs what it does in production; the network is faked:
+fetching an access token, creating a table and running a load job each sleep
+for a round trip, and the load job reads the Parquet payload it was given.
+
+Usage: python -m benchmarks.bench_bq_uploader [n_chunks] [n_destinations] [load_latency_s]
+"""
+import datetime
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.cloud import bigquery
+import bigquery_uploader
+from bigquery_uploader import BigQueryUploader
+from schema_registry import default_plan
+from transformer import clean_dataframe
+from benchmarks.synthetic_export import make_raw_export
+
+TOKEN_LATENCY = 0.3
+RPC_LATENCY = 0.1
+
+
+def write_key_file(directory: str, project_id: str) -> str:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode()
+    path = os.path.join(directory, f"{project_id}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "type": "service_account", "project_id": project_id, "private_key_id": "bench",
+            "private_key": pem, "client_email": f"loader@{project_id}.iam.gserviceaccount.com",
+            "client_id": "1", "token_uri": "https://oauth2.googleapis.com/token",
+        }, f)
+    return path
+
+
+def install_fake_network(load_latency: float) -> list:
+    loads = []
+
+    def authorize(client):
+        # What the client's authorized session does before its first request and after expiry
+        if not client._credentials.valid:
+            time.sleep(TOKEN_LATENCY)
+            client._credentials.token = "bench-token"
+            client._credentials.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    class FakeJob:
+        def result(self):
+            time.sleep(load_latency)
+
+    def load_table_from_file(client, file_obj, destination, job_config=None):
+        authorize(client)
+        loads.append((destination, len(file_obj.read())))
+        return FakeJob()
+
+    def create_table(client, table, exists_ok=False):
+        authorize(client)
+        time.sleep(RPC_LATENCY)
+
+    bigquery.Client.load_table_from_file = load_table_from_file
+    bigquery.Client.create_table = create_table
+    return loads
+
+
+def per_call(chunks, destinations) -> None:
+    # Old behaviour: every upload builds its own credentials and client and serializes again
+    for chunk in chunks:
+        for d in destinations:
+            BigQueryUploader().upload(chunk, [d])
+
+
+def shared(chunks, destinations) -> None:
+    uploader = BigQueryUploader()
+    for chunk in chunks:
+        uploader.upload(chunk, destinations)
+
+
+def main(n_chunks: int, n_destinations: int, load_latency: float) -> None:
+    logging.disable(logging.INFO)
+    bigquery_uploader.config.BQ_LOCAL_PARQUET_DIR = None
+    plan = default_plan()
+    chunks = [clean_dataframe(make_raw_export(25_000, seed=i), plan) for i in range(n_chunks)]
+    with tempfile.TemporaryDirectory() as tmp:
+        destinations = []
+        for i in range(n_destinations):
+            project_id = f"bench-project-{i}"
+            destinations.append({"project_id": project_id, "dataset_id": "surveys", "table_id": "responses",
+                                 "credentials_path": write_key_file(tmp, project_id)})
+        print(f"chunks={n_chunks} x 25,000 rows, destinations={n_destinations}, load_latency={load_latency}s, "
+              f"token={TOKEN_LATENCY}s, rpc={RPC_LATENCY}s")
+
+        timings = {}
+        for name, fn in (("per-call clients", per_call), ("shared uploader", shared)):
+            loads = install_fake_network(load_latency)
+            start = time.perf_counter()
+            fn(chunks, destinations)
+            timings[name] = time.perf_counter() - start
+            assert len(loads) == n_chunks * n_destinations, loads
+            assert len({size for _, size in loads[:n_destinations]}) == 1, "every table should get the same payload"
+            print(f"{name:<18} {timings[name]:6.2f}s")
+
+    speedup = timings["per-call clients"] / timings["shared uploader"]
+    print(f"shared uploader is {speedup:.2f}x faster")
+    assert speedup > 1
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 8, int(args[1]) if len(args) > 1 else 2,
+         float(args[2]) if len(args) > 2 else 0.5)
@@ -0,0 +1,43 @@
+"""Memory footprint of the default cleaned frame vs the compact typed output.
+
+Also checks that both hold the same values: labels compare as strings, and
+'nan' strings in the default output correspond to missing compact strings.
+
+Usage: python -m benchmarks.bench_compact [n_rows]
+"""
+import sys
+import pandas as pd
+from schema_registry import default_plan
+from transformer import clean_dataframe
+from benchmarks.synthetic_export import make_raw_export
+
+
+def assert_equivalent(default: pd.DataFrame, compact: pd.DataFrame) -> None:
+    assert list(default.columns) == list(compact.columns)
+    for col in default.columns:
+        expected, actual = default[col], compact[col]
+        if isinstance(actual.dtype, pd.CategoricalDtype) or actual.dtype == "string":
+            expected = expected.where(expected != "nan").astype(object)
+            actual = actual.astype(object)
+            assert expected.isna().equals(actual.isna()), col
+            assert (expected[expected.notna()] == actual[actual.notna()]).all(), col
+        else:
+            pd.testing.assert_series_equal(actual, expected, check_dtype=False)
+
+
+def main(n_rows: int) -> None:
+    raw = make_raw_export(n_rows)
+    default = clean_dataframe(raw, default_plan(), compact=False)
+    compact = clean_dataframe(raw, default_plan(), compact=True)
+    assert_equivalent(default, compact)
+
+    default_mb = default.memory_usage(deep=True).sum() / 1e6
+    compact_mb = compact.memory_usage(deep=True).sum() / 1e6
+    print(f"rows={n_rows:,}")
+    print(f"default: {default_mb:,.0f} MB")
+    print(f"compact: {compact_mb:,.0f} MB ({default_mb / compact_mb:.1f}x smaller)")
+    print("✅ values equivalent")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,57 @@
+"""Parse time and peak memory of the export reader on a large synthetic export.
+
+Modes (each in a fresh interpreter):
+  untyped  pd.read_csv with no options, then iloc[2:] (the original reader)
+  c        read_export with the dtype/usecols plan on the C engine
+  pyarrow  read_export with the plan on the pyarrow CSV reader
+
+Usage: python -m benchmarks.bench_csv_parse [n_rows]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import pandas as pd
+from benchmarks.memory import peak_rss_kb
+from benchmarks.synthetic_export import write_export_zip
+
+MODES = ["untyped", "c", "pyarrow"]
+
+
+def run_child(zip_path: str, mode: str) -> None:
+    from schema_registry import default_plan
+    from qualtrics_api import read_export
+
+    start = time.perf_counter()
+    with open(zip_path, "rb") as f:
+        if mode == "untyped":
+            with zipfile.ZipFile(f) as z, z.open(z.namelist()[0]) as member:
+                df = pd.read_csv(member).iloc[2:].reset_index(drop=True)
+        else:
+            df = read_export(f, default_plan(), engine=mode)
+    seconds = time.perf_counter() - start
+    print(f"{len(df)},{seconds:.2f},{peak_rss_kb() / 1024:.0f},{df.memory_usage(deep=True).sum() / 1e6:.0f}")
+
+
+def main(n_rows: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = os.path.join(tmp, "export.zip")
+        write_export_zip(zip_path, n_rows)
+        print(f"rows={n_rows:,} zip={os.path.getsize(zip_path) / 1e6:.0f} MB")
+        print(f"{'mode':>8} {'seconds':>8} {'peak RSS MB':>12} {'frame MB':>9}")
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_csv_parse", "--child", zip_path, mode],
+                check=True, capture_output=True, text=True
+            ).stdout.strip().splitlines()[-1]
+            _, seconds, peak_mb, frame_mb = out.split(",")
+            print(f"{mode:>8} {seconds:>8} {peak_mb:>12} {frame_mb:>9}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,123 @@
+"""Warm daemon runs vs cold one-shot `python main.py` runs, against benchmarks.fake_qualtrics.
+
+Each cold run is a fresh interpreter: imports, load_dotenv, schema compile,
+a new keep-alive session and a whoami before the export. The daemon
+pays those once and then runs the same survey on an "@every" schedule; its
+per-run latency is read back from its own /runs endpoint. Uploads go to
+BQ_LOCAL_PARQUET_DIR, so nothing leaves the machine. Then checks that:
+
+  - whoami was called once for all the warm runs
+  - a 401 from Qualtrics makes the next run check the token again
+  - /health and /metrics report the runs
+
+Usage: python -m benchmarks.bench_daemon [n_rows] [n_runs] [--latency S]
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import config
+from daemon import Daemon
+from http_client import get_client
+from pipeline import default_destinations
+from schema_registry import default_plan
+from benchmarks.fake_qualtrics import FakeQualtrics
+
+
+def get(url: str) -> tuple:
+    try:
+        with urllib.request.urlopen(url) as resp:
+            return resp.status, resp.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+def cold_run(env: dict, report_dir: str) -> tuple:
+    """Wall time of one `python main.py` process, and the pipeline time its run report measured."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py"], env={**env, "PIPELINE_RUN_REPORT_DIR": report_dir}, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall = time.perf_counter() - start
+    with open(os.path.join(report_dir, os.listdir(report_dir)[0])) as f:
+        return wall, json.load(f)["total_seconds"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n_rows", nargs="?", type=int, default=20_000)
+    parser.add_argument("n_runs", nargs="?", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="added to every API response")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    tmp = tempfile.mkdtemp()
+    fake = FakeQualtrics(args.n_rows, export_seconds=0.5, latency=args.latency)
+    fake.export_zip()  # generate before timing
+    settings = {
+        "QUALTRICS_API_TOKEN": "token", "QUALTRICS_SURVEY_ID": "SV_bench",
+        "QUALTRICS_CHECKPOINT_PATH": os.path.join(tmp, "checkpoint.json"),
+        "QUALTRICS_DOWNLOAD_DIR": os.path.join(tmp, "downloads"),
+        "BQ_LOCAL_PARQUET_DIR": os.path.join(tmp, "parquet"),
+        "VG_BQ_PROJECT_ID": "bench", "VG_BQ_DATASET_ID": "surveys", "VG_BQ_TABLE_ID": "responses",
+    }
+    for name in ("EXPORT_CACHE_DIR", "QUALTRICS_SURVEYS_CONFIG_PATH", "BQ_PROJECT_ID", "PIPELINE_DAEMON"):
+        os.environ.pop(name, None)
+    config.CHECKPOINT_PATH = settings["QUALTRICS_CHECKPOINT_PATH"]
+    config.EXPORT_DOWNLOAD_DIR = settings["QUALTRICS_DOWNLOAD_DIR"]
+    config.BQ_LOCAL_PARQUET_DIR = settings["BQ_LOCAL_PARQUET_DIR"]
+    config.VG_BQ_PROJECT_ID, config.VG_BQ_DATASET_ID, config.VG_BQ_TABLE_ID = "bench", "surveys", "responses"
+    config.EXPORT_CACHE_DIR, config.INCREMENTAL_EXPORT, config.BQ_PROJECT_ID = None, False, None
+    config.RUN_REPORT_DIR = config.PROFILE_TRANSFORM_PATH = None
+
+    with fake:
+        config.QUALTRICS_BASE_URL = settings["QUALTRICS_BASE_URL"] = fake.base_url
+        env = {**os.environ, **settings}
+        cold = [cold_run(env, os.path.join(tmp, f"report_{i}")) for i in range(args.n_runs)]
+        cold_whoami = fake.requests["whoami"]
+
+        fake.requests.clear()
+        daemon = Daemon([{"survey_id": "SV_bench", "plan": default_plan(), "destinations": default_destinations(),
+                          "schedule": "@every 1s"}])
+        url = daemon.serve_health("127.0.0.1", 0)
+        thread = threading.Thread(target=daemon.run_forever)
+        thread.start()
+        while len(daemon.runs) < args.n_runs:
+            time.sleep(0.1)
+        warm_whoami = fake.requests["whoami"]
+        get_client().unauthorized = True  # as after a 401 from any Qualtrics call
+        while len(daemon.runs) < args.n_runs + 1:
+            time.sleep(0.1)
+        daemon.stop()
+        thread.join()
+        _, runs = get(f"{url}/runs")
+        health_status, health = get(f"{url}/health")
+        _, metrics = get(f"{url}/metrics")
+        daemon.close()
+
+    warm = [run["seconds"] for run in json.loads(runs)]
+    print(f"rows={args.n_rows:,} runs={args.n_runs} api_latency={args.latency}s")
+    print(f"{'mode':<22} {'first':>7} {'mean':>7} {'whoami':>7}")
+    walls, pipelines = [w for w, _ in cold], [p for _, p in cold]
+    print(f"{'cold process (wall)':<22} {walls[0]:>6.2f}s {sum(walls) / len(walls):>6.2f}s {cold_whoami:>7}")
+    print(f"{'cold pipeline only':<22} {pipelines[0]:>6.2f}s {sum(pipelines) / len(pipelines):>6.2f}s")
+    first_warm = warm[:args.n_runs]
+    print(f"{'warm daemon':<22} {first_warm[0]:>6.2f}s {sum(first_warm) / len(first_warm):>6.2f}s "
+          f"{warm_whoami:>7}")
+
+    assert all(run["status"] == "succeeded" for run in json.loads(runs))
+    assert warm_whoami == 1 and fake.requests["whoami"] == 2, f"whoami called {fake.requests['whoami']} times"
+    print(f"whoami once for {args.n_runs} warm runs, and again after a 401 ✅")
+    assert health_status == 200 and json.loads(health)["runs"]["succeeded"] == args.n_runs + 1
+    assert f"pipeline_run_seconds_count {args.n_runs + 1}" in metrics
+    print("/health is ok and /metrics counts every run ✅")
+
+
+if __name__ == "__main__":
+    main()
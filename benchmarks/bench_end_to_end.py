@@ -0,0 +1,76 @@
+"""Per-stage timings of a whole run against the fake Qualtrics server, fully offline.
+
+Authenticates, starts, polls and downloads an export from
+benchmarks.fake_qualtrics, then cleans, validates and serializes it with
+BQ_LOCAL_PARQUET_DIR set so nothing is sent to BigQuery. Each export size is
+run in the full, streaming and async modes and the run report totals are
+printed per stage.
+
+Usage: python -m benchmarks.bench_end_to_end [n_rows ...] [--export-seconds S] [--latency S] [--mbit M]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import config
+from async_pipeline import run_survey_async
+from instrumentation import finish_run, start_run
+from pipeline import run_survey
+from qualtrics_api import verify_authentication
+from schema_registry import default_plan
+from benchmarks.fake_qualtrics import FakeQualtrics
+
+STAGES = ["authenticate", "initiate_export", "wait_for_export", "download", "verify_download", "preflight", "parse",
+          "transform", "validate", "serialize"]
+
+
+def run_once(mode: str, plan, destinations) -> dict:
+    start_run()
+    try:
+        verify_authentication()
+        if mode == "async":
+            asyncio.run(run_survey_async("SV_bench", plan, destinations))
+        else:
+            config.STREAMING_EXPORT = mode == "streaming"
+            run_survey("SV_bench", plan, destinations)
+    finally:
+        summary = finish_run(None)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n_rows", nargs="*", type=int, default=[20_000, 200_000])
+    parser.add_argument("--export-seconds", type=float, default=2.0, help="time the fake takes to generate an export")
+    parser.add_argument("--latency", type=float, default=0.05, help="added to every API response")
+    parser.add_argument("--mbit", type=float, default=0, help="download bandwidth (0 = unthrottled)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    config.INCREMENTAL_EXPORT = False
+    config.EXPORT_CACHE_DIR = None
+    plan = default_plan()
+    destinations = [{"project_id": "bench", "dataset_id": "surveys", "table_id": "responses",
+                     "credentials_path": None}]
+    print(f"{'rows':>9} {'mode':<10} {'total':>7}  " + " ".join(f"{name[:10]:>10}" for name in STAGES))
+    with tempfile.TemporaryDirectory() as tmp:
+        config.BQ_LOCAL_PARQUET_DIR = tmp
+        config.CHECKPOINT_PATH = f"{tmp}/checkpoint.json"
+        config.EXPORT_DOWNLOAD_DIR = f"{tmp}/downloads"
+        for n_rows in args.n_rows:
+            fake = FakeQualtrics(n_rows, export_seconds=args.export_seconds, latency=args.latency,
+                                 bytes_per_second=args.mbit * 1e6 / 8 or None)
+            fake.export_zip()  # generate before timing
+            with fake:
+                config.QUALTRICS_BASE_URL = fake.base_url
+                for mode in ("full", "streaming", "async"):
+                    summary = run_once(mode, plan, destinations)
+                    totals = summary["totals"]
+                    cells = " ".join(f"{totals[name]['seconds'] if name in totals else '-':>10}" for name in STAGES)
+                    print(f"{n_rows:>9,} {mode:<10} {summary['total_seconds']:>6.2f}s  {cells}")
+            print(f"{'':>9} requests: {dict(fake.requests)}")
+    print("Stages overlap in async mode, so its stage times add up to more than its total.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Export generation time and download size with and without schema pushdown.
+
+Runs start -> poll -> download -> parse -> clean against benchmarks.fake_qualtrics,
+whose survey carries `extra_columns` fields the schema doesn't map and whose
+exports take longer to generate the bigger they are. Compared:
+
+  everything        pushdown disabled: every question, embedded field and metadata column
+  shipped schema    the schema as it is: only metadata can be narrowed (no import ids declared)
+  import ids        the schema with each column's import_id filled in: only mapped fields
+  + start_date      the same, also limited to responses recorded since the schema's start_date
+
+Usage: python -m benchmarks.bench_export_pushdown [n_rows] [extra_columns]
+"""
+import copy
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import config
+from qualtrics_api import build_export_payload, download_export_file, read_export, wait_for_export
+from pipeline import start_export
+from schema_registry import DEFAULT_SCHEMA_PATH, compile_schema, validate_schema
+from transformer import clean_dataframe
+from benchmarks.fake_qualtrics import FakeQualtrics
+from benchmarks.synthetic_export import synthetic_import_id
+
+
+def variant(schema, import_ids: bool = False, **export_options):
+    schema = copy.deepcopy(schema)
+    if import_ids:
+        for col in schema["columns"]:
+            col["import_id"] = synthetic_import_id(col["source"])
+    schema["export"] = export_options
+    assert not validate_schema(schema), validate_schema(schema)
+    return compile_schema(schema)
+
+
+def main(n_rows: int, extra_columns: int) -> None:
+    logging.disable(logging.INFO)
+    # start_export records pending exports; keep them out of the real checkpoint file
+    tmp = tempfile.mkdtemp()
+    config.CHECKPOINT_PATH = os.path.join(tmp, "checkpoint.json")
+    config.EXPORT_DOWNLOAD_DIR = os.path.join(tmp, "downloads")
+    config.INCREMENTAL_EXPORT = False
+    config.EXPORT_CACHE_DIR = None
+    with open(DEFAULT_SCHEMA_PATH) as f:
+        schema = json.load(f)
+    plans = {
+        "everything": variant(schema, pushdown=False),
+        "shipped schema": variant(schema),
+        "import ids": variant(schema, import_ids=True),
+        "+ start_date": variant(schema, import_ids=True, start_date="2024-02-01"),
+    }
+
+    payload = build_export_payload(plans["import ids"])
+    print("request body with import ids:", json.dumps(payload)[:300], "...")
+    assert "QID1" in payload["questionIds"] and "QID100" not in payload["questionIds"]
+    assert payload["embeddedDataIds"] == ["uid", "course_id", "outcomes_id"]
+    assert "questionIds" not in build_export_payload(plans["shipped schema"])
+
+    fake = FakeQualtrics(n_rows, export_seconds=0.5, seconds_per_mb=0.25, extra_columns=extra_columns)
+    for plan in plans.values():
+        fake.export_zip(build_export_payload(plan))  # build every export up front; generation is simulated
+    print(f"rows={n_rows:,} extra_columns={extra_columns} (generation: 0.5s + 0.25s/MB)")
+    print(f"{'request':<15} {'columns':>7} {'zip MB':>7} {'generate':>9} {'download':>9} {'parse+clean':>11} {'rows':>9}")
+    cleaned = {}
+    with fake:
+        config.QUALTRICS_BASE_URL = fake.base_url
+        for name, plan in plans.items():
+            started = time.perf_counter()
+            export = start_export("SV_bench", plan)
+            result = wait_for_export("SV_bench", export["progress_id"])
+            generated = time.perf_counter()
+            zip_file = download_export_file("SV_bench", result["fileId"])
+            downloaded = time.perf_counter()
+            size = len(zip_file.read())
+            zip_file.seek(0)
+            df = clean_dataframe(read_export(zip_file, plan), plan, has_header_rows=False)
+            finished = time.perf_counter()
+            cleaned[name] = df
+            n_columns = len(fake._columns(fake.raw_export(), fake.export_requests[export["progress_id"]]))
+            print(f"{name:<15} {n_columns:>7} {size / 1e6:>7.1f} {generated - started:>8.2f}s "
+                  f"{downloaded - generated:>8.2f}s {finished - downloaded:>10.2f}s {len(df):>9,}")
+
+    for name in ("shipped schema", "import ids"):
+        assert cleaned[name].equals(cleaned["everything"]), f"{name} cleaned differently"
+    print("cleaned output identical with and without pushdown ✅")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 100_000, int(args[1]) if len(args) > 1 else 80)
@@ -0,0 +1,79 @@
+"""Exercise QualtricsClient against a local stub that injects 429s and slow responses.
+
+Compares bare requests.get (new connection per call, no retry) with the pooled
+client: completed calls, failures, TCP connections opened and wall time.
+
+Usage: python -m benchmarks.bench_http_client [n_requests]
+"""
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from http_client import QualtricsClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    counter = 0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler.lock:
+            StubHandler.connections += 1
+
+    def do_GET(self):
+        with StubHandler.lock:
+            StubHandler.counter += 1
+            n = StubHandler.counter
+        if n % 5 == 0:
+            # Every fifth call is rate limited, with a short Retry-After
+            self.send_response(429)
+            self.send_header("Retry-After", "0.2")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if n % 7 == 0:
+            time.sleep(0.3)
+        body = b'{"result": {"status": "inProgress", "percentComplete": 50.0}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label, get, n_requests, url):
+    StubHandler.counter = StubHandler.connections = 0
+    ok = failed = 0
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        try:
+            get(url).raise_for_status()
+            ok += 1
+        except requests.RequestException:
+            failed += 1
+    seconds = time.perf_counter() - start
+    print(f"{label:<18} ok={ok:<4} failed={failed:<4} connections={StubHandler.connections:<4} {seconds:.2f}s")
+
+
+def main(n_requests: int) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/API/v3/whoami"
+
+    client = QualtricsClient(api_token="stub", connect_timeout=2, read_timeout=5, max_retries=5,
+                             backoff_base=0.1, backoff_max=2, rate_per_sec=200, pool_size=4)
+    run("bare requests.get", lambda u: requests.get(u, timeout=5), n_requests, url)
+    run("QualtricsClient", client.get, n_requests, url)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,93 @@
+"""CSV vs JSON vs NDJSON exports: parse + clean time and peak memory.
+
+The same synthetic responses are written as each export format; the schema
+gets each column's import_id (JSON values are keyed by it). Each measurement
+runs in a fresh interpreter, once parsing the whole export and once in
+streamed chunks. Before timing, the cleaned output of every format is checked
+against CSV's on a small sample.
+
+Usage: python -m benchmarks.bench_json_export [n_rows]
+"""
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import config
+from schema_registry import DEFAULT_SCHEMA_PATH, compile_schema
+from benchmarks.memory import peak_rss_kb
+from benchmarks.synthetic_export import make_raw_export, synthetic_import_id, zip_export
+
+FORMATS = ("csv", "json", "ndjson")
+
+
+def plan_with_import_ids(**export_options):
+    with open(DEFAULT_SCHEMA_PATH) as f:
+        schema = json.load(f)
+    for col in schema["columns"]:
+        col["import_id"] = synthetic_import_id(col["source"])
+    schema["export"] = export_options
+    return compile_schema(schema)
+
+
+def run_child(zip_path: str, fmt: str, mode: str) -> None:
+    from qualtrics_api import read_export, read_export_chunks
+    from transformer import clean_dataframe
+
+    config.EXPORT_FORMAT = fmt
+    plan = plan_with_import_ids()
+    start = time.perf_counter()
+    with open(zip_path, "rb") as f:
+        if mode == "stream":
+            rows = sum(len(clean_dataframe(chunk, plan, has_header_rows=False))
+                       for chunk in read_export_chunks(f, config.STREAM_CHUNK_ROWS, plan))
+        else:
+            rows = len(clean_dataframe(read_export(f, plan), plan, has_header_rows=False))
+    print(f"{rows},{peak_rss_kb() / 1024:.0f},{time.perf_counter() - start:.2f}")
+
+
+def check_equivalence(n_rows: int = 5_000) -> None:
+    from qualtrics_api import read_export
+    from transformer import clean_dataframe
+
+    raw = make_raw_export(n_rows)
+    plan, labelled = plan_with_import_ids(), plan_with_import_ids(labels_from_export=True)
+    cleaned = {}
+    for fmt in FORMATS:
+        config.EXPORT_FORMAT = fmt
+        cleaned[fmt] = clean_dataframe(read_export(io.BytesIO(zip_export(raw, fmt)), plan), plan, has_header_rows=False)
+    config.EXPORT_FORMAT = "ndjson"
+    cleaned["ndjson + export labels"] = clean_dataframe(
+        read_export(io.BytesIO(zip_export(raw, "ndjson")), labelled), labelled, has_header_rows=False)
+    config.EXPORT_FORMAT = "csv"
+    for name, df in cleaned.items():
+        assert df.equals(cleaned["csv"]), f"{name} cleaned differently from csv"
+    print(f"cleaned output identical across {list(cleaned)} ✅")
+
+
+def main(n_rows: int) -> None:
+    check_equivalence()
+    raw = make_raw_export(n_rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'format':<7} {'zip MB':>7} {'mode':<7} {'rows':>9} {'peak MB':>8} {'seconds':>8}")
+        for fmt in FORMATS:
+            path = os.path.join(tmp, f"export_{fmt}.zip")
+            with open(path, "wb") as f:
+                f.write(zip_export(raw, fmt))
+            for mode in ("full", "stream"):
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_json_export", "--child", path, fmt, mode],
+                    capture_output=True, text=True, check=True,
+                ).stdout.strip().splitlines()[-1]
+                rows, peak_mb, seconds = out.split(",")
+                print(f"{fmt:<7} {os.path.getsize(path) / 1e6:>7.1f} {mode:<7} {int(rows):>9,} {peak_mb:>8} {seconds:>8}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "--child":
+        run_child(*args[1:])
+    else:
+        main(int(args[0]) if args else 200_000)
@@ -0,0 +1,57 @@
+"""Sequential vs concurrent multi-survey runs against a simulated Qualtrics.
+
+Export generation is simulated with a fixed latency per survey, downloads
+return a small synthetic export and the BigQuery upload is a no-op, so the
+timing isolates how well the orchestrator overlaps export waiting.
+
+Usage: python -m benchmarks.bench_orchestrator [n_surveys] [export_latency_s] [workers]
+"""
+import io
+import logging
+import sys
+import time
+import pipeline
+from schema_registry import default_plan
+from orchestrator import run_surveys
+from benchmarks.synthetic_export import make_export_zip
+
+
+def install_simulated_qualtrics(export_latency: float, rows: int) -> None:
+    export_zip = make_export_zip(rows)
+    pipeline.initiate_export = lambda survey_id, payload: f"ES_{survey_id}"
+
+    def wait_for_export(survey_id, progress_id):
+        time.sleep(export_latency)
+        return {"fileId": f"F_{survey_id}", "status": "complete"}
+
+    pipeline.wait_for_export = wait_for_export
+    pipeline.download_export_file = lambda survey_id, file_id: io.BytesIO(export_zip)
+    pipeline.upload_to_destinations = lambda df, destinations, **kwargs: None
+
+
+def main(n_surveys: int, export_latency: float, workers: int) -> None:
+    logging.disable(logging.INFO)
+    install_simulated_qualtrics(export_latency, rows=2000)
+    jobs = [
+        {"survey_id": f"SV_{i}", "plan": default_plan(), "destinations": [{"table_id": f"survey_{i}"}]}
+        for i in range(n_surveys)
+    ]
+
+    start = time.perf_counter()
+    for job in jobs:
+        pipeline.run_survey(job["survey_id"], job["plan"], job["destinations"])
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = run_surveys(jobs, workers)
+    concurrent = time.perf_counter() - start
+    assert all(r["status"] == "succeeded" for r in results)
+
+    print(f"surveys={n_surveys} export_latency={export_latency}s workers={workers}")
+    print(f"sequential: {sequential:.1f}s")
+    print(f"concurrent: {concurrent:.1f}s ({sequential / concurrent:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 8, float(args[1]) if len(args) > 1 else 3.0, int(args[2]) if len(args) > 2 else 4)
@@ -0,0 +1,31 @@
+"""Scaling of clean_dataframe_parallel across worker counts, checked against the serial output.
+
+Usage: python -m benchmarks.bench_parallel_transform [n_rows] [workers ...]
+"""
+import os
+import sys
+import time
+import pandas as pd
+from schema_registry import default_plan
+from transformer import clean_dataframe, clean_dataframe_parallel
+from benchmarks.synthetic_export import make_raw_export
+
+
+def main(n_rows: int, worker_counts) -> None:
+    raw = make_raw_export(n_rows)
+    start = time.perf_counter()
+    serial = clean_dataframe(raw, default_plan())
+    serial_seconds = time.perf_counter() - start
+    print(f"rows={n_rows:,} cpus={os.cpu_count()}")
+    print(f"serial:    {serial_seconds:.2f}s")
+    for workers in worker_counts:
+        start = time.perf_counter()
+        parallel = clean_dataframe_parallel(raw, default_plan(), workers)
+        seconds = time.perf_counter() - start
+        pd.testing.assert_frame_equal(parallel, serial)
+        print(f"workers={workers}: {seconds:.2f}s ({serial_seconds / seconds:.2f}x) ✅ equal to serial")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if args else 1_000_000, args[1:] or [1, 2, 4, 8])
@@ -0,0 +1,38 @@
+"""Parquet serialization: inferred pandas types vs the explicit Arrow schema.
+
+The inferred path approximates what load_table_from_dataframe does without a
+job config; the explicit path is bigquery_uploader.write_parquet.
+
+Usage: python -m benchmarks.bench_parquet [n_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+from schema_registry import default_plan
+from transformer import clean_dataframe
+from bigquery_uploader import write_parquet
+from benchmarks.synthetic_export import make_raw_export
+
+
+def main(n_rows: int) -> None:
+    df = clean_dataframe(make_raw_export(n_rows), default_plan())
+    with tempfile.TemporaryDirectory() as tmp:
+        inferred_path = os.path.join(tmp, "inferred.parquet")
+        explicit_path = os.path.join(tmp, "explicit.parquet")
+
+        start = time.perf_counter()
+        df.to_parquet(inferred_path, engine="pyarrow", compression="snappy", index=False)
+        inferred_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        write_parquet(df, explicit_path)
+        explicit_seconds = time.perf_counter() - start
+
+        print(f"rows={n_rows:,}")
+        print(f"inferred: {inferred_seconds:.2f}s {os.path.getsize(inferred_path) / 1e6:.1f} MB")
+        print(f"explicit: {explicit_seconds:.2f}s {os.path.getsize(explicit_path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,34 @@
+"""API calls and detection delay: fixed 2s polling vs percentComplete-based polling.
+
+Runs on a simulated clock; the export's percentComplete grows linearly until
+it completes after `duration` seconds.
+
+Usage: python -m benchmarks.bench_polling
+"""
+import config
+from qualtrics_api import next_poll_interval
+
+
+def simulate(duration: float, adaptive: bool):
+    t, polls = 0.0, 0
+    interval = config.EXPORT_POLL_MIN_INTERVAL if adaptive else 2.0
+    while True:
+        t += interval
+        polls += 1
+        if t >= duration:
+            return polls, t - duration
+        if adaptive:
+            interval = next_poll_interval(t, 100 * t / duration,
+                                          config.EXPORT_POLL_MIN_INTERVAL, config.EXPORT_POLL_MAX_INTERVAL)
+
+
+def main() -> None:
+    print(f"{'export time':>12} | {'fixed polls':>11} {'delay':>6} | {'adaptive polls':>14} {'delay':>6}")
+    for duration in [0.8, 3, 10, 60, 300, 1800]:
+        fixed_polls, fixed_delay = simulate(duration, adaptive=False)
+        adaptive_polls, adaptive_delay = simulate(duration, adaptive=True)
+        print(f"{duration:>11}s | {fixed_polls:>11} {fixed_delay:>5.1f}s | {adaptive_polls:>14} {adaptive_delay:>5.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Export downloads over connections that drop, against benchmarks.fake_qualtrics.
+
+Downloads the same throttled export with the server cutting the connection
+in different ways and reports what was sent and how long it took. Before
+this downloader, any cut failed the download and the run started over from
+a new export. Then checks that:
+
+  - a partial file with a corrupted byte fails the CRC check and is fetched again
+  - a run restarted after a crash mid-download reuses the export and the partial file
+  - the async runner resumes mid-stream and still loads every row
+
+Usage: python -m benchmarks.bench_resumable_download [n_rows] [mbit_per_s]
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+import config
+import pipeline
+import async_pipeline
+from qualtrics_api import download_export_file
+from schema_registry import default_plan
+from benchmarks.fake_qualtrics import FakeQualtrics
+
+
+def download(fake: FakeQualtrics, label: str, **faults) -> None:
+    fake.ranges, fake.cut_after, fake.cuts = faults.get("ranges", True), faults.get("cut_after"), faults.get("cuts")
+    fake.requests.clear()
+    start = time.perf_counter()
+    with download_export_file("SV_bench", "ES_0-file") as zip_file:
+        assert zip_file.read() == fake.export_zip(), f"{label}: downloaded file differs"
+    seconds = time.perf_counter() - start
+    print(f"{label:<28} {fake.requests['file']:>8} {fake.requests['file_bytes'] / 1e6:>8.1f} {seconds:>7.2f}s")
+
+
+def main(n_rows: int, mbit_per_s: float) -> None:
+    logging.disable(logging.WARNING)
+    tmp = tempfile.mkdtemp()
+    config.EXPORT_DOWNLOAD_DIR = os.path.join(tmp, "downloads")
+    config.CHECKPOINT_PATH = os.path.join(tmp, "checkpoint.json")
+    config.EXPORT_CACHE_DIR = None
+    config.INCREMENTAL_EXPORT = False
+    config.HTTP_BACKOFF_BASE = 0.1
+    fake = FakeQualtrics(n_rows, bytes_per_second=mbit_per_s * 1e6 / 8)
+    data = fake.export_zip()
+    size = len(data)
+    print(f"rows={n_rows:,} zip={size / 1e6:.1f} MB link={mbit_per_s} Mbit/s")
+    print(f"{'connection':<28} {'requests':>8} {'MB sent':>8} {'time':>8}")
+    with fake:
+        config.QUALTRICS_BASE_URL = fake.base_url
+        download(fake, "clean")
+        download(fake, "cut at 90%", cut_after=int(size * 0.9), cuts=1)
+        download(fake, "cut at 90%, no Range", cut_after=int(size * 0.9), cuts=1, ranges=False)
+        download(fake, "cut every 2 MB", cut_after=2_000_000)
+        fake.cut_after = None
+
+        # A partial download left by an earlier run, with one byte flipped
+        part = os.path.join(config.EXPORT_DOWNLOAD_DIR, "SV_bench_ES_0-file.zip.part")
+        corrupt = bytearray(data[:size // 2])
+        corrupt[size // 4] ^= 0xFF
+        with open(part, "wb") as f:
+            f.write(corrupt)
+        download(fake, "corrupt partial file")
+
+        # A run that crashed mid-download, then restarted
+        plan = default_plan()
+        fake.requests.clear()
+        export = pipeline.start_export("SV_bench", plan)
+        result = pipeline.await_export("SV_bench", export)
+        with open(os.path.join(config.EXPORT_DOWNLOAD_DIR, f"SV_bench_{result['fileId']}.zip.part"), "wb") as f:
+            f.write(data[:size // 2])
+        rows = []
+        pipeline.upload_to_destinations = lambda df, destinations, **kwargs: rows.append(len(df))
+        pipeline.run_survey("SV_bench", plan, [{"table_id": "bench"}])
+        assert fake.requests["export-responses"] == 1, "restarted run requested a new export"
+        assert fake.requests["file_bytes"] == size - size // 2, "restarted run re-downloaded the partial file"
+        assert sum(rows) == n_rows and pipeline.load_pending_export(config.CHECKPOINT_PATH, "SV_bench") is None
+        print(f"restarted run reused export {export['progress_id']} and resumed at byte {size // 2:,} ✅")
+
+        # The async runner parses as it downloads; a cut must not leave a gap in the stream
+        fake.cut_after, fake.cuts = 2_000_000, None
+        rows.clear()
+        asyncio.run(async_pipeline.run_survey_async("SV_bench", plan, [{"table_id": "bench"}]))
+        assert sum(rows) == n_rows, f"async run loaded {sum(rows):,} of {n_rows:,} rows"
+        print(f"async run with a cut every 2 MB loaded all {n_rows:,} rows, CRC-32 checked ✅")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200_000, float(args[1]) if len(args) > 1 else 200)
@@ -0,0 +1,110 @@
+"""Cost of computing rollups during ingest, and what the summary table saves dashboards.
+
+Cleans a synthetic export (course_id remapped onto `n_courses` courses), then:
+
+  - times the rollup of the whole frame and of the same rows in streamed chunks
+  - checks the means and histograms against a pandas groupby of the label scores
+  - checks that two incremental runs, added together as the rollup_add MERGE
+    does, equal one run over all the rows
+  - compares what a dashboard query over every metric scans, in BigQuery's
+    billed bytes, and how long it takes, from the raw rows and from the rollups
+
+Usage: python -m benchmarks.bench_rollups [n_rows] [n_courses]
+"""
+import logging
+import sys
+import time
+import numpy as np
+import pandas as pd
+from rollups import RollupAccumulator, combine_rollups, count_column
+from schema_registry import default_plan
+from transformer import clean_dataframe
+from benchmarks.synthetic_export import make_raw_export
+
+
+def billed_bytes(df: pd.DataFrame) -> int:
+    """What BigQuery bills to scan these columns: 8 bytes per number or date, 2 + UTF-8 length per string."""
+    total = 0
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_datetime64_any_dtype(df[col]):
+            total += 8 * len(df)
+        else:
+            total += int(df[col].dropna().astype(str).str.len().sum()) + 2 * len(df)
+    return total
+
+
+def rollup(df: pd.DataFrame, spec, chunk_rows: int = 0) -> pd.DataFrame:
+    accumulator = RollupAccumulator("SV_bench", spec)
+    step = chunk_rows or len(df)
+    for start in range(0, len(df), step):
+        accumulator.add(df.iloc[start:start + step])
+    return accumulator.rollups
+
+
+def canonical(frame: pd.DataFrame, spec) -> pd.DataFrame:
+    keys = ["survey_id", spec.group_by, "response_date", "metric"]
+    return frame.sort_values(keys, na_position="first").reset_index(drop=True)
+
+
+def main(n_rows: int, n_courses: int) -> None:
+    logging.disable(logging.INFO)
+    plan = default_plan()
+    spec = plan.rollups
+    raw = make_raw_export(n_rows)
+    start = time.perf_counter()
+    df = clean_dataframe(raw, plan)
+    clean_seconds = time.perf_counter() - start
+    courses = pd.Series(np.random.default_rng(1).integers(0, n_courses, len(df))).map(lambda i: f"course_{i}")
+    df[spec.group_by] = courses.where(df[spec.group_by].notna().to_numpy()).to_numpy()
+
+    start = time.perf_counter()
+    full = rollup(df, spec)
+    full_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    streamed = rollup(df, spec, chunk_rows=max(n_rows // 8, 1))
+    streamed_seconds = time.perf_counter() - start
+    print(f"rows={n_rows:,} courses={n_courses} metrics={len(spec.metrics)} -> {len(full):,} rollup rows")
+    print(f"clean_dataframe        {clean_seconds:6.2f}s")
+    print(f"rollup (one frame)     {full_seconds:6.2f}s")
+    print(f"rollup (8 chunks)      {streamed_seconds:6.2f}s")
+    pd.testing.assert_frame_equal(canonical(full, spec), canonical(streamed, spec))
+
+    indexed = full.set_index([spec.group_by, "response_date", "metric"])
+    day = df[spec.date_column].dt.floor("D").rename("response_date")
+    for metric in spec.metrics:
+        scores = df[metric.target].map({label: code for code, label in metric.labels.items()}).astype(float)
+        expected = scores.groupby([df[spec.group_by], day], dropna=False).agg(["mean", "count"]).dropna()
+        got = indexed.xs(metric.source, level="metric").reindex(expected.index)
+        assert np.allclose(got["score_mean"], expected["mean"]), f"{metric.source} means differ"
+        assert (got["responses"] == expected["count"]).all(), f"{metric.source} counts differ"
+        top = count_column(max(metric.labels))
+        expected_top = scores.eq(max(metric.labels)).groupby([df[spec.group_by], day], dropna=False).sum()
+        assert (got[top] == expected_top.reindex(expected.index)).all(), f"{metric.source} histogram differs"
+    print("means, counts and histograms match a pandas groupby; chunked rollups match one pass ✅")
+
+    cutoff = df[spec.date_column].median()
+    earlier, later = df[df[spec.date_column] < cutoff], df[df[spec.date_column] >= cutoff]
+    incremental = combine_rollups([rollup(earlier, spec), rollup(later, spec)], spec)
+    pd.testing.assert_frame_equal(canonical(incremental, spec), canonical(full, spec))
+    print("two incremental runs added together equal one full run ✅")
+
+    # The dashboard: per-course average and distribution of every metric over all days
+    label_columns = [metric.target for metric in spec.metrics]
+    raw_scan = df[[spec.group_by] + label_columns]
+    start = time.perf_counter()
+    for metric in spec.metrics:
+        raw_scan.groupby(spec.group_by)[metric.target].value_counts()
+    raw_seconds = time.perf_counter() - start
+    rollup_scan = full.drop(columns=["survey_id", "response_date", "score_mean"])
+    start = time.perf_counter()
+    rollup_scan.groupby([spec.group_by, "metric"]).sum()
+    rollup_seconds = time.perf_counter() - start
+    print(f"{'dashboard source':<18} {'rows':>9} {'billed MB':>10} {'query':>9}")
+    print(f"{'raw rows':<18} {len(raw_scan):>9,} {billed_bytes(raw_scan) / 1e6:>10.1f} {raw_seconds * 1000:>7.1f}ms")
+    print(f"{'rollup table':<18} {len(rollup_scan):>9,} {billed_bytes(rollup_scan) / 1e6:>10.1f} "
+          f"{rollup_seconds * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200_000, int(args[1]) if len(args) > 1 else 50)
@@ -0,0 +1,79 @@
+"""Startup cost of each CLI subcommand, from `python -X importtime`.
+
+Runs every subcommand of main.py against benchmarks.fake_qualtrics (run
+loads into BQ_LOCAL_PARQUET_DIR) and reports the median wall time of the
+process and of its imports, and which heavy dependencies it imported at
+all. The first row imports what main.py used to import at
+load, before any subcommand could run, for comparison.
+
+Usage: python -m benchmarks.bench_startup [repeats]
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.fake_qualtrics import FakeQualtrics
+
+EAGER_IMPORTS = ("import config, qualtrics_api, schema_registry, logger, pipeline, async_pipeline, orchestrator, "
+                 "instrumentation, export_cache, daemon; from google.cloud import bigquery")
+COMMANDS = [
+    ("old main.py imports", ["-c", EAGER_IMPORTS]),
+    ("--help", ["main.py", "--help"]),
+    ("validate-schema", ["main.py", "validate-schema"]),
+    ("dry-run", ["main.py", "dry-run"]),
+    ("export-only", ["main.py", "export-only"]),
+    ("run (local parquet)", ["main.py", "run"]),
+]
+HEAVY = {"pandas": "pandas", "pyarrow": "pyarrow", "requests": "requests", "google": "google.cloud.bigquery"}
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_profile(stderr: str) -> tuple:
+    """Total import time (ms) of the top-level imports and every module imported."""
+    total, modules = 0, set()
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            modules.add(match.group(4))
+            if len(match.group(3)) == 1:
+                total += int(match.group(2))
+    return total / 1000, modules
+
+
+def main(repeats: int) -> None:
+    tmp = tempfile.mkdtemp()
+    fake = FakeQualtrics(2_000)
+    fake.export_zip()
+    env = {
+        **{k: v for k, v in os.environ.items() if not k.startswith(("PIPELINE_", "QUALTRICS_", "BQ_", "VG_BQ_"))},
+        "QUALTRICS_API_TOKEN": "token", "QUALTRICS_SURVEY_ID": "SV_bench",
+        "QUALTRICS_CHECKPOINT_PATH": os.path.join(tmp, "checkpoint.json"),
+        "QUALTRICS_DOWNLOAD_DIR": os.path.join(tmp, "downloads"),
+        "BQ_LOCAL_PARQUET_DIR": os.path.join(tmp, "parquet"),
+        "VG_BQ_PROJECT_ID": "bench", "VG_BQ_DATASET_ID": "surveys", "VG_BQ_TABLE_ID": "responses",
+    }
+    print(f"{'command':<22} {'wall':>8} {'imports':>8} {'modules':>8}  heavy dependencies imported")
+    with fake:
+        env["QUALTRICS_BASE_URL"] = fake.base_url
+        for label, args in COMMANDS:
+            if args[-1] == "export-only":
+                args = args + ["--output-dir", os.path.join(tmp, "exports")]
+            walls = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, *args], env=env, check=True, capture_output=True)
+                walls.append(time.perf_counter() - start)
+            profiles = [import_profile(subprocess.run([sys.executable, "-X", "importtime", *args], env=env, check=True,
+                                                      capture_output=True, text=True).stderr)
+                        for _ in range(repeats)]
+            import_ms, modules = statistics.median(ms for ms, _ in profiles), profiles[0][1]
+            heavy = [name for name, module in HEAVY.items() if module in modules]
+            print(f"{label:<22} {statistics.median(walls) * 1000:>6.0f}ms {import_ms:>6.0f}ms {len(modules):>8}  "
+                  + (", ".join(heavy) or "-"))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,66 @@
+"""Peak RSS of the streaming (chunked) load path versus the full in-memory path.
+
+Each measurement runs in a fresh interpreter.
+The BigQuery upload is replaced by a no-op sink; only download-side parsing and
+cleaning are measured.
+
+Usage: python -m benchmarks.bench_streaming_memory [rows ...] [--full]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import pandas as pd
+from benchmarks.memory import peak_rss_kb
+from benchmarks.synthetic_export import write_export_zip
+
+
+def run_child(zip_path: str, mode: str, chunksize: int) -> None:
+    from schema_registry import default_plan
+    from qualtrics_api import read_export_chunks
+    from transformer import clean_dataframe
+
+    start = time.perf_counter()
+    rows = 0
+    with open(zip_path, "rb") as f:
+        if mode == "stream":
+            for chunk in read_export_chunks(f, chunksize, default_plan()):
+                rows += len(clean_dataframe(chunk, default_plan(), has_header_rows=False))
+        else:
+            with zipfile.ZipFile(f) as z, z.open(z.namelist()[0]) as member:
+                rows = len(clean_dataframe(pd.read_csv(member), default_plan()))
+    peak_mb = peak_rss_kb() / 1024
+    print(f"{rows},{peak_mb:.0f},{time.perf_counter() - start:.1f}")
+
+
+def measure(zip_path: str, mode: str, chunksize: int = 100_000):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_streaming_memory", "--child", zip_path, mode, str(chunksize)],
+        check=True, capture_output=True, text=True
+    ).stdout.strip().splitlines()[-1]
+    rows, peak_mb, seconds = out.split(",")
+    return int(rows), float(peak_mb), float(seconds)
+
+
+def main(sizes, include_full: bool) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'rows':>10} {'mode':>7} {'peak RSS MB':>12} {'seconds':>8}")
+        for n_rows in sizes:
+            zip_path = os.path.join(tmp, f"export_{n_rows}.zip")
+            write_export_zip(zip_path, n_rows)
+            modes = ["stream", "full"] if include_full else ["stream"]
+            for mode in modes:
+                rows, peak_mb, seconds = measure(zip_path, mode)
+                print(f"{rows:>10,} {mode:>7} {peak_mb:>12,.0f} {seconds:>8.1f}")
+            os.remove(zip_path)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run_child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        args = [a for a in sys.argv[1:] if a != "--full"]
+        sizes = [int(a) for a in args] or [100_000, 500_000, 1_000_000, 5_000_000]
+        main(sizes, include_full="--full" in sys.argv)
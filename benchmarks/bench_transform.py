@@ -0,0 +1,58 @@
+"""Compare the vectorized label mapping against the previous per-row .apply version.
+
+Usage: python -m benchmarks.bench_transform [n_rows]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from schema_registry import default_plan, TransformPlan
+from transformer import apply_label_specs, enforce_column_types
+from benchmarks.synthetic_export import make_raw_export
+
+
+def legacy_apply_labels(df: pd.DataFrame, plan: TransformPlan) -> pd.DataFrame:
+    """The label mapping as it was written before label specs (per-row lambdas)."""
+    for source, target, labels, before_cutoff in plan.label_specs:
+        std_map = {str(k): v for k, v in labels.items()}
+        if before_cutoff is None:
+            df[target] = df[source].apply(
+                lambda x: std_map.get(str(int(x))) if pd.notnull(x) else np.nan
+            )
+        else:
+            date_column, cutoff, labels_before_cutoff = before_cutoff
+            rev_map = {str(k): v for k, v in labels_before_cutoff.items()}
+
+            def conditional_likert(row, col=source):
+                val = row[col]
+                if pd.isnull(val):
+                    return np.nan
+                return std_map[str(int(val))] if row[date_column] >= cutoff else rev_map[str(int(val))]
+
+            df[target] = df.apply(conditional_likert, axis=1)
+    return df
+
+
+def main(n_rows: int) -> None:
+    plan = default_plan()
+    raw = make_raw_export(n_rows)
+    typed = enforce_column_types(raw.rename(columns=plan.rename).iloc[2:].reset_index(drop=True), plan)
+
+    start = time.perf_counter()
+    fast = apply_label_specs(typed.copy(), plan)
+    fast_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    slow = legacy_apply_labels(typed.copy(), plan)
+    slow_seconds = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(fast, slow)
+    print(f"rows={n_rows:,}")
+    print(f"legacy .apply labels:  {slow_seconds:.2f}s")
+    print(f"vectorized labels:     {fast_seconds:.3f}s")
+    print(f"speedup:               {slow_seconds / fast_seconds:.0f}x")
+    print("✅ outputs identical")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,68 @@
+"""Cost of data-quality validation relative to the transform it guards.
+
+Builds two exports, one clean and one with ~1% faulty rows (non-integer
+and out-of-range codes, end before start, repeated response ids), parses
+them with read_export as the pipeline does, and times clean_dataframe and
+validate_frame on each. On a clean export validate_frame only runs its
+checks; once any row is quarantined it also splits the frame, which copies
+every surviving row, so only the clean export is held to the 10% budget.
+
+Usage: python -m benchmarks.bench_validation [n_rows]
+"""
+import io
+import sys
+import time
+import zipfile
+import numpy as np
+from qualtrics_api import read_export
+from schema_registry import default_plan
+from transformer import clean_dataframe
+from validator import ERRORS_COLUMN, validate_frame
+from benchmarks.synthetic_export import make_raw_export
+
+
+def make_faulty_export(n_rows: int, fault_rate: float = 0.01) -> bytes:
+    raw = make_raw_export(n_rows)
+    rng = np.random.default_rng(1)
+    faults = [
+        ("Progress", "250"),                     # outside [0, 100]
+        ("Q4_1", "9"),                           # Likert code with no label
+        ("Q5_3", "2.5"),                         # not an integer code
+        ("EndDate", "2023-01-01 00:00:00"),      # ends before it started
+        ("ResponseId", "R_0"),                   # duplicate id
+    ]
+    for raw_col, value in faults:
+        rows = 2 + rng.choice(n_rows - 1, int(n_rows * fault_rate / len(faults)), replace=False) + 1
+        raw.loc[rows, raw_col] = value
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("survey.csv", raw.to_csv(index=False))
+    return buffer.getvalue()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(n_rows: int) -> None:
+    plan = default_plan()
+    shares = {}
+    for label, fault_rate in (("clean", 0.0), ("1% faulty", 0.01)):
+        parsed = read_export(io.BytesIO(make_faulty_export(n_rows, fault_rate)), plan)
+        cleaned, clean_seconds = timed(lambda: clean_dataframe(parsed, plan, has_header_rows=False))
+        (valid, quarantine), validate_seconds = timed(lambda: validate_frame(cleaned, plan))
+        assert len(valid) + len(quarantine) == n_rows
+        shares[label] = validate_seconds / clean_seconds
+        print(f"{label:<10} rows={n_rows:,} valid={len(valid):,} quarantined={len(quarantine):,}  "
+              f"transform {clean_seconds:.2f}s  validate_frame {validate_seconds:.2f}s "
+              f"({shares[label]:.0%} of transform)")
+    reasons = quarantine[ERRORS_COLUMN].str.split("; ").str[0].str.replace(r"=\S+", "", regex=True)
+    print(reasons.value_counts().to_string())
+    assert shares["clean"] < 0.10, "validating a clean export adds more than 10% to the transform"
+    print("✅ validating a clean export adds less than 10% to transform time")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
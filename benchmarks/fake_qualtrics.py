@@ -0,0 +1,277 @@
+"""A local stand-in for the Qualtrics v3 API, for benchmarks and offline runs.
+
+Implements whoami, export-responses (start), export progress and the file
+download. Exports are synthetic Qualtrics exports in a ZIP, shaped by the
+survey schema plus `extra_columns` unmapped fields. Like Qualtrics, the fake
+honours format (csv, json, ndjson), questionIds, embeddedDataIds,
+surveyMetadataIds and startDate/endDate, and an export "generates" over
+`export_seconds` plus `seconds_per_mb` of its ZIP, with percentComplete
+rising linearly. Every response is delayed by `latency`
+seconds, and the file can be throttled to `bytes_per_second`.
+
+Exports requested with allowContinuation (or a continuationToken) complete
+with a continuationToken; an export given that token holds only the
+responses added since, so `add_responses` between requests stands in for a
+survey collecting more responses between incremental runs.
+
+File downloads honour "Range: bytes=N-" unless `ranges` is False. To test
+recovery, `cut_after` makes the server drop the connection after sending
+that many bytes of a file response, for the first `cuts` responses (all of
+them when `cuts` is None).
+
+    with FakeQualtrics(n_rows=100_000, export_seconds=2) as server:
+        config.QUALTRICS_BASE_URL = server.base_url
+        ...
+
+Or standalone: python -m benchmarks.fake_qualtrics [n_rows] [port]
+"""
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+import pandas as pd
+from schema_registry import SURVEY_METADATA_IDS, default_plan
+from benchmarks.synthetic_export import make_raw_export, zip_export
+
+_EXPORTS = re.compile(r"^/API/v3/surveys/([^/]+)/export-responses(?:/([^/]+))?(/file)?$")
+# A continuation token carries the number of responses the survey had when its export was requested
+_CONTINUATION_TOKEN = re.compile(r"^CT_(\d+)$")
+
+
+class FakeQualtrics:
+    def __init__(self, n_rows: int = 10_000, export_seconds: float = 0.0, latency: float = 0.0,
+                 bytes_per_second: Optional[float] = None, port: int = 0, seed: int = 0,
+                 extra_columns: int = 0, seconds_per_mb: float = 0.0, ranges: bool = True,
+                 cut_after: Optional[int] = None, cuts: Optional[int] = None):
+        self.n_rows = n_rows
+        self.extra_columns = extra_columns
+        self.export_seconds = export_seconds
+        self.seconds_per_mb = seconds_per_mb
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.seed = seed
+        self.ranges = ranges
+        self.cut_after = cut_after
+        self.cuts = cuts
+        self.requests: Counter = Counter()
+        self.export_requests: Dict[str, Dict[str, Any]] = {}
+        # progress id -> (started, duration, ZIP, continuation token to complete with)
+        self._exports: Dict[str, Tuple[float, float, bytes, Optional[str]]] = {}
+        self._ids = itertools.count(1)
+        self._raw: Optional[pd.DataFrame] = None
+        self._zips: Dict[Tuple, bytes] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def raw_export(self) -> pd.DataFrame:
+        """Every column and response of the synthetic survey, generated on first use."""
+        with self._lock:
+            if self._raw is None:
+                self._raw = make_raw_export(self.n_rows, self.seed, self.extra_columns)
+            return self._raw
+
+    def add_responses(self, n_rows: int) -> None:
+        """Append `n_rows` new responses, recorded after every response so far."""
+        raw = self.raw_export()
+        new = make_raw_export(n_rows, self.seed + len(raw), self.extra_columns).iloc[2:].copy()
+        plan = default_plan()
+        date_columns = [raw_col for raw_col, col in plan.rename.items() if plan.dtypes[col] == "datetime"]
+        shift = pd.to_datetime(raw["RecordedDate"].iloc[2:]).max() - pd.to_datetime(new["StartDate"]).min()
+        for raw_col in date_columns:
+            shifted = pd.to_datetime(new[raw_col]) + shift + pd.Timedelta(days=1)
+            new[raw_col] = shifted.dt.strftime("%Y-%m-%d %H:%M:%S")
+        response_id = next(raw_col for raw_col, col in plan.rename.items() if col == "response_id")
+        new[response_id] = [f"R_{i}" for i in range(len(raw) - 2, len(raw) - 2 + n_rows)]
+        with self._lock:
+            self._raw = pd.concat([raw, new], ignore_index=True)
+
+    def export_zip(self, payload: Optional[Dict[str, Any]] = None) -> bytes:
+        """The ZIP an export request returns (cached per selection); without a payload, the unfiltered export."""
+        payload = payload or {}
+        raw = self.raw_export()
+        columns = self._columns(raw, payload)
+        fmt = payload.get("format", "csv")
+        key = (tuple(columns), payload.get("startDate"), payload.get("endDate"), payload.get("continuationToken"),
+               fmt, len(raw))
+        with self._lock:
+            if key not in self._zips:
+                self._zips[key] = zip_export(raw.loc[self._rows(raw, payload), columns], fmt)
+            return self._zips[key]
+
+    @staticmethod
+    def _columns(raw: pd.DataFrame, payload: Dict[str, Any]) -> list:
+        metadata_ids = set(SURVEY_METADATA_IDS.values())
+        keep = []
+        for col in raw.columns:
+            import_id = json.loads(raw[col].iat[1])["ImportId"]
+            if import_id in metadata_ids:
+                wanted = payload.get("surveyMetadataIds")
+            elif re.match(r"QID\d+", import_id):
+                wanted = payload.get("questionIds")
+                import_id = re.match(r"QID\d+", import_id).group()
+            else:
+                wanted = payload.get("embeddedDataIds")
+            if wanted is None or import_id in wanted:
+                keep.append(col)
+        return keep
+
+    @staticmethod
+    def _rows(raw: pd.DataFrame, payload: Dict[str, Any]) -> list:
+        body = raw.iloc[2:]["RecordedDate"].astype(str)
+        in_range = pd.Series(True, index=body.index)
+        to_csv_time = lambda stamp: stamp.replace("T", " ").rstrip("Z")
+        if payload.get("startDate"):
+            in_range &= body >= to_csv_time(payload["startDate"])
+        if payload.get("endDate"):
+            in_range &= body < to_csv_time(payload["endDate"])
+        if payload.get("continuationToken"):
+            in_range.iloc[:int(_CONTINUATION_TOKEN.match(payload["continuationToken"]).group(1))] = False
+        return [True, True] + in_range.tolist()
+
+    def start(self) -> "FakeQualtrics":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeQualtrics":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _progress(self, progress_id: str) -> Optional[Dict[str, Any]]:
+        if progress_id not in self._exports:
+            return None
+        started, duration, _, token = self._exports[progress_id]
+        elapsed = time.monotonic() - started
+        if duration and elapsed < duration:
+            return {"percentComplete": round(100 * elapsed / duration, 1), "status": "inProgress"}
+        progress = {"percentComplete": 100.0, "status": "complete", "fileId": f"{progress_id}-file"}
+        if token:
+            progress["continuationToken"] = token
+        return progress
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _json(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _not_found(self) -> None:
+                self._json(404, {"meta": {"httpStatus": "404 - Not Found"}})
+
+            def do_POST(self):
+                time.sleep(fake.latency)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                match = _EXPORTS.match(self.path)
+                if not match or match.group(2):
+                    return self._not_found()
+                fake.requests["export-responses"] += 1
+                payload = json.loads(body or b"{}")
+                if payload.get("continuationToken") and not _CONTINUATION_TOKEN.match(payload["continuationToken"]):
+                    return self._json(400, {"meta": {"httpStatus": "400 - Bad Request",
+                                                     "error": {"errorMessage": "Invalid continuation token"}}})
+                n_responses = len(fake.raw_export()) - 2
+                data = fake.export_zip(payload)
+                continues = payload.get("allowContinuation") or payload.get("continuationToken")
+                progress_id = f"ES_{next(fake._ids)}"
+                duration = fake.export_seconds + fake.seconds_per_mb * len(data) / 1e6
+                with fake._lock:
+                    fake._exports[progress_id] = (time.monotonic(), duration, data,
+                                                  f"CT_{n_responses}" if continues else None)
+                    fake.export_requests[progress_id] = payload
+                self._json(200, {"result": {"progressId": progress_id, "percentComplete": 0.0,
+                                            "status": "inProgress"}})
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+                if self.path == "/API/v3/whoami":
+                    fake.requests["whoami"] += 1
+                    return self._json(200, {"result": {"userId": "UR_fake", "brandId": "fake"}})
+                match = _EXPORTS.match(self.path)
+                if not match or not match.group(2):
+                    return self._not_found()
+                if match.group(3):
+                    fake.requests["file"] += 1
+                    export = fake._exports.get(match.group(2).removesuffix("-file"))
+                    return self._file(export[2] if export else fake.export_zip())
+                fake.requests["progress"] += 1
+                progress = fake._progress(match.group(2))
+                if progress is None:
+                    return self._not_found()
+                self._json(200, {"result": progress})
+
+            def _file(self, data: bytes) -> None:
+                first = 0
+                requested = re.match(r"bytes=(\d+)-$", self.headers.get("Range", "")) if fake.ranges else None
+                if requested:
+                    first = int(requested.group(1))
+                    if first >= len(data):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {first}-{len(data) - 1}/{len(data)}")
+                else:
+                    self.send_response(200)
+                if fake.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", "application/zip")
+                self.send_header("Content-Length", str(len(data) - first))
+                self.end_headers()
+                last = len(data)
+                with fake._lock:
+                    if fake.cut_after is not None and fake.cuts != 0:
+                        last = min(last, first + fake.cut_after)
+                        fake.cuts = None if fake.cuts is None else fake.cuts - 1
+                        # Leave the response short of its Content-Length, as a dropped connection does
+                        self.close_connection = True
+                block = 64 * 1024
+                try:
+                    for start in range(first, last, block):
+                        chunk = data[start:min(start + block, last)]
+                        self.wfile.write(chunk)
+                        fake.requests["file_bytes"] += len(chunk)
+                        if fake.bytes_per_second:
+                            time.sleep(len(chunk) / fake.bytes_per_second)
+                except ConnectionError:
+                    pass  # the client hung up, as a cancelled run does
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    server = FakeQualtrics(n_rows=int(args[0]) if args else 10_000, port=int(args[1]) if len(args) > 1 else 8765)
+    print(f"Fake Qualtrics at {server.base_url} (set QUALTRICS_BASE_URL to use it)")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
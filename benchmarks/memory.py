@@ -0,0 +1,14 @@
+import resource
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process in KiB.
+
+    Reads VmHWM, which (unlike ru_maxrss) is not inherited from the parent
+    process across fork/exec, so each benchmark child reports only itself.
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
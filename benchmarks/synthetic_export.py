@@ -0,0 +1,133 @@
+import io
+import json
+import zipfile
+import numpy as np
+import pandas as pd
+from schema_registry import SURVEY_METADATA_IDS, default_plan
+
+
+def synthetic_import_id(raw_col: str) -> str:
+    """The ImportId Qualtrics would give a column of the synthetic survey.
+
+    Metadata has fixed ids, questions get one QID per data export tag stem
+    (Q2.1_1 -> QID21_1, Q1_6_TEXT -> QID1_6_TEXT) and anything else is embedded
+    data, whose ImportId is its field name.
+    """
+    if raw_col in SURVEY_METADATA_IDS:
+        return SURVEY_METADATA_IDS[raw_col]
+    stem, _, rest = raw_col.partition("_")
+    if stem[:1] == "Q" and stem[1:].replace(".", "").isdigit():
+        return f"QID{stem[1:].replace('.', '')}" + (f"_{rest}" if rest else "")
+    return raw_col
+
+
+def make_raw_export(n_rows: int, seed: int = 0, extra_columns: int = 0) -> pd.DataFrame:
+    """Build a DataFrame shaped like pd.read_csv() of a Qualtrics CSV export.
+
+    The first two rows carry question text and import ids, exactly as Qualtrics
+    writes them, so the result can be fed straight into clean_dataframe.
+    `extra_columns` adds questions and embedded data the schema doesn't map,
+    as a real survey export carries.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    plan = default_plan()
+    # Spread responses across the 2024-01-09 agreement-scale cutoff
+    started = np.datetime64("2023-11-15T00:00:00") + rng.integers(0, 120 * 86400, n_rows).astype("timedelta64[s]")
+    for raw_col, col in plan.rename.items():
+        dtype = plan.dtypes[col]
+        if dtype == "datetime":
+            # start_date, end_date and recorded_date follow each other ten minutes apart
+            offset = np.timedelta64(600 * plan.datetime_columns.index(col), "s")
+            values = pd.Series(started + offset).dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)
+        elif dtype == "Int64":
+            low, high = plan.validation.ranges.get(col, (1, 2 if col in ("willing_followup_call", "is_18_or_older") else 5))
+            values = rng.integers(low or 0, (high or 1000) + 1, n_rows).astype(str).astype(object)
+            values[rng.random(n_rows) < 0.1] = np.nan
+        elif col == "response_id":
+            values = np.char.add("R_", np.arange(n_rows).astype(str)).astype(object)
+        else:
+            values = np.char.add(f"{col}_", rng.integers(0, 1000, n_rows).astype(str)).astype(object)
+            values[rng.random(n_rows) < 0.3] = np.nan
+        header = np.array([f"{raw_col} question text", f'{{"ImportId":"{synthetic_import_id(raw_col)}"}}'],
+                          dtype=object)
+        columns[raw_col] = np.concatenate([header, values])
+    for i in range(extra_columns):
+        # Alternate unmapped rating questions and embedded text fields
+        raw_col = f"Q{100 + i}" if i % 2 == 0 else f"extra_field_{i}"
+        if i % 2 == 0:
+            values = rng.integers(1, 6, n_rows).astype(str).astype(object)
+        else:
+            values = np.char.add("value_", rng.integers(0, 1000, n_rows).astype(str)).astype(object)
+        header = np.array([f"{raw_col} question text", f'{{"ImportId":"{synthetic_import_id(raw_col)}"}}'],
+                          dtype=object)
+        columns[raw_col] = np.concatenate([header, values])
+    return pd.DataFrame(columns)
+
+
+def to_json_records(raw: pd.DataFrame) -> list:
+    """The responses of a raw export as Qualtrics JSON records.
+
+    Values are keyed by import id, with numbers for coded columns, UTC ISO
+    timestamps and no key at all for missing values. "labels" carries the
+    current label of every coded column the schema has a label set for.
+    """
+    plan = default_plan()
+    body = raw.iloc[2:]
+    keys, columns, label_maps = [], [], {}
+    for raw_col in raw.columns:
+        key = json.loads(raw[raw_col].iat[1])["ImportId"]
+        dtype = plan.dtypes.get(plan.rename.get(raw_col), "Int64" if key.startswith("QID") else "str")
+        values = body[raw_col]
+        if dtype == "Int64":
+            values = [None if pd.isna(v) else int(v) for v in values]
+        elif dtype == "datetime":
+            values = [None if pd.isna(v) else v.replace(" ", "T") + "Z" for v in values]
+        else:
+            values = [None if pd.isna(v) else v for v in values]
+        keys.append(key)
+        columns.append(values)
+    for spec in plan.label_specs:
+        raw_col = next((src for src, name in plan.rename.items() if name == spec.source), None)
+        if raw_col in raw.columns:
+            label_maps[keys[list(raw.columns).index(raw_col)]] = spec.labels
+    records = []
+    for row in zip(*columns):
+        values = {key: v for key, v in zip(keys, row) if v is not None}
+        labels = {key: label_maps[key].get(values[key]) for key in label_maps if key in values}
+        records.append({"responseId": values.get("_recordId"), "values": values, "labels": labels})
+    return records
+
+
+def zip_export(raw: pd.DataFrame, fmt: str = "csv") -> bytes:
+    """Return the bytes of a Qualtrics-style ZIP holding `raw` as a csv, json or ndjson export."""
+    if fmt == "csv":
+        name, data = "survey.csv", raw.to_csv(index=False)
+    elif fmt == "json":
+        name, data = "survey.json", json.dumps({"responses": to_json_records(raw)})
+    else:
+        name, data = "survey.json", "\n".join(json.dumps(record) for record in to_json_records(raw)) + "\n"
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(name, data)
+    return buffer.getvalue()
+
+
+def make_export_zip(n_rows: int, seed: int = 0, extra_columns: int = 0, fmt: str = "csv") -> bytes:
+    """Return the bytes of a Qualtrics-style ZIP holding one export."""
+    return zip_export(make_raw_export(n_rows, seed, extra_columns), fmt)
+
+
+def write_export_zip(path: str, n_rows: int, seed: int = 0, chunk_rows: int = 500_000) -> None:
+    """Write a large synthetic export to disk without holding it all in memory."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        with z.open("survey.csv", "w", force_zip64=True) as f:
+            written = 0
+            while written < n_rows:
+                rows = min(chunk_rows, n_rows - written)
+                chunk = make_raw_export(rows, seed + written)
+                if written:
+                    # Only the first chunk keeps the header and the two Qualtrics header rows
+                    chunk = chunk.iloc[2:]
+                f.write(chunk.to_csv(index=False, header=not written).encode())
+                written += rows
@@ -1,21 +1,477 @@
-from google.cloud import bigquery
-from google.oauth2 import service_account
+import io
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Collection, Dict, List, Optional, Set, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import config
+from instrumentation import stage
 from logger import setup_logger
 
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
 log = setup_logger()
 
-def upload_dataframe_to_bq(df, project_id, dataset_id, table_id, credentials_path):
-    """Upload a pandas DataFrame to BigQuery."""
-    try:
-        log.info("🔁 Uploading DataFrame to BigQuery...")
-        credentials = service_account.Credentials.from_service_account_file(credentials_path)
-        client = bigquery.Client(credentials=credentials, project=project_id)
+WRITE_MODES = ("append", "merge", "partition_overwrite", "rollup_add", "rollup_replace")
+# Staging tables of a run that never committed (e.g. the process died) are dropped by BigQuery after this long
+STAGING_TABLE_TTL = timedelta(days=1)
+
+
+def _is_rollup_measure(col: str) -> bool:
+    """Rollup columns that add up across batches (and score_mean, their ratio); the rest identify the row."""
+    return col in ("responses", "score_sum", "score_mean") or col.startswith("count_")
+
+
+def _bq_type(dtype: str) -> str:
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "DATETIME"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "INT64"
+    if pd.api.types.is_float_dtype(dtype):
+        return "FLOAT64"
+    return "STRING"
+
+
+def _column_dtypes(df: pd.DataFrame) -> Tuple[Tuple[str, str], ...]:
+    return tuple((col, str(dtype)) for col, dtype in df.dtypes.items())
+
+
+@lru_cache(maxsize=None)
+def bq_column_types(columns: Tuple[Tuple[str, str], ...]) -> Tuple[Tuple[str, str], ...]:
+    """(column, BigQuery type) for a cleaned frame from its (column, dtype) pairs.
+
+    Types follow the pandas dtypes clean_dataframe produced from the survey
+    schema, so any survey's frame maps without a per-survey type table; label,
+    text and categorical columns are STRING.
+    """
+    return tuple((col, _bq_type(dtype)) for col, dtype in columns)
+
+
+@lru_cache(maxsize=None)
+def build_bq_schema(columns: Tuple[Tuple[str, str], ...]) -> List["bigquery.SchemaField"]:
+    """BigQuery schema for a cleaned frame from its (column, dtype) pairs."""
+    # google-cloud-bigquery is imported on the first load, so serializing (and local mode) never pays for it
+    from google.cloud import bigquery
+    return [bigquery.SchemaField(col, bq_type) for col, bq_type in bq_column_types(columns)]
+
+
+def to_arrow_table(df: pd.DataFrame, label_columns: Collection[str] = ()) -> pa.Table:
+    """Convert a cleaned frame to Arrow with explicit types.
+
+    The 'nan' strings left by astype(str) become real nulls. `label_columns`
+    (the plan's label targets, a handful of values each) are dictionary
+    encoded whether they are plain strings or categorical.
+    """
+    arrays = []
+    for col, bq_type in bq_column_types(_column_dtypes(df)):
+        series = df[col]
+        if bq_type == "DATETIME":
+            arrays.append(pa.array(series, type=pa.timestamp("us"), from_pandas=True))
+        elif bq_type == "INT64":
+            arrays.append(pa.array(series, type=pa.int64(), from_pandas=True))
+        elif bq_type == "FLOAT64":
+            arrays.append(pa.array(series, type=pa.float64(), from_pandas=True))
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            arrays.append(pa.array(series))  # already a dictionary
+        else:
+            strings = pa.array(series, type=pa.string(), from_pandas=True)
+            strings = pc.if_else(pc.equal(strings, "nan"), pa.scalar(None, pa.string()), strings)
+            arrays.append(strings.dictionary_encode() if col in label_columns else strings)
+    return pa.Table.from_arrays(arrays, names=list(df.columns))
+
+
+def write_parquet(df: pd.DataFrame, where, label_columns: Collection[str] = ()) -> None:
+    """Serialize a cleaned frame to Parquet at a path or into a file-like object."""
+    pq.write_table(to_arrow_table(df, label_columns), where, compression="snappy")
+
+
+def build_merge_sql(target_ref: str, staging_ref: str, columns: List[str], key: str = "response_id") -> str:
+    """MERGE the staging batch into the target, one row per key.
+
+    Duplicate keys inside the batch keep the most recently recorded row. The
+    target side is restricted to recorded_date >= the batch minimum so BigQuery
+    only scans the partitions the batch can touch (a response's recorded_date
+    never changes).
+    """
+    updates = ",\n    ".join(f"`{col}` = S.`{col}`" for col in columns if col != key)
+    insert_cols = ", ".join(f"`{col}`" for col in columns)
+    insert_vals = ", ".join(f"S.`{col}`" for col in columns)
+    return f"""DECLARE min_recorded_date DATETIME DEFAULT (SELECT MIN(recorded_date) FROM `{staging_ref}`);
+MERGE `{target_ref}` T
+USING (
+  SELECT * EXCEPT(_row_number) FROM (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY `{key}` ORDER BY recorded_date DESC) AS _row_number
+    FROM `{staging_ref}`
+  )
+  WHERE _row_number = 1
+) S
+ON T.`{key}` = S.`{key}` AND T.recorded_date >= min_recorded_date
+WHEN MATCHED THEN UPDATE SET
+    {updates}
+WHEN NOT MATCHED THEN INSERT ({insert_cols})
+  VALUES ({insert_vals});"""
+
+
+def build_append_sql(target_ref: str, staging_ref: str, columns: List[str], truncate: bool = False) -> str:
+    """Insert the staging rows into the target; with `truncate`, replacing its rows in the same transaction."""
+    cols = ", ".join(f"`{col}`" for col in columns)
+    insert = f"""INSERT INTO `{target_ref}` ({cols})
+SELECT {cols} FROM `{staging_ref}`;"""
+    if not truncate:
+        return insert
+    return f"""BEGIN TRANSACTION;
+DELETE FROM `{target_ref}` WHERE TRUE;
+{insert}
+COMMIT TRANSACTION;"""
+
+
+def build_partition_overwrite_sql(target_ref: str, staging_ref: str, columns: List[str]) -> str:
+    """Replace every recorded_date day present in the staging batch.
+
+    Only correct when the batch holds complete days, i.e. full (non-incremental) exports.
+    """
+    cols = ", ".join(f"`{col}`" for col in columns)
+    return f"""BEGIN TRANSACTION;
+DELETE FROM `{target_ref}`
+WHERE DATE(recorded_date) IN (SELECT DISTINCT DATE(recorded_date) FROM `{staging_ref}`);
+INSERT INTO `{target_ref}` ({cols})
+SELECT {cols} FROM `{staging_ref}`;
+COMMIT TRANSACTION;"""
+
+
+def rollup_ledger_ref(target_ref: str) -> str:
+    """The table holding what the latest rollup_add load of each survey added to `target_ref`."""
+    return f"{target_ref}__applied_loads"
+
+
+def build_rollup_add_sql(target_ref: str, staging_ref: str, columns: List[str], load_id: str) -> str:
+    """Add a batch of rollups to the summary table, once per `load_id`.
+
+    Counts and score sums of rows already in the table add up and their mean
+    is recomputed; new rows are inserted. Only the response_date partitions
+    the batch covers are scanned.
+
+    A ledger table keeps the rollups of each survey's latest load. Loading the
+    same load_id again (a run retried after its rollups were added but before
+    its checkpoint was saved) first takes out what the earlier attempt added,
+    so nothing is counted twice, and responses only the retry saw still are.
+    """
+    if not re.fullmatch(r"[\w-]+", load_id):
+        raise ValueError(f"Invalid rollup load id: {load_id!r}")
+    ledger_ref = rollup_ledger_ref(target_ref)
+    keys = [col for col in columns if not _is_rollup_measure(col)]
+    measures = [col for col in columns if _is_rollup_measure(col) and col != "score_mean"]
+    key_cols = ", ".join(f"`{col}`" for col in keys)
+    cols = ", ".join(f"`{col}`" for col in columns)
+    added = ", ".join(f"`{col}`" for col in keys + measures)
+    negated = ", ".join([f"`{col}`" for col in keys] + [f"-`{col}` AS `{col}`" for col in measures])
+    summed = ",\n    ".join([f"`{col}`" for col in keys] + [f"SUM(`{col}`) AS `{col}`" for col in measures]
+                             + ["SAFE_DIVIDE(SUM(score_sum), SUM(responses)) AS score_mean"])
+    on = " AND ".join(f"T.`{col}` IS NOT DISTINCT FROM S.`{col}`" for col in keys)
+    sums = ",\n    ".join(f"`{col}` = T.`{col}` + S.`{col}`" for col in measures)
+    insert_vals = ", ".join(f"S.`{col}`" for col in columns)
+    return f"""DECLARE min_response_date DATETIME;
+CREATE TABLE IF NOT EXISTS `{ledger_ref}` AS SELECT CAST(NULL AS STRING) AS load_id, {cols} FROM `{staging_ref}` WHERE FALSE;
+SET min_response_date = (
+  SELECT MIN(response_date) FROM (
+    SELECT response_date FROM `{staging_ref}`
+    UNION ALL
+    SELECT response_date FROM `{ledger_ref}` WHERE load_id = '{load_id}'
+  )
+);
+BEGIN TRANSACTION;
+MERGE `{target_ref}` T
+USING (
+  SELECT
+    {summed}
+  FROM (
+    SELECT {added} FROM `{staging_ref}`
+    UNION ALL
+    -- What an earlier attempt at this load added, taken back out
+    SELECT {negated} FROM `{ledger_ref}` WHERE load_id = '{load_id}'
+  )
+  GROUP BY {key_cols}
+) S
+ON {on} AND T.response_date >= min_response_date
+WHEN MATCHED AND T.responses + S.responses = 0 THEN DELETE
+WHEN MATCHED THEN UPDATE SET
+    {sums},
+    score_mean = SAFE_DIVIDE(T.score_sum + S.score_sum, T.responses + S.responses)
+WHEN NOT MATCHED AND S.responses > 0 THEN INSERT ({cols})
+  VALUES ({insert_vals});
+DELETE FROM `{ledger_ref}` WHERE survey_id IN (SELECT DISTINCT survey_id FROM `{staging_ref}`);
+INSERT INTO `{ledger_ref}` (load_id, {cols})
+SELECT '{load_id}', {cols} FROM `{staging_ref}`;
+COMMIT TRANSACTION;"""
+
+
+def build_rollup_replace_sql(target_ref: str, staging_ref: str, columns: List[str]) -> str:
+    """Replace the survey's rollups for every response_date day in the batch.
+
+    Only correct when the batch summarises complete days, i.e. full (non-incremental) exports.
+    """
+    cols = ", ".join(f"`{col}`" for col in columns)
+    return f"""BEGIN TRANSACTION;
+DELETE FROM `{target_ref}`
+WHERE response_date IN (SELECT DISTINCT response_date FROM `{staging_ref}`)
+  AND survey_id IN (SELECT DISTINCT survey_id FROM `{staging_ref}`);
+INSERT INTO `{target_ref}` ({cols})
+SELECT {cols} FROM `{staging_ref}`;
+COMMIT TRANSACTION;"""
+
 
-        table_ref = f"{project_id}.{dataset_id}.{table_id}"
-        job = client.load_table_from_dataframe(df, table_ref)
+SQL_BUILDERS = {
+    "merge": build_merge_sql,
+    "partition_overwrite": build_partition_overwrite_sql,
+    "rollup_replace": build_rollup_replace_sql,
+}
+
+
+def build_write_sql(write_mode: str, target_ref: str, staging_ref: str, columns: List[str],
+                    load_id: Optional[str] = None) -> str:
+    """The statement writing a staging table into its target in the given (non-append) write mode."""
+    if write_mode == "rollup_add":
+        return build_rollup_add_sql(target_ref, staging_ref, columns, load_id)
+    return SQL_BUILDERS[write_mode](target_ref, staging_ref, columns)
+
+
+def ensure_target_table(client: "bigquery.Client", table_ref: str, schema: List["bigquery.SchemaField"]) -> None:
+    """Create the target, if missing, partitioned by day and clustered on course_id.
+
+    Response tables partition on recorded_date; rollup tables, which have no
+    such column, on response_date.
+    """
+    from google.cloud import bigquery
+    names = {field.name for field in schema}
+    table = bigquery.Table(table_ref, schema=schema)
+    partition_field = "recorded_date" if "recorded_date" in names else "response_date"
+    table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field=partition_field)
+    table.clustering_fields = [col for col in ("course_id",) if col in names] or None
+    client.create_table(table, exists_ok=True)
+
+
+def serialize_parquet(df: pd.DataFrame, label_columns: Collection[str] = ()) -> bytes:
+    """Parquet bytes for a cleaned frame, ready to load into any number of tables."""
+    buffer = io.BytesIO()
+    with stage("serialize", rows=len(df)) as record:
+        write_parquet(df, buffer, label_columns)
+        record["bytes"] = buffer.tell()
+    return buffer.getvalue()
+
+
+def _load_parquet(client: "bigquery.Client", payload: bytes, schema: List["bigquery.SchemaField"],
+                  table_ref: str, write_disposition: str, rows: int) -> None:
+    from google.cloud import bigquery
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        schema=schema,
+        write_disposition=write_disposition,
+    )
+    with stage("upload", table=table_ref, rows=rows, bytes=len(payload)):
+        # BytesIO over bytes shares the buffer, so concurrent loads don't copy the payload
+        job = client.load_table_from_file(io.BytesIO(payload), table_ref, job_config=job_config)
         job.result()  # Wait for the job to complete
 
-        log.info(f"✅ Upload successful to {table_ref}")
-    except Exception as e:
-        log.error(f"❌ Failed to upload to BigQuery: {e}")
-        raise
\ No newline at end of file
+
+class StagedLoad:
+    """The chunks one run uploads, held in a staging table per target until the run commits them.
+
+    Streaming and async runs upload chunk by chunk. Written straight to the
+    target, a partition_overwrite chunk would delete the rows an earlier
+    chunk loaded for a day both contain, and a failure part-way would leave
+    the earlier chunks loaded for the retry to load again. Staged, every
+    target gets one write per run, after the last chunk has loaded.
+    """
+
+    def __init__(self):
+        # target table ref -> destination, staging table, schema, columns, write mode and disposition, rows
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+
+class BigQueryUploader:
+    """Loads cleaned frames into BigQuery, reusing one client per (project, credentials file).
+
+    A client owns an authorized HTTP session whose connections and access token
+    outlive any single load, so only the first upload to a project pays for
+    reading the key file, fetching a token and connecting. Target tables are
+    created (if missing) once per uploader instead of checked on every load.
+    """
+
+    def __init__(self, max_workers: int = config.BQ_UPLOAD_WORKERS):
+        self.max_workers = max_workers
+        self._clients: Dict[Tuple[str, str], "bigquery.Client"] = {}
+        self._tables: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def client(self, project_id: str, credentials_path: str) -> "bigquery.Client":
+        key = (project_id, credentials_path)
+        with self._lock:
+            if key not in self._clients:
+                from google.cloud import bigquery
+                from google.oauth2 import service_account
+                credentials = service_account.Credentials.from_service_account_file(credentials_path)
+                self._clients[key] = bigquery.Client(credentials=credentials, project=project_id)
+            return self._clients[key]
+
+    def _ensure_table(self, client: "bigquery.Client", table_ref: str, schema: List["bigquery.SchemaField"]) -> None:
+        with self._lock:
+            if table_ref in self._tables:
+                return
+        ensure_target_table(client, table_ref, schema)
+        with self._lock:
+            self._tables.add(table_ref)
+
+    def _stage(self, client: "bigquery.Client", payload: bytes, schema: List["bigquery.SchemaField"],
+               columns: List[str], rows: int, destination: Dict[str, str], table_ref: str,
+               write_disposition: str, write_mode: str, load_id: Optional[str], staged: StagedLoad) -> None:
+        from google.cloud import bigquery
+        with staged.lock:
+            entry = staged.tables.get(table_ref)
+            if entry is None:
+                # Unique per run so concurrent surveys writing one table never share a staging table
+                staging_ref = f"{table_ref}__staging_{uuid.uuid4().hex[:8]}"
+                staging = bigquery.Table(staging_ref, schema=schema)
+                staging.expires = datetime.now(timezone.utc) + STAGING_TABLE_TTL
+                client.create_table(staging)
+                entry = staged.tables[table_ref] = {
+                    "destination": destination, "staging_ref": staging_ref, "schema": schema, "columns": columns,
+                    "write_mode": write_mode, "write_disposition": write_disposition, "load_id": load_id,
+                    "rows": 0,
+                }
+        _load_parquet(client, payload, schema, entry["staging_ref"], "WRITE_APPEND", rows)
+        with staged.lock:
+            entry["rows"] += rows
+
+    def _load(self, payload: bytes, schema: List["bigquery.SchemaField"], columns: List[str], rows: int,
+              destination: Dict[str, str], write_disposition: str, write_mode: str,
+              load_id: Optional[str] = None, staged: Optional[StagedLoad] = None) -> None:
+        table_ref = f"{destination['project_id']}.{destination['dataset_id']}.{destination['table_id']}"
+        try:
+            log.info(f"🔁 Uploading DataFrame to BigQuery ({write_mode})...")
+            client = self.client(destination["project_id"], destination["credentials_path"])
+            self._ensure_table(client, table_ref, schema)
+
+            if staged is not None:
+                self._stage(client, payload, schema, columns, rows, destination, table_ref,
+                            write_disposition, write_mode, load_id, staged)
+                log.info(f"✅ Staged {rows:,} rows for {table_ref}")
+                return
+            if write_mode == "append":
+                _load_parquet(client, payload, schema, table_ref, write_disposition, rows)
+            else:
+                # Unique per load so concurrent surveys writing one table never share a staging table
+                staging_ref = f"{table_ref}__staging_{uuid.uuid4().hex[:8]}"
+                _load_parquet(client, payload, schema, staging_ref, "WRITE_TRUNCATE", rows)
+                try:
+                    sql = build_write_sql(write_mode, table_ref, staging_ref, columns, load_id)
+                    with stage(write_mode, table=table_ref, rows=rows):
+                        client.query(sql).result()
+                finally:
+                    client.delete_table(staging_ref, not_found_ok=True)
+
+            log.info(f"✅ Upload successful to {table_ref}")
+        except Exception as e:
+            log.error(f"❌ Failed to upload to {table_ref}: {e}")
+            raise
+
+    def upload(self, df: pd.DataFrame, destinations: List[Dict[str, str]],
+               write_disposition: str = config.BQ_WRITE_DISPOSITION, write_mode: str = config.BQ_WRITE_MODE,
+               staged: Optional[StagedLoad] = None, load_id: Optional[str] = None,
+               label_columns: Collection[str] = ()) -> None:
+        """Load one frame into every destination table, serializing it only once.
+
+        write_mode is "append" (plain load), "merge" (upsert on response_id) or
+        "partition_overwrite" (replace the recorded_date days in the batch);
+        rollup frames use "rollup_add" or "rollup_replace". A rollup_add load
+        needs a `load_id` that stays the same when the run is retried (the
+        export request key), so a retry replaces what it added instead of
+        adding it again.
+        Loads to several tables run concurrently; every one is attempted and
+        the first failure is raised once they have all finished. With
+        `staged`, the frame only goes to staging tables until commit().
+        `label_columns` are written dictionary encoded (see to_arrow_table).
+        """
+        if write_mode not in WRITE_MODES:
+            raise ValueError(f"Unknown BigQuery write mode: {write_mode}")
+        if write_mode == "rollup_add" and not load_id:
+            raise ValueError("rollup_add needs a load_id, or a retried run would add its rollups twice")
+        payload = serialize_parquet(df, label_columns)
+        if config.BQ_LOCAL_PARQUET_DIR:
+            # Local mode: stop after serialization so it can be inspected and benchmarked offline
+            os.makedirs(config.BQ_LOCAL_PARQUET_DIR, exist_ok=True)
+            for d in destinations:
+                path = os.path.join(config.BQ_LOCAL_PARQUET_DIR, f"{d['project_id']}.{d['dataset_id']}.{d['table_id']}.parquet")
+                with open(path, "wb") as f:
+                    f.write(payload)
+                log.info(f"📁 Wrote {len(df):,} rows to {path}")
+            return
+
+        args = (payload, build_bq_schema(_column_dtypes(df)), list(df.columns), len(df))
+        if len(destinations) == 1:
+            self._load(*args, destinations[0], write_disposition, write_mode, load_id, staged)
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(destinations))) as pool:
+            futures = [pool.submit(self._load, *args, d, write_disposition, write_mode, load_id, staged)
+                       for d in destinations]
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            raise errors[0]
+
+    def commit(self, staged: StagedLoad) -> None:
+        """Write every staged table into its target with one statement per target, then drop the staging tables."""
+        try:
+            for table_ref, entry in staged.tables.items():
+                client = self.client(entry["destination"]["project_id"], entry["destination"]["credentials_path"])
+                write_mode, staging_ref, columns = entry["write_mode"], entry["staging_ref"], entry["columns"]
+                if write_mode == "append":
+                    sql = build_append_sql(table_ref, staging_ref, columns,
+                                           truncate=entry["write_disposition"] == "WRITE_TRUNCATE")
+                else:
+                    sql = build_write_sql(write_mode, table_ref, staging_ref, columns, entry["load_id"])
+                with stage(write_mode, table=table_ref, rows=entry["rows"]):
+                    client.query(sql).result()
+                log.info(f"✅ Wrote {entry['rows']:,} staged rows to {table_ref} ({write_mode})")
+        finally:
+            self.abort(staged)
+
+    def abort(self, staged: StagedLoad) -> None:
+        """Drop the staging tables of a run without touching the targets."""
+        for entry in staged.tables.values():
+            client = self.client(entry["destination"]["project_id"], entry["destination"]["credentials_path"])
+            client.delete_table(entry["staging_ref"], not_found_ok=True)
+        staged.tables.clear()
+
+
+_uploader: Optional[BigQueryUploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_uploader() -> BigQueryUploader:
+    """Return the process-wide uploader, creating it on first use."""
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            _uploader = BigQueryUploader()
+        return _uploader
+
+
+def upload_to_destinations(df: pd.DataFrame, destinations: List[Dict[str, str]], **kwargs) -> None:
+    """Load a DataFrame into every destination table through the shared uploader."""
+    get_uploader().upload(df, destinations, **kwargs)
+
+
+def upload_dataframe_to_bq(df, project_id, dataset_id, table_id, credentials_path,
+                           write_disposition=config.BQ_WRITE_DISPOSITION, write_mode=config.BQ_WRITE_MODE):
+    """Upload a pandas DataFrame to one BigQuery table through the shared uploader."""
+    destination = {"project_id": project_id, "dataset_id": dataset_id, "table_id": table_id,
+                   "credentials_path": credentials_path}
+    get_uploader().upload(df, [destination], write_disposition, write_mode)
@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+from logger import setup_logger
+
+log = setup_logger()
+
+# Several surveys may finish at once when run concurrently; they share one file
+_lock = threading.Lock()
+
+# The export a survey's last run requested, kept until that run completes
+PENDING_EXPORT = "pending_export"
+
+
+def _load_entry(path: str, survey_id: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        checkpoints = json.load(f)
+    return checkpoints.get(survey_id, {})
+
+
+def load_checkpoint(path: str, survey_id: str) -> Dict[str, Any]:
+    """Return the stored checkpoint for a survey, or an empty dict on first run."""
+    entry = _load_entry(path, survey_id)
+    return {key: value for key, value in entry.items() if key != PENDING_EXPORT}
+
+
+def _update_entry(path: str, survey_id: str, update: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    with _lock:
+        checkpoints = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                checkpoints = json.load(f)
+
+        entry = checkpoints.get(survey_id, {})
+        update(entry)
+        if entry:
+            checkpoints[survey_id] = entry
+        else:
+            checkpoints.pop(survey_id, None)
+
+        # Write to a temp file first so a crash never leaves a half-written checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoints, f, indent=2)
+        os.replace(tmp_path, path)
+    return entry
+
+
+def save_checkpoint(path: str, survey_id: str, continuation_token: Optional[str],
+                    last_recorded_date: Optional[str]) -> None:
+    """Persist the continuation token and high-water mark for a survey."""
+    def update(entry: Dict[str, Any]) -> None:
+        if continuation_token:
+            entry["continuation_token"] = continuation_token
+        if last_recorded_date:
+            entry["last_recorded_date"] = last_recorded_date
+
+    entry = _update_entry(path, survey_id, update)
+    saved = {key: value for key, value in entry.items() if key != PENDING_EXPORT}
+    log.info(f"💾 Checkpoint saved for {survey_id}: {saved}")
+
+
+def load_pending_export(path: str, survey_id: str) -> Optional[Dict[str, Any]]:
+    """The export (request_key, progress_id, created, file_id once complete) an unfinished run left behind."""
+    return _load_entry(path, survey_id).get(PENDING_EXPORT)
+
+
+def save_pending_export(path: str, survey_id: str, **fields: Any) -> None:
+    """Record fields of the survey's in-flight export, so a restarted run can pick it up."""
+    _update_entry(path, survey_id, lambda entry: entry.setdefault(PENDING_EXPORT, {}).update(fields))
+
+
+def clear_pending_export(path: str, survey_id: str) -> None:
+    """Forget the in-flight export once its responses are loaded."""
+    if load_pending_export(path, survey_id) is not None:
+        _update_entry(path, survey_id, lambda entry: entry.pop(PENDING_EXPORT, None))
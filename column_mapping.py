@@ -1,61 +1,12 @@
+from functools import lru_cache
 from typing import Dict
+from schema_registry import default_plan
 
-COLUMN_MAPPING: Dict[str, str] = {
-    "StartDate": "start_date",
-    "EndDate": "end_date",
-    "Status": "response_status",
-    "IPAddress": "ip_address",
-    "Progress": "progress_percent",
-    "Duration (in seconds)": "duration_seconds",
-    "Finished": "is_finished",
-    "RecordedDate": "recorded_date",
-    "ResponseId": "response_id",
-    "RecipientLastName": "recipient_last_name",
-    "RecipientFirstName": "recipient_first_name",
-    "RecipientEmail": "recipient_email",
-    "ExternalReference": "external_reference",
-    "LocationLatitude": "location_latitude",
-    "LocationLongitude": "location_longitude",
-    "DistributionChannel": "distribution_channel",
-    "UserLanguage": "user_language",
-    "Q1_1": "reason_for_course_selection_college_credits",
-    "Q1_2": "reason_for_course_selection_specific_credits",
-    "Q1_4": "reason_for_course_selection_career_prospects",
-    "Q1_5": "reason_for_course_selection_pathway",
-    "Q1_3": "reason_for_course_selection_interest",
-    "Q1_6": "reason_for_course_selection_other",
-    "Q1_6_TEXT": "reason_for_course_selection_other_text",
-    "Q2.1_1": "satisfaction_course_rating",
-    "Q2_1": "recommendation_rating",
-    "Q2.2": "satisfaction_course_rating_text",
-    "Q3_1": "challenge_academic_support",
-    "Q3_2": "challenge_understanding_content",
-    "Q3_3": "challenge_learning_tools",
-    "Q3_4": "challenge_understanding_grades",
-    "Q3_5": "challenge_navigating_canvas",
-    "Q3_6": "challenge_getting_feedback",
-    "Q3_8": "challenge_technical_requirements_proctoring_exams",
-    "Q3_9": "challenge_other",
-    "Q3_9_TEXT": "challenge_other_text",
-    "Q4_1": "agree_content_useful_for_education",
-    "Q4_2": "agree_content_relevant_to_career",
-    "Q4_3": "agree_workload_reasonable",
-    "Q4_4": "agree_deadlines_reasonable",
-    "Q4_5": "agree_content_relevant_to_personal_experience",
-    "Q4_6": "agree_assessments_alignment_with_course",
-    "Q5_1": "useful_video_lectures",
-    "Q5_2": "useful_reading_materials",
-    "Q5_3": "useful_discussion_boards",
-    "Q5_4": "useful_interactive_tools",
-    "Q5_5": "useful_projects",
-    "Q5_6": "useful_reflection_journaling",
-    "Q5_7": "useful_engagement",
-    "Q6": "course_feedback_liked_best",
-    "Q7": "course_feedback_improvement_suggestions_text",
-    "Q8": "willing_followup_call",
-    "Q8.1": "is_18_or_older",
-    "Q8.2": "followup_email",
-    "uid": "user_id",
-    "course_id": "course_id",
-    "outcomes_id": "outcomes_id"
-}
+
+@lru_cache(maxsize=None)
+def get_column_mapping() -> Dict[str, str]:
+    """Raw Qualtrics column -> output column, as declared in the configured survey schema.
+
+    Loaded on first call, so importing this module never reads or validates the schema.
+    """
+    return dict(default_plan().rename)
@@ -5,11 +5,105 @@ load_dotenv()
 
 API_TOKEN = os.getenv("QUALTRICS_API_TOKEN")
 DATA_CENTER = os.getenv("QUALTRICS_DATA_CENTER", "iad1")
+# Overrides the data-center URL, e.g. to point the pipeline at benchmarks/fake_qualtrics.py
+QUALTRICS_BASE_URL = os.getenv("QUALTRICS_BASE_URL") or f"https://{DATA_CENTER}.qualtrics.com"
 SURVEY_ID = os.getenv("QUALTRICS_SURVEY_ID")
-EXPORT_FORMAT = "csv"
+# csv | json | ndjson; the JSON formats need an import_id for every non-metadata schema column
+EXPORT_FORMAT = os.getenv("QUALTRICS_EXPORT_FORMAT", "csv")
+# Responses decoded per batch when parsing a JSON export
+JSON_BATCH_ROWS = int(os.getenv("QUALTRICS_JSON_BATCH_ROWS", "50000"))
+CSV_ENGINE = os.getenv("QUALTRICS_CSV_ENGINE", "c")  # c | pyarrow
 
+# HTTP client configuration (shared, pooled session for all Qualtrics calls)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("QUALTRICS_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("QUALTRICS_READ_TIMEOUT", "60"))
+HTTP_MAX_RETRIES = int(os.getenv("QUALTRICS_MAX_RETRIES", "5"))
+HTTP_BACKOFF_BASE = float(os.getenv("QUALTRICS_BACKOFF_BASE", "1"))
+HTTP_BACKOFF_MAX = float(os.getenv("QUALTRICS_BACKOFF_MAX", "60"))
+QUALTRICS_MAX_REQUESTS_PER_SECOND = float(os.getenv("QUALTRICS_MAX_REQUESTS_PER_SECOND", "10"))
 
-# BigQuery configuration
+# Export polling: adaptive interval between these bounds, giving up after the timeout
+EXPORT_POLL_MIN_INTERVAL = float(os.getenv("QUALTRICS_POLL_MIN_INTERVAL", "0.5"))
+EXPORT_POLL_MAX_INTERVAL = float(os.getenv("QUALTRICS_POLL_MAX_INTERVAL", "30"))
+EXPORT_POLL_TIMEOUT = float(os.getenv("QUALTRICS_POLL_TIMEOUT", "3600"))
+
+# Survey schema (rename, dtypes, label sets, recoding rules); defaults to schemas/course_feedback.json
+SCHEMA_PATH = os.getenv("PIPELINE_SCHEMA_PATH")
+# What to do when the export header no longer matches the schema: fail | adapt
+SCHEMA_DRIFT_POLICY = os.getenv("PIPELINE_SCHEMA_DRIFT_POLICY", "fail")
+
+# Data-quality validation: failing rows go to <table_id><QUARANTINE_TABLE_SUFFIX> instead of the target table
+VALIDATE_DATA = os.getenv("PIPELINE_VALIDATE_DATA", "true").lower() == "true"
+QUARANTINE_TABLE_SUFFIX = os.getenv("PIPELINE_QUARANTINE_TABLE_SUFFIX", "_quarantine")
+
+# Per-group, per-day rollups of the schema's "rollups" metrics, loaded into <table_id><ROLLUP_TABLE_SUFFIX>
+ROLLUPS = os.getenv("PIPELINE_ROLLUPS", "false").lower() == "true"
+ROLLUP_TABLE_SUFFIX = os.getenv("PIPELINE_ROLLUP_TABLE_SUFFIX", "_daily_rollups")
+
+# Compact output: categorical labels, downcast integer codes and Arrow-backed strings
+COMPACT_OUTPUT = os.getenv("PIPELINE_COMPACT_OUTPUT", "false").lower() == "true"
+
+# Worker processes for the transform stage (1 = serial)
+TRANSFORM_WORKERS = int(os.getenv("PIPELINE_TRANSFORM_WORKERS", "1"))
+
+# Incremental export configuration
+INCREMENTAL_EXPORT = os.getenv("QUALTRICS_INCREMENTAL_EXPORT", "false").lower() == "true"
+# Also records each survey's in-flight export, so a restarted run reuses it instead of requesting a new one
+CHECKPOINT_PATH = os.getenv("QUALTRICS_CHECKPOINT_PATH", "export_checkpoint.json")
+# How long an in-flight export from an earlier run is worth reusing (Qualtrics must still have it, too)
+EXPORT_REUSE_TTL_SECONDS = float(os.getenv("QUALTRICS_EXPORT_REUSE_TTL_SECONDS", str(24 * 3600)))
+# The same for full exports, which are only as fresh as when they were requested: long enough to pick up
+# the export of a run that just died, short enough not to load responses that are hours old
+FULL_EXPORT_REUSE_TTL_SECONDS = float(os.getenv("QUALTRICS_FULL_EXPORT_REUSE_TTL_SECONDS", "900"))
+
+# Export downloads: partial files live in EXPORT_DOWNLOAD_DIR and resume with Range requests;
+# a download gives up after DOWNLOAD_MAX_STALLS interruptions in a row that made no progress
+EXPORT_DOWNLOAD_DIR = os.getenv("QUALTRICS_DOWNLOAD_DIR", "export_downloads")
+DOWNLOAD_MAX_STALLS = int(os.getenv("QUALTRICS_DOWNLOAD_MAX_STALLS", "5"))
+
+# Streaming configuration (bounded memory for large exports)
+STREAMING_EXPORT = os.getenv("QUALTRICS_STREAMING_EXPORT", "false").lower() == "true"
+STREAM_CHUNK_ROWS = int(os.getenv("QUALTRICS_STREAM_CHUNK_ROWS", "100000"))
+SPOOL_MAX_BYTES = int(os.getenv("QUALTRICS_SPOOL_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Async runner: overlap download, parse/clean and upload through queues of at most ASYNC_QUEUE_DEPTH items
+ASYNC_PIPELINE = os.getenv("PIPELINE_ASYNC", "false").lower() == "true"
+ASYNC_QUEUE_DEPTH = int(os.getenv("PIPELINE_ASYNC_QUEUE_DEPTH", "4"))
+
+# Local export cache (raw ZIPs and cleaned Parquet); disabled unless EXPORT_CACHE_DIR is set
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR")
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+EXPORT_CACHE_TTL_SECONDS = float(os.getenv("EXPORT_CACHE_TTL_SECONDS", str(6 * 3600)))
+
+# Multi-survey configuration: JSON list of surveys to run concurrently
+SURVEYS_CONFIG_PATH = os.getenv("QUALTRICS_SURVEYS_CONFIG_PATH")
+MAX_CONCURRENT_SURVEYS = int(os.getenv("QUALTRICS_MAX_CONCURRENT_SURVEYS", "4"))
+
+# Daemon mode: stay up and run the surveys on their schedules, keeping HTTP sessions, BigQuery clients and
+# compiled schemas warm. A schedule is a cron expression ("*/30 6-22 * * 1-5"), @hourly/@daily/@weekly/@monthly
+# or "@every 15m"; surveys-file entries can set their own "schedule", the rest use DAEMON_SCHEDULE
+DAEMON = os.getenv("PIPELINE_DAEMON", "false").lower() == "true"
+DAEMON_SCHEDULE = os.getenv("PIPELINE_DAEMON_SCHEDULE", "@hourly")
+# whoami is skipped while the token was confirmed less than this long ago and no request has been refused since
+DAEMON_AUTH_TTL_SECONDS = float(os.getenv("PIPELINE_DAEMON_AUTH_TTL_SECONDS", "3600"))
+# Local health/metrics endpoint (GET /health, /metrics, /runs); port 0 picks a free one
+DAEMON_HEALTH_HOST = os.getenv("PIPELINE_DAEMON_HEALTH_HOST", "127.0.0.1")
+DAEMON_HEALTH_PORT = int(os.getenv("PIPELINE_DAEMON_HEALTH_PORT", "8080"))
+# Scheduled runs kept for /runs
+DAEMON_RUN_HISTORY = int(os.getenv("PIPELINE_DAEMON_RUN_HISTORY", "100"))
+
+# Run reporting: per-stage JSON report directory and optional cProfile dump of the transform stage
+RUN_REPORT_DIR = os.getenv("PIPELINE_RUN_REPORT_DIR")
+PROFILE_TRANSFORM_PATH = os.getenv("PIPELINE_PROFILE_TRANSFORM_PATH")
+
+# BigQuery load options. Setting BQ_LOCAL_PARQUET_DIR writes Parquet files there instead of uploading.
+BQ_WRITE_DISPOSITION = os.getenv("BQ_WRITE_DISPOSITION", "WRITE_APPEND")
+BQ_WRITE_MODE = os.getenv("BQ_WRITE_MODE", "append")  # append | merge | partition_overwrite
+BQ_LOCAL_PARQUET_DIR = os.getenv("BQ_LOCAL_PARQUET_DIR")
+# Concurrent load jobs when one frame fans out to several destination tables
+BQ_UPLOAD_WORKERS = int(os.getenv("BQ_UPLOAD_WORKERS", "4"))
+
+# LESF BigQuery configuration; when BQ_PROJECT_ID is set every survey is also loaded here
 BQ_PROJECT_ID = os.getenv("BQ_PROJECT_ID")
 BQ_DATASET_ID = os.getenv("BQ_DATASET_ID")
 BQ_TABLE_ID = os.getenv("BQ_TABLE_ID")
@@ -0,0 +1,278 @@
+import json
+import re
+import signal
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+import config
+from export_cache import get_export_cache
+from instrumentation import finish_run, start_run
+from logger import setup_logger
+from orchestrator import configured_jobs, run_surveys
+from qualtrics_api import verify_authentication
+
+log = setup_logger()
+
+_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+# minute, hour, day of month, month, day of week (0 or 7 = Sunday)
+_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+_EVERY = re.compile(r"^@every\s+(\d+)\s*([smhd])$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _parse_field(text: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in text.split(","):
+        span, _, step = part.partition("/")
+        if span == "*":
+            first, last = low, high
+        elif "-" in span:
+            first, last = (int(v) for v in span.split("-", 1))
+        else:
+            first = last = int(span)
+        if not (low <= first <= last <= high) or (step and int(step) < 1):
+            raise ValueError(f"'{part}' is out of range {low}-{high}")
+        values.update(range(first, last + 1, int(step) if step else 1))
+    return values
+
+
+class Schedule:
+    """When a job runs: a five-field cron expression, an @alias or "@every <n>s|m|h|d".
+
+    Cron expressions are matched against local time at minute resolution;
+    as in cron, a job restricted by both day of month and day of week runs
+    on days matching either. @every counts from the previous run.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        every = _EVERY.match(self.expression)
+        self.interval = timedelta(seconds=int(every.group(1)) * _UNIT_SECONDS[every.group(2)]) if every else None
+        if self.interval is not None:
+            if not self.interval:
+                raise ValueError(f"Schedule '{expression}' has a zero interval")
+            return
+        fields = _ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Schedule '{expression}' needs five cron fields, an @alias or @every")
+        try:
+            parsed = [_parse_field(text, low, high) for text, (low, high) in zip(fields, _FIELDS)]
+        except ValueError as e:
+            raise ValueError(f"Schedule '{expression}': {e}") from e
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day, self.any_weekday = fields[2] == "*", fields[4] == "*"
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first time the job is due strictly after `moment`."""
+        if self.interval is not None:
+            return moment + self.interval
+        t = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+            elif t.hour not in self.hours:
+                t = (t + timedelta(hours=1)).replace(minute=0)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Schedule '{self.expression}' never comes due")
+
+
+class Daemon:
+    """Runs survey jobs on their schedules in one long-lived process.
+
+    Everything expensive to set up stays warm between runs: the interpreter
+    and its imports, the pooled Qualtrics session (get_client), the BigQuery
+    clients (get_uploader caches one per project) and the compiled plans held
+    by the jobs. whoami is only repeated once DAEMON_AUTH_TTL_SECONDS have
+    passed or Qualtrics has answered 401. Jobs that come due together run as
+    one batch through run_surveys; a run that overruns a job's next slot
+    skips it rather than running it twice. Schema or surveys-file changes
+    need a restart.
+    """
+
+    def __init__(self, jobs: List[Dict[str, Any]]):
+        self.jobs = jobs
+        self.schedules = [Schedule(job.get("schedule") or config.DAEMON_SCHEDULE) for job in jobs]
+        now = datetime.now()
+        self.next_due = [schedule.next_after(now) for schedule in self.schedules]
+        self.started_at = now
+        self.runs: deque = deque(maxlen=config.DAEMON_RUN_HISTORY)
+        self.totals = {"succeeded": 0, "failed": 0, "seconds": 0.0}
+        self.last_results: Dict[str, Dict[str, Any]] = {}
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def run_forever(self) -> None:
+        for job, due in zip(self.jobs, self.next_due):
+            schedule = job.get("schedule") or config.DAEMON_SCHEDULE
+            log.info(f"🗓️ [{job['survey_id']}] {schedule}, next run {due:%Y-%m-%d %H:%M:%S}")
+        while not self._stopping.is_set():
+            wait = (min(self.next_due) - datetime.now()).total_seconds()
+            if wait > 0 and self._stopping.wait(wait):
+                break
+            now = datetime.now()
+            due = [i for i, when in enumerate(self.next_due) if when <= now]
+            if not due:
+                continue
+            self.run_jobs([self.jobs[i] for i in due])
+            finished = datetime.now()
+            for i in due:
+                self.next_due[i] = self.schedules[i].next_after(finished)
+        log.info("👋 Daemon stopped")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def run_jobs(self, jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run one batch of jobs and record it for the health endpoint."""
+        started_at = datetime.now()
+        start_run(config.PROFILE_TRANSFORM_PATH)
+        try:
+            verify_authentication(max_age=config.DAEMON_AUTH_TTL_SECONDS)
+            results = run_surveys(jobs, config.MAX_CONCURRENT_SURVEYS)
+        except Exception as e:
+            log.error(f"❌ Scheduled run failed: {e}")
+            results = [{"survey_id": job["survey_id"], "table_id": job["destinations"][0]["table_id"],
+                        "status": "failed", "error": str(e)} for job in jobs]
+        finally:
+            summary = finish_run(config.RUN_REPORT_DIR)
+        status = "succeeded" if all(r["status"] == "succeeded" for r in results) else "failed"
+        run = {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "seconds": summary["total_seconds"],
+            "status": status,
+            "surveys": results,
+            "stages": {name: total["seconds"] for name, total in summary["totals"].items()},
+        }
+        with self._lock:
+            self.runs.append(run)
+            self.totals[status] += 1
+            self.totals["seconds"] += run["seconds"]
+            finished_at = datetime.now().isoformat(timespec="seconds")
+            for result in results:
+                self.last_results[result["survey_id"]] = {**result, "finished_at": finished_at}
+        log.info(f"🕒 Scheduled run {status} in {run['seconds']:.1f}s")
+        return run
+
+    def health(self) -> Dict[str, Any]:
+        """Healthy until the latest run of some survey has failed."""
+        with self._lock:
+            failing = sorted(s for s, r in self.last_results.items() if r["status"] != "succeeded")
+            return {
+                "status": "failing" if failing else "ok",
+                "failing_surveys": failing,
+                "uptime_seconds": round((datetime.now() - self.started_at).total_seconds(), 1),
+                "runs": {k: self.totals[k] for k in ("succeeded", "failed")},
+                "last_run": self.runs[-1] if self.runs else None,
+                "next_runs": {job["survey_id"]: due.isoformat(timespec="seconds")
+                              for job, due in zip(self.jobs, self.next_due)},
+            }
+
+    def metrics(self) -> str:
+        """Run counts and latencies in the Prometheus text format."""
+        with self._lock:
+            runs = sum(self.totals[k] for k in ("succeeded", "failed"))
+            lines = [
+                "# HELP pipeline_runs_total Scheduled runs by outcome",
+                "# TYPE pipeline_runs_total counter",
+                *(f'pipeline_runs_total{{status="{k}"}} {self.totals[k]}' for k in ("succeeded", "failed")),
+                "# HELP pipeline_run_seconds Wall time of scheduled runs",
+                "# TYPE pipeline_run_seconds summary",
+                f"pipeline_run_seconds_sum {self.totals['seconds']:.3f}",
+                f"pipeline_run_seconds_count {runs}",
+            ]
+            if self.runs:
+                last = self.runs[-1]
+                lines += ["# HELP pipeline_last_run_seconds Wall time of the latest run",
+                          "# TYPE pipeline_last_run_seconds gauge",
+                          f"pipeline_last_run_seconds {last['seconds']}",
+                          "# HELP pipeline_last_run_stage_seconds Time spent per stage in the latest run",
+                          "# TYPE pipeline_last_run_stage_seconds gauge"]
+                lines += [f'pipeline_last_run_stage_seconds{{stage="{name}"}} {seconds}'
+                          for name, seconds in last["stages"].items()]
+            lines += ["# HELP pipeline_survey_up Whether the survey's latest run succeeded",
+                      "# TYPE pipeline_survey_up gauge"]
+            lines += [f'pipeline_survey_up{{survey_id="{s}"}} {int(r["status"] == "succeeded")}'
+                      for s, r in self.last_results.items()]
+        return "\n".join(lines) + "\n"
+
+    def serve_health(self, host: str, port: int) -> str:
+        """Serve GET /health, /metrics and /runs from a background thread; returns the base URL."""
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        url = f"http://{host}:{self._server.server_address[1]}"
+        log.info(f"🩺 Health endpoint on {url}/health")
+        return url
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status: int, body: str, content_type: str) -> None:
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    health = daemon.health()
+                    self._send(200 if health["status"] == "ok" else 503, json.dumps(health), "application/json")
+                elif self.path == "/metrics":
+                    self._send(200, daemon.metrics(), "text/plain; version=0.0.4")
+                elif self.path == "/runs":
+                    with daemon._lock:
+                        runs = list(daemon.runs)
+                    self._send(200, json.dumps(runs), "application/json")
+                else:
+                    self._send(404, json.dumps({"error": "not found"}), "application/json")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def run_daemon() -> None:
+    """Run the configured surveys on their schedules until SIGINT/SIGTERM."""
+    daemon = Daemon(configured_jobs())
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    verify_authentication(max_age=config.DAEMON_AUTH_TTL_SECONDS)
+    daemon.serve_health(config.DAEMON_HEALTH_HOST, config.DAEMON_HEALTH_PORT)
+    try:
+        daemon.run_forever()
+    finally:
+        daemon.close()
+        if get_export_cache():
+            get_export_cache().log_stats()
@@ -0,0 +1,171 @@
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+import pandas as pd
+import config
+import transformer
+from schema_registry import TransformPlan
+from logger import setup_logger
+
+log = setup_logger()
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(f: BinaryIO) -> str:
+    """Content hash of an open file, read from the start; leaves it rewound."""
+    f.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+# Cleaned results are only valid for the transform code that produced them
+TRANSFORM_FINGERPRINT = _sha256(inspect.getsource(transformer).encode())
+
+
+class ExportCache:
+    """On-disk cache of raw export ZIPs and cleaned Parquet, evicted least-recently-used by size.
+
+    Raw exports are keyed by survey id and export parameters (so an incremental
+    export is reused until its checkpoint advances) and expire after `ttl_seconds`.
+    Only incremental exports are stored: a full export's key never changes, so
+    a stored copy would be served stale (see pipeline.start_export).
+    Cleaned results are keyed by the ZIP's content hash, the survey schema and
+    the transform code, so they never go stale and need no expiry.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl_seconds: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"export_hits": 0, "export_misses": 0, "cleaned_hits": 0, "cleaned_misses": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "exports"), exist_ok=True)
+        os.makedirs(os.path.join(root, "cleaned"), exist_ok=True)
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _export_paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, "exports", key)
+        return f"{base}.zip", f"{base}.json"
+
+    def _cleaned_path(self, key: str) -> str:
+        return os.path.join(self.root, "cleaned", f"{key}.parquet")
+
+    @staticmethod
+    def export_key(survey_id: str, params: Dict[str, Any]) -> str:
+        return _sha256(json.dumps({"survey_id": survey_id, **params}, sort_keys=True).encode())
+
+    @staticmethod
+    def cleaned_key(file_sha256: str, plan: TransformPlan) -> str:
+        return _sha256(json.dumps([file_sha256, plan.fingerprint, TRANSFORM_FINGERPRINT]).encode())
+
+    def has_export(self, key: str) -> bool:
+        zip_path, meta_path = self._export_paths(key)
+        fresh = False
+        if os.path.exists(zip_path) and os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                fresh = time.time() - json.load(f)["created"] < self.ttl_seconds
+        self._count("export_hits" if fresh else "export_misses")
+        log.info(f"📦 Export cache {'hit' if fresh else 'miss'} ({key[:12]})")
+        return fresh
+
+    def open_export(self, key: str) -> Tuple[BinaryIO, Dict[str, Any]]:
+        """Open a cached export; returns the ZIP file and {"result": ..., "sha256": ...}."""
+        zip_path, meta_path = self._export_paths(key)
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        os.utime(zip_path)  # mark as recently used
+        return open(zip_path, "rb"), meta
+
+    def put_export(self, key: str, zip_file: BinaryIO, result: Dict[str, Any]) -> Tuple[BinaryIO, Dict[str, Any]]:
+        """Copy a downloaded export into the cache, hashing it on the way, and reopen it from disk."""
+        zip_path, meta_path = self._export_paths(key)
+        digest = hashlib.sha256()
+        with zip_file, open(f"{zip_path}.tmp", "wb") as out:
+            for block in iter(lambda: zip_file.read(1024 * 1024), b""):
+                digest.update(block)
+                out.write(block)
+        os.replace(f"{zip_path}.tmp", zip_path)
+        meta = {"result": result, "sha256": digest.hexdigest(), "created": time.time()}
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        self.evict(keep=zip_path)
+        return open(zip_path, "rb"), meta
+
+    def get_cleaned(self, key: str) -> Optional[pd.DataFrame]:
+        path = self._cleaned_path(key)
+        if not os.path.exists(path):
+            self._count("cleaned_misses")
+            log.info(f"📦 Cleaned cache miss ({key[:12]})")
+            return None
+        self._count("cleaned_hits")
+        log.info(f"📦 Cleaned cache hit ({key[:12]})")
+        os.utime(path)
+        # Compact output stores Arrow-backed strings; restore them as such rather than as python strings
+        with pd.option_context("mode.string_storage", "pyarrow"):
+            return pd.read_parquet(path)
+
+    def put_cleaned(self, key: str, df: pd.DataFrame) -> None:
+        path = self._cleaned_path(key)
+        # pandas metadata in the file restores Int64/datetime/object dtypes exactly
+        df.to_parquet(f"{path}.tmp", engine="pyarrow", index=False)
+        os.replace(f"{path}.tmp", path)
+        self.evict(keep=path)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Delete least recently used entries until the cache fits in max_bytes.
+
+        `keep`, the entry just written, is never evicted, even if it alone is over the limit.
+        """
+        with self._lock:
+            entries = []
+            for sub in ("exports", "cleaned"):
+                folder = os.path.join(self.root, sub)
+                for name in os.listdir(folder):
+                    if name.endswith((".zip", ".parquet")):
+                        path = os.path.join(folder, name)
+                        stat = os.stat(path)
+                        entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if path == keep:
+                    continue
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                meta_path = os.path.splitext(path)[0] + ".json"
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                total -= size
+                log.info(f"🧹 Evicted {os.path.basename(path)} from cache ({size:,} bytes)")
+
+    def log_stats(self) -> None:
+        log.info("📦 Cache stats: " + ", ".join(f"{k}={v}" for k, v in self.stats.items()))
+
+
+_cache: Optional[ExportCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_export_cache() -> Optional[ExportCache]:
+    """Return the process-wide cache, or None when EXPORT_CACHE_DIR is not set."""
+    global _cache
+    if not config.EXPORT_CACHE_DIR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExportCache(config.EXPORT_CACHE_DIR, config.EXPORT_CACHE_MAX_BYTES,
+                                 config.EXPORT_CACHE_TTL_SECONDS)
+        return _cache
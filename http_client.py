@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+import config
+from instrumentation import count_http_request
+from logger import setup_logger
+
+log = setup_logger()
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods a repeated request can't change the outcome of; anything else (POST) is only retried when it can't have run
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# A 429 is turned away before the request is acted on
+NOT_PROCESSED_STATUSES = {429}
+
+
+def _not_sent(error: requests.RequestException) -> bool:
+    """Whether the request failed while connecting, before the server could have seen it."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class RateLimiter:
+    """Token bucket shared by every thread that talks to Qualtrics."""
+
+    def __init__(self, rate_per_sec: float, burst: Optional[int] = None):
+        self.rate = rate_per_sec
+        self.capacity = burst or max(1, int(rate_per_sec))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class QualtricsClient:
+    """Pooled keep-alive session with timeouts, rate limiting and retry on 429/5xx.
+
+    Retries use exponential backoff with full jitter, except when the server
+    sends Retry-After, which is honoured as given. Every attempt (including
+    retries) goes through the rate limiter. A 401 sets `unauthorized` until
+    the token is confirmed again.
+
+    Only idempotent methods are retried on 5xx and dropped connections. A
+    POST (e.g. starting an export, which uses up export quota) is only
+    retried on 429 or when the connection couldn't be made, since otherwise
+    Qualtrics may already have acted on it.
+    """
+
+    def __init__(self, api_token: str, connect_timeout: float, read_timeout: float, max_retries: int,
+                 backoff_base: float, backoff_max: float, rate_per_sec: float, pool_size: int):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = RateLimiter(rate_per_sec)
+        self.unauthorized = False
+        self.session = requests.Session()
+        self.session.headers["X-API-TOKEN"] = api_token or ""
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(resp: requests.Response) -> Optional[float]:
+        value = resp.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else NOT_PROCESSED_STATUSES
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            count_http_request()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries or not (idempotent or _not_sent(e)):
+                    raise
+                delay = self._backoff(attempt)
+                log.warning(f"⚠️ {method} {url} failed ({e}); retrying in {delay:.1f}s")
+            else:
+                if resp.status_code == 401:
+                    self.unauthorized = True
+                if resp.status_code not in retry_statuses or attempt == self.max_retries:
+                    return resp
+                delay = self._retry_after(resp)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                log.warning(f"⚠️ {method} {url} returned {resp.status_code}; retrying in {delay:.1f}s")
+                resp.close()
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_client: Optional[QualtricsClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> QualtricsClient:
+    """Return the process-wide Qualtrics client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = QualtricsClient(
+                api_token=config.API_TOKEN,
+                connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+                read_timeout=config.HTTP_READ_TIMEOUT,
+                max_retries=config.HTTP_MAX_RETRIES,
+                backoff_base=config.HTTP_BACKOFF_BASE,
+                backoff_max=config.HTTP_BACKOFF_MAX,
+                rate_per_sec=config.QUALTRICS_MAX_REQUESTS_PER_SECOND,
+                # One connection per concurrently running survey, plus headroom
+                pool_size=config.MAX_CONCURRENT_SURVEYS + 2,
+            )
+        return _client
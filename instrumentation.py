@@ -0,0 +1,133 @@
+import cProfile
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from logger import setup_logger
+
+log = setup_logger()
+
+
+class RunReport:
+    """Per-stage timings and counters for one pipeline run.
+
+    Stages are recorded as a flat list in completion order; each carries wall
+    time, the HTTP requests it made, whatever rows/bytes the stage itself
+    reports and two memory figures. ru_maxrss is a process-wide high-water
+    mark, so process_peak_rss_mb is the peak of the whole process so far, not
+    of the stage; peak_rss_growth_mb is how far the process peak rose while
+    the stage ran (0 when it stayed within memory already used, and shared
+    with whatever ran concurrently).
+    """
+
+    def __init__(self, profile_path: Optional[str] = None):
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.profile_path = profile_path
+        self.profiler = cProfile.Profile() if profile_path else None
+        self._profiling = False
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        totals: Dict[str, Dict[str, Any]] = {}
+        for record in self.stages:
+            total = totals.setdefault(record["stage"], {"calls": 0, "seconds": 0.0})
+            total["calls"] += 1
+            for key in ("seconds", "rows", "bytes", "http_requests"):
+                if key in record:
+                    total[key] = round(total.get(key, 0) + record[key], 3)
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "peak_rss_mb": _peak_rss_mb(),
+            "totals": totals,
+            "stages": self.stages,
+        }
+
+
+_current: Optional[RunReport] = None
+_local = threading.local()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def start_run(profile_path: Optional[str] = None) -> RunReport:
+    """Begin collecting a report; stages outside a run are not recorded."""
+    global _current
+    _current = RunReport(profile_path)
+    return _current
+
+
+def finish_run(report_dir: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Stop collecting, log a summary and write the JSON report (and profile) if configured."""
+    global _current
+    report, _current = _current, None
+    if report is None:
+        return None
+    summary = report.to_dict()
+    for name, total in summary["totals"].items():
+        log.info(f"⏱️ {name}: " + ", ".join(f"{k}={v}" for k, v in total.items()))
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, f"run_report_{report.started_at:%Y%m%d_%H%M%S}.json")
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2, default=str)
+        log.info(f"📁 Run report written to {path}")
+    if report.profiler is not None:
+        report.profiler.dump_stats(report.profile_path)
+        log.info(f"📁 Transform profile written to {report.profile_path}")
+    return summary
+
+
+@contextmanager
+def stage(name: str, profile: bool = False, **fields) -> Iterator[Dict[str, Any]]:
+    """Time a pipeline stage. The yielded dict can be filled with rows/bytes as they become known."""
+    record: Dict[str, Any] = {"stage": name, **fields, "http_requests": 0}
+    report = _current
+    if report is None:
+        yield record
+        return
+
+    profiling = False
+    if profile and report.profiler is not None:
+        with report._lock:
+            # cProfile can only be active in one thread at a time
+            if not report._profiling:
+                report._profiling = profiling = True
+    # Stages can nest; requests count toward the innermost one, and toward its parent again once it ends
+    outer = getattr(_local, "record", None)
+    _local.record = record
+    if profiling:
+        report.profiler.enable()
+    peak_before = _peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        if profiling:
+            report.profiler.disable()
+            report._profiling = False
+        record["process_peak_rss_mb"] = _peak_rss_mb()
+        record["peak_rss_growth_mb"] = round(record["process_peak_rss_mb"] - peak_before, 1)
+        _local.record = outer
+        with report._lock:
+            report.stages.append(record)
+
+
+def count_http_request() -> None:
+    """Attribute one HTTP request to the stage running in this thread."""
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record["http_requests"] += 1
@@ -0,0 +1,204 @@
+import io
+import itertools
+import json
+import re
+import zipfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pajson
+from instrumentation import stage
+from schema_registry import SURVEY_METADATA_IDS, TransformPlan
+from transformer import EXPORT_LABEL_PREFIX
+
+# Between records of the "responses" array
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def json_field_keys(schema: TransformPlan) -> Dict[str, str]:
+    """Source column -> key of its value in a JSON export record.
+
+    JSON exports key values by import id (QID4_1, startDate, embedded field
+    names) rather than by CSV header, so every column must have one; raises
+    ValueError naming the columns that don't.
+    """
+    keys, missing = {}, []
+    for source in schema.rename:
+        key = schema.questions.get(source, (None, None))[1] or SURVEY_METADATA_IDS.get(source)
+        if key:
+            keys[source] = key
+        else:
+            missing.append(source)
+    if missing:
+        raise ValueError(f"Schema '{schema.name}' needs an import_id for {missing} to read JSON exports")
+    return keys
+
+
+def iter_json_records(f: BinaryIO, block_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Yield the objects of a {"responses": [...]} document one at a time.
+
+    Decodes record by record from a sliding text buffer instead of loading
+    the whole document, so memory follows the batch size, not the export.
+    """
+    text = io.TextIOWrapper(f, encoding="utf-8-sig")
+    decoder = json.JSONDecoder()
+    buf, eof = "", False
+    while True:
+        key = buf.find('"responses"')
+        bracket = buf.find("[", key) if key >= 0 else -1
+        if bracket >= 0:
+            break
+        block = text.read(block_size)
+        if not block:
+            raise ValueError("JSON export has no responses array")
+        buf += block
+    pos = bracket + 1
+    while True:
+        pos = _SEPARATORS.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                raise ValueError("JSON export ended inside the responses array")
+            buf, pos = text.read(block_size), 0
+            eof = not buf
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            record, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # The record runs past the end of the buffer
+            if eof:
+                raise
+            block = text.read(block_size)
+            buf, pos, eof = buf[pos:] + block, 0, not block
+            continue
+        yield record
+
+
+def _typed(values: List[Any], dtype: str) -> Any:
+    """Column of the dtype the CSV parser produces for `dtype`, or the raw values
+    if any would be lost, so clean_dataframe reports them like a bad CSV cell."""
+    if dtype == "Int64":
+        try:
+            return np.array(values, dtype="float64")
+        except (TypeError, ValueError):
+            pass
+    elif dtype == "datetime":
+        parsed = pd.to_datetime(pd.Series(values, dtype=object), format="ISO8601", utc=True, errors="coerce")
+        present = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+        if not (present & parsed.isna().to_numpy()).any():
+            return parsed.dt.tz_localize(None).to_numpy()
+    else:
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+    column = np.array(values, dtype=object)
+    column[pd.isna(column)] = np.nan
+    return column
+
+
+def records_to_frame(records: List[Dict[str, Any]], fields: Dict[str, Tuple[str, str]],
+                     label_fields: Dict[str, str]) -> pd.DataFrame:
+    """Turn a batch of records into one typed column per source column.
+
+    `fields` maps source column -> (record key, dtype); `label_fields` maps an
+    export-label column -> the record key whose Qualtrics label it carries.
+    """
+    values = [record.get("values", {}) for record in records]
+    columns = {source: _typed([v.get(key) for v in values], dtype) for source, (key, dtype) in fields.items()}
+    if label_fields:
+        labels = [record.get("labels", {}) for record in records]
+        for column, key in label_fields.items():
+            columns[column] = _typed([label.get(key) for label in labels], "str")
+    return pd.DataFrame(columns)
+
+
+def _arrow_schema(fields: Dict[str, Tuple[str, str]], label_fields: Dict[str, str]) -> pa.Schema:
+    arrow_types = {"datetime": pa.timestamp("ns"), "Int64": pa.float64(), "str": pa.string()}
+    value_types = {key: arrow_types[dtype] for key, dtype in fields.values()}
+    schema = [("values", pa.struct(list(value_types.items())))]
+    if label_fields:
+        schema.append(("labels", pa.struct([(key, pa.string()) for key in dict.fromkeys(label_fields.values())])))
+    return pa.schema(schema)
+
+
+def ndjson_to_frame(data: bytes, fields: Dict[str, Tuple[str, str]], label_fields: Dict[str, str]) -> pd.DataFrame:
+    """records_to_frame for a block of NDJSON lines, decoded by Arrow's JSON reader.
+
+    Only the mapped keys are materialised, straight into typed columns. A
+    value that doesn't fit its column's type (e.g. text in a coded column)
+    fails the block, which is then decoded record by record instead.
+    """
+    try:
+        table = pajson.read_json(io.BytesIO(data), parse_options=pajson.ParseOptions(
+            explicit_schema=_arrow_schema(fields, label_fields), unexpected_field_behavior="ignore"))
+    except pa.ArrowInvalid:
+        return records_to_frame([json.loads(line) for line in data.splitlines() if line.strip()], fields, label_fields)
+    values = table.column("values").combine_chunks()
+    arrays = [values.field(key) for key, _ in fields.values()]
+    names = list(fields)
+    if label_fields:
+        labels = table.column("labels").combine_chunks()
+        arrays += [labels.field(key) for key in label_fields.values()]
+        names += list(label_fields)
+    df = pa.Table.from_arrays(arrays, names=names).to_pandas()
+    # Match the CSV parser, which leaves NaN rather than None in missing text cells
+    str_cols = [col for col in df.columns if df[col].dtype == object]
+    df[str_cols] = df[str_cols].where(df[str_cols].notna(), np.nan)
+    return df
+
+
+def _read_plan(schema: TransformPlan) -> Tuple[Dict[str, Tuple[str, str]], Dict[str, str]]:
+    keys = json_field_keys(schema)
+    fields = {source: (key, schema.dtypes[schema.rename[source]]) for source, key in keys.items()}
+    label_fields = {}
+    if schema.export.labels_from_export:
+        raw_source = {name: source for source, name in schema.rename.items()}
+        for spec in schema.label_specs:
+            # Labels Qualtrics derives from the current survey can't follow a historical recode
+            if spec.before_cutoff is None and spec.source in raw_source:
+                label_fields[f"{EXPORT_LABEL_PREFIX}{spec.source}"] = keys[raw_source[spec.source]]
+    return fields, label_fields
+
+
+def read_json_chunks(f: BinaryIO, chunksize: int, schema: TransformPlan, fmt: str) -> Iterator[pd.DataFrame]:
+    """Yield typed chunks of `chunksize` responses from a json or ndjson export stream.
+
+    The chunks have the same source columns and dtypes as the CSV parser's,
+    so clean_dataframe treats them alike (there are no header rows to skip).
+    """
+    fields, label_fields = _read_plan(schema)
+    if fmt == "ndjson":
+        while True:
+            with stage("parse", engine=fmt) as record:
+                lines = list(itertools.islice(f, chunksize))
+                record["rows"] = len(lines)
+                if not lines:
+                    return
+                chunk = ndjson_to_frame(b"".join(lines), fields, label_fields)
+            yield chunk
+    records = iter_json_records(f)
+    while True:
+        with stage("parse", engine=fmt) as record:
+            batch = [r for _, r in zip(range(chunksize), records)]
+            record["rows"] = len(batch)
+            if not batch:
+                return
+            chunk = records_to_frame(batch, fields, label_fields)
+        yield chunk
+
+
+def read_json_export(zip_file: BinaryIO, schema: TransformPlan, fmt: str, chunksize: int) -> pd.DataFrame:
+    """Parse the JSON member of an export ZIP into one typed frame, `chunksize` records at a time."""
+    with zipfile.ZipFile(zip_file) as z:
+        with z.open(z.namelist()[0]) as f:
+            chunks = list(read_json_chunks(f, chunksize, schema, fmt))
+    if not chunks:
+        return records_to_frame([], *_read_plan(schema))
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+def read_json_export_chunks(zip_file: BinaryIO, schema: TransformPlan, fmt: str,
+                            chunksize: int) -> Iterator[pd.DataFrame]:
+    with zipfile.ZipFile(zip_file) as z:
+        with z.open(z.namelist()[0]) as f:
+            yield from read_json_chunks(f, chunksize, schema, fmt)
@@ -1,8 +1,15 @@
 import logging
 
+_configured = False
+
+
 def setup_logger():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s"
-    )
+    """The pipeline logger. Every module calls this at import; only the first call configures logging."""
+    global _configured
+    if not _configured:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s [%(levelname)s] %(message)s"
+        )
+        _configured = True
     return logging.getLogger(__name__)
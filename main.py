@@ -1,54 +1,185 @@
-import config
-from qualtrics_api import verify_authentication, initiate_export, wait_for_export, download_responses
-from transformer import clean_dataframe
-from column_mapping import COLUMN_MAPPING
-from logger import setup_logger
-from bigquery_uploader import upload_dataframe_to_bq
-from datetime import datetime
+"""Command-line entry point.
+
+    python main.py [run]            export, clean and load the configured surveys (the default)
+    python main.py dry-run          check config, schemas and credentials, and print what a run would request
+    python main.py validate-schema  validate and compile survey schema files
+    python main.py export-only      download the export ZIPs without cleaning or loading them
+
+Every subcommand imports the pipeline modules it needs when it runs, so
+--help loads nothing but argparse, validate-schema skips the Qualtrics
+client, and google-cloud-bigquery is only imported for an actual load.
+validate-schema and dry-run still import pandas (and with it pyarrow):
+compiling a schema parses its date cutoffs into pandas Timestamps.
+"""
+import argparse
+import sys
 
-log = setup_logger()
 
 def run_pipeline():
+    import asyncio
+    import config
+    from async_pipeline import run_survey_async
+    from logger import setup_logger
+    from pipeline import default_destinations, run_survey
+    from qualtrics_api import verify_authentication
+    from schema_registry import default_plan
+
+    log = setup_logger()
     try:
+        # Compile the schema first so a bad schema fails before anything is requested
+        plan = default_plan()
         verify_authentication()
-        progress_id = initiate_export(config.SURVEY_ID)
-        file_id = wait_for_export(config.SURVEY_ID, progress_id)
-        raw_df = download_responses(config.SURVEY_ID, file_id)
-        final_df = clean_dataframe(raw_df, COLUMN_MAPPING)
-        log.info("✅ DataFrame ready.")
-        log.info(final_df.head())
-        log.info(f"Shape: {final_df.shape}")
-        # uploading to LESF BigQuery
-    #     upload_dataframe_to_bq(
-    #     final_df,
-    #     project_id=config.BQ_PROJECT_ID,
-    #     dataset_id=config.BQ_DATASET_ID,
-    #     table_id=config.BQ_TABLE_ID,
-    #     credentials_path=config.BQ_CREDENTIALS_PATH  # You’ll generate this in GCP setup
-    # )
-        # upload to VG BigQuery
-        upload_dataframe_to_bq(
-            final_df,
-            project_id=config.VG_BQ_PROJECT_ID,
-            dataset_id=config.VG_BQ_DATASET_ID,
-            table_id=config.VG_BQ_TABLE_ID,
-            credentials_path=config.VG_BQ_CREDENTIALS_PATH
-        )
-        # return final_df
+        # upload to VG BigQuery, and to LESF BigQuery too when BQ_PROJECT_ID is set
+        if config.ASYNC_PIPELINE:
+            asyncio.run(run_survey_async(config.SURVEY_ID, plan, default_destinations()))
+        else:
+            run_survey(config.SURVEY_ID, plan, default_destinations())
     except Exception as e:
         log.error(f"❌ Pipeline failed: {e}")
         raise
 
-if __name__ == "__main__":
-    run_pipeline()
+def run_all_surveys():
+    import config
+    from orchestrator import load_survey_jobs, run_surveys
+    from qualtrics_api import verify_authentication
+
+    jobs = load_survey_jobs(config.SURVEYS_CONFIG_PATH)
+    verify_authentication()
+    results = run_surveys(jobs, config.MAX_CONCURRENT_SURVEYS)
+    failed = [r for r in results if r["status"] != "succeeded"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(results)} surveys failed: {[r['survey_id'] for r in failed]}")
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    import config
+    if args.daemon or config.DAEMON:
+        from daemon import run_daemon
+        run_daemon()
+        return 0
+
+    from export_cache import get_export_cache
+    from instrumentation import finish_run, start_run
+    start_run(config.PROFILE_TRANSFORM_PATH)
+    try:
+        if config.SURVEYS_CONFIG_PATH:
+            run_all_surveys()
+        else:
+            run_pipeline()
+    finally:
+        finish_run(config.RUN_REPORT_DIR)
+        if get_export_cache():
+            get_export_cache().log_stats()
+    return 0
+
+
+def cmd_dry_run(args: argparse.Namespace) -> int:
+    import json
+    import config
+    from orchestrator import configured_jobs
+    from pipeline import export_request
+    from qualtrics_api import verify_authentication
+
+    jobs = configured_jobs()
+    if not args.skip_auth:
+        verify_authentication()
+    plans = []
+    for job in jobs:
+        plan = job["plan"]
+        plans.append({
+            "survey_id": job["survey_id"],
+            "schema": {"name": plan.name, "fingerprint": plan.fingerprint[:12]},
+            "export_request": export_request(job["survey_id"], plan),
+            "destinations": [f"{d['project_id']}.{d['dataset_id']}.{d['table_id']}" for d in job["destinations"]],
+            "write_mode": config.BQ_WRITE_MODE,
+            "schedule": (job.get("schedule") or config.DAEMON_SCHEDULE) if config.DAEMON else None,
+        })
+    print(json.dumps(plans, indent=2))
+    return 0
+
+
+def configured_schema_paths() -> list:
+    """The default schema and every schema named in the surveys file, without loading the surveys' jobs."""
+    import json
+    import config
+    from schema_registry import DEFAULT_SCHEMA_PATH
 
-    # # Optional: export as CSV
-    # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    # output_dir = "exports"
-    # os.makedirs(output_dir, exist_ok=True)
-    # csv_path = os.path.join(output_dir, f"qualtrics_data_{timestamp}.csv")
-    # df.to_csv(csv_path, index=False)
-    # log.info(f"📁 Data exported to CSV: {csv_path}")
+    paths = [config.SCHEMA_PATH or DEFAULT_SCHEMA_PATH]
+    if config.SURVEYS_CONFIG_PATH:
+        with open(config.SURVEYS_CONFIG_PATH, "r") as f:
+            paths += [entry["schema"] for entry in json.load(f) if entry.get("schema")]
+    return list(dict.fromkeys(paths))
 
 
-    
+def cmd_validate_schema(args: argparse.Namespace) -> int:
+    from schema_registry import SchemaError, load_plan
+
+    failed = 0
+    for path in args.paths or configured_schema_paths():
+        try:
+            plan = load_plan(path)
+        except SchemaError as e:
+            print(f"❌ {e}")
+            failed += 1
+            continue
+        print(f"✅ {path}: '{plan.name}', {len(plan.rename)} columns, fingerprint {plan.fingerprint[:12]}")
+    return 1 if failed else 0
+
+
+def cmd_export_only(args: argparse.Namespace) -> int:
+    from logger import setup_logger
+    from orchestrator import configured_jobs
+    from pipeline import save_export, start_export
+    from qualtrics_api import verify_authentication
+
+    log = setup_logger()
+    jobs = configured_jobs()
+    verify_authentication()
+    # Start every export before waiting on any, so Qualtrics generates them in parallel
+    exports = [(job["survey_id"], start_export(job["survey_id"], job["plan"])) for job in jobs]
+    failed = 0
+    for survey_id, export in exports:
+        try:
+            save_export(survey_id, export, args.output_dir)
+        except Exception as e:
+            log.error(f"❌ [{survey_id}] Export failed: {e}")
+            failed += 1
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="main.py", description="Export Qualtrics surveys, clean them and load them into BigQuery.",
+        epilog="Settings come from the environment (or .env); see config.py.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    run = commands.add_parser("run", help="export, clean and load the configured surveys (default)")
+    run.add_argument("--daemon", action="store_true",
+                     help="stay up and run the surveys on their schedules (same as PIPELINE_DAEMON=true)")
+    run.set_defaults(handler=cmd_run)
+
+    dry_run = commands.add_parser("dry-run", help="check config, schemas and credentials; export and load nothing")
+    dry_run.add_argument("--skip-auth", action="store_true", help="don't check the Qualtrics token with whoami")
+    dry_run.set_defaults(handler=cmd_dry_run)
+
+    validate = commands.add_parser("validate-schema", help="validate and compile survey schema files")
+    validate.add_argument("paths", nargs="*",
+                          help="schema files (default: the configured schema and those in the surveys file)")
+    validate.set_defaults(handler=cmd_validate_schema)
+
+    export_only = commands.add_parser("export-only", help="download the export ZIPs without cleaning or loading them")
+    export_only.add_argument("--output-dir", default="exports", help="where the ZIPs are written (default: exports)")
+    export_only.set_defaults(handler=cmd_export_only)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        # `python main.py` on its own keeps doing what it always did
+        args = build_parser().parse_args(["run"])
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+from logger import setup_logger
+import config
+from pipeline import default_destination, default_destinations, run_survey, start_export
+from schema_registry import default_plan, load_plan
+
+log = setup_logger()
+
+
+def load_survey_jobs(path: str) -> List[Dict[str, Any]]:
+    """Read the surveys file: a JSON list of {"survey_id", "schema", destination fields, "destinations", "schedule"}.
+
+    `schema` is an optional path to a survey schema file (defaults to the
+    configured schema); every schema is validated and compiled here, so a bad
+    one fails the run before anything is exported. Any of
+    project_id/dataset_id/table_id/credentials_path that are left out fall back
+    to the VG BigQuery configuration. `destinations` optionally lists further
+    tables the cleaned survey is also loaded into; their missing fields fall
+    back to the survey's own destination. `schedule` is only used in daemon
+    mode (see daemon.py).
+    """
+    with open(path, "r") as f:
+        entries = json.load(f)
+
+    jobs = []
+    for entry in entries:
+        if "survey_id" not in entry:
+            raise ValueError(f"Survey entry without survey_id in {path}: {entry}")
+        plan = load_plan(entry["schema"]) if entry.get("schema") else default_plan()
+        destination = default_destination()
+        destination.update({k: entry[k] for k in destination if entry.get(k)})
+        extra = [{**destination, **{k: d[k] for k in destination if d.get(k)}} for d in entry.get("destinations", [])]
+        jobs.append({"survey_id": entry["survey_id"], "plan": plan, "destinations": [destination, *extra],
+                     "schedule": entry.get("schedule")})
+    return jobs
+
+
+def configured_jobs() -> List[Dict[str, Any]]:
+    """The surveys file's jobs, or the single QUALTRICS_SURVEY_ID survey when no surveys file is configured."""
+    if config.SURVEYS_CONFIG_PATH:
+        return load_survey_jobs(config.SURVEYS_CONFIG_PATH)
+    return [{"survey_id": config.SURVEY_ID, "plan": default_plan(), "destinations": default_destinations()}]
+
+
+def _run_job(job: Dict[str, Any], export: Dict[str, Any]) -> None:
+    run_survey(job["survey_id"], job["plan"], job["destinations"], export=export)
+
+
+def run_surveys(jobs: List[Dict[str, Any]], max_workers: int) -> List[Dict[str, Any]]:
+    """Export, clean and upload several surveys concurrently.
+
+    All exports are started up front so Qualtrics generates them in parallel;
+    a pool of `max_workers` threads then polls each one and carries it through
+    download, clean and upload as soon as it is ready. One survey failing does
+    not stop the others. Returns one result per job, in job order.
+    """
+    started = time.perf_counter()
+    results: List[Dict[str, Any]] = [
+        {"survey_id": job["survey_id"], "table_id": job["destinations"][0]["table_id"], "status": "pending"}
+        for job in jobs
+    ]
+
+    exports = {}
+    for i, job in enumerate(jobs):
+        try:
+            exports[i] = start_export(job["survey_id"], job["plan"])
+        except Exception as e:
+            results[i].update(status="failed", error=str(e), seconds=0.0)
+            log.error(f"❌ [{job['survey_id']}] Could not start export: {e}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_run_job, jobs[i], export): i for i, export in exports.items()}
+        for future in as_completed(futures):
+            i = futures[future]
+            seconds = round(time.perf_counter() - started, 2)
+            try:
+                future.result()
+                results[i].update(status="succeeded", seconds=seconds)
+            except Exception as e:
+                results[i].update(status="failed", error=str(e), seconds=seconds)
+                log.error(f"❌ [{jobs[i]['survey_id']}] Pipeline failed: {e}")
+
+    succeeded = sum(r["status"] == "succeeded" for r in results)
+    log.info(f"📊 {succeeded}/{len(results)} surveys succeeded in {time.perf_counter() - started:.1f}s")
+    for r in results:
+        log.info(f"   {r['survey_id']} -> {r['table_id']}: {r['status']}"
+                 + (f" ({r['error']})" if r.get("error") else f" after {r['seconds']}s"))
+    return results
@@ -0,0 +1,314 @@
+import os
+import shutil
+import time
+import config
+from qualtrics_api import (build_export_payload, initiate_export, export_status, wait_for_export,
+                           download_export_file, read_export, read_export_chunks)
+from transformer import clean_dataframe, clean_dataframe_parallel, clean_chunks_parallel
+from logger import setup_logger
+from bigquery_uploader import StagedLoad, get_uploader, upload_to_destinations
+from checkpoint import (load_checkpoint, save_checkpoint, load_pending_export, save_pending_export,
+                        clear_pending_export)
+from export_cache import ExportCache, file_sha256, get_export_cache
+from schema_drift import check_export_header
+from validator import ERRORS_COLUMN, validate_frame
+from rollups import RollupAccumulator
+from schema_registry import TransformPlan
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+import pandas as pd
+
+log = setup_logger()
+
+
+def default_destination() -> Dict[str, str]:
+    """The VG BigQuery table every survey loads into unless told otherwise."""
+    return {
+        "project_id": config.VG_BQ_PROJECT_ID,
+        "dataset_id": config.VG_BQ_DATASET_ID,
+        "table_id": config.VG_BQ_TABLE_ID,
+        "credentials_path": config.VG_BQ_CREDENTIALS_PATH,
+    }
+
+
+def default_destinations() -> List[Dict[str, str]]:
+    """The VG table, plus the LESF table when BQ_PROJECT_ID is configured."""
+    destinations = [default_destination()]
+    if config.BQ_PROJECT_ID:
+        destinations.append({
+            "project_id": config.BQ_PROJECT_ID,
+            "dataset_id": config.BQ_DATASET_ID,
+            "table_id": config.BQ_TABLE_ID,
+            "credentials_path": config.BQ_CREDENTIALS_PATH,
+        })
+    return destinations
+
+
+def start_after(last_recorded_date: Optional[str]) -> Optional[str]:
+    """The startDate that exports only responses recorded after the checkpoint's last one.
+
+    startDate is inclusive and recordedDate has whole seconds, so it is one second later.
+    """
+    if not last_recorded_date:
+        return None
+    return (pd.Timestamp(last_recorded_date) + pd.Timedelta(seconds=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def export_request(survey_id: str, plan: TransformPlan) -> Dict[str, Any]:
+    """The export-responses body for the survey, from its checkpoint in incremental mode."""
+    checkpoint = load_checkpoint(config.CHECKPOINT_PATH, survey_id) if config.INCREMENTAL_EXPORT else {}
+    if checkpoint:
+        log.info(f"⏩ [{survey_id}] Incremental export from checkpoint: {checkpoint}")
+    return build_export_payload(
+        plan,
+        continuation_token=checkpoint.get("continuation_token"),
+        start_date=start_after(checkpoint.get("last_recorded_date")),
+        allow_continuation=config.INCREMENTAL_EXPORT,
+    )
+
+
+def start_export(survey_id: str, plan: TransformPlan) -> Dict[str, Any]:
+    """Kick off an export, resuming from the survey's checkpoint in incremental mode.
+
+    Returns {"request_key", "cache_key", "progress_id"}. request_key identifies
+    the request (the same until the checkpoint moves); progress_id is None when
+    a fresh copy of the same incremental export is already in the local cache
+    and nothing was requested. A full export is never served from the cache:
+    its request never changes, so a cached copy could be missing the latest
+    responses. If an earlier run requested the same export and Qualtrics still
+    has it, that export is reused (with its "result" when it is already
+    complete); a full export only within FULL_EXPORT_REUSE_TTL_SECONDS.
+    """
+    payload = export_request(survey_id, plan)
+    request_key = ExportCache.export_key(survey_id, payload)
+    cache = get_export_cache()
+    cache_key = request_key if cache else None
+    if cache and config.INCREMENTAL_EXPORT and cache.has_export(cache_key):
+        return {"request_key": request_key, "cache_key": cache_key, "progress_id": None}
+    reused = reuse_export(survey_id, request_key)
+    if reused:
+        return {"request_key": request_key, "cache_key": cache_key, **reused}
+    progress_id = initiate_export(survey_id, payload)
+    save_pending_export(config.CHECKPOINT_PATH, survey_id, request_key=request_key,
+                        progress_id=progress_id, created=time.time())
+    return {"request_key": request_key, "cache_key": cache_key, "progress_id": progress_id}
+
+
+def reuse_export(survey_id: str, request_key: str) -> Optional[Dict[str, Any]]:
+    """The same export left behind by an interrupted run, if it is recent and still live on Qualtrics."""
+    pending = load_pending_export(config.CHECKPOINT_PATH, survey_id)
+    if not pending or pending.get("request_key") != request_key:
+        return None
+    # A full export is a snapshot as of its request, so an old one would load stale responses
+    ttl = config.EXPORT_REUSE_TTL_SECONDS if config.INCREMENTAL_EXPORT else config.FULL_EXPORT_REUSE_TTL_SECONDS
+    if time.time() - pending["created"] > ttl:
+        return None
+    status = export_status(survey_id, pending["progress_id"])
+    if status is None or status["status"] == "failed":
+        log.info(f"[{survey_id}] Export {pending['progress_id']} from an earlier run is gone; requesting a new one")
+        return None
+    log.info(f"♻️ [{survey_id}] Reusing export {pending['progress_id']} from an earlier run ({status['status']})")
+    reused = {"progress_id": pending["progress_id"]}
+    if status["status"] == "complete":
+        reused["result"] = status
+    return reused
+
+
+def upload_validated(survey_id: str, df: pd.DataFrame, plan: TransformPlan,
+                     destinations: List[Dict[str, str]], rollups: Optional[RollupAccumulator] = None,
+                     staged: Optional[StagedLoad] = None) -> None:
+    """Upload the rows that pass validation to every destination and the rest to their quarantine tables.
+
+    The rows loaded into the destinations are added to `rollups`, if given.
+    With `staged`, both only reach staging tables until the run commits, so a
+    chunk that breaks a null-rate threshold (DataQualityError) fails the run
+    before any earlier chunk has reached its target.
+    """
+    load = {"label_columns": {spec.target for spec in plan.label_specs}}
+    if staged is not None:
+        load["staged"] = staged
+    if not config.VALIDATE_DATA:
+        valid = df.drop(columns=ERRORS_COLUMN, errors="ignore")
+        upload_to_destinations(valid, destinations, **load)
+        if rollups is not None:
+            rollups.add(valid)
+        return
+    valid, quarantine = validate_frame(df, plan)
+    if len(valid):
+        upload_to_destinations(valid, destinations, **load)
+        if rollups is not None:
+            rollups.add(valid)
+    if len(quarantine):
+        quarantine_destinations = [
+            {**d, "table_id": f"{d['table_id']}{config.QUARANTINE_TABLE_SUFFIX}"} for d in destinations
+        ]
+        log.warning(f"🚧 [{survey_id}] Quarantining {len(quarantine):,} rows to "
+                    f"{[d['table_id'] for d in quarantine_destinations]}")
+        upload_to_destinations(quarantine, quarantine_destinations, write_mode="append", **load)
+
+
+def commit_staged(survey_id: str, staged: StagedLoad) -> None:
+    """Write a run's staged chunks to their targets, once every chunk has loaded."""
+    if staged.tables:
+        log.info(f"🔁 [{survey_id}] Writing staged chunks to {sorted(staged.tables)}")
+        get_uploader().commit(staged)
+
+
+def abort_staged(survey_id: str, staged: StagedLoad) -> None:
+    """Drop the staged chunks of a failed run; no target has been touched."""
+    if staged.tables:
+        log.warning(f"🧹 [{survey_id}] Dropping the staged chunks of the failed run")
+        get_uploader().abort(staged)
+
+
+def start_rollups(survey_id: str, plan: TransformPlan) -> Optional[RollupAccumulator]:
+    """An accumulator for the survey's rollups, or None when ROLLUPS is off or the schema defines none."""
+    return RollupAccumulator(survey_id, plan.rollups) if config.ROLLUPS and plan.rollups else None
+
+
+def upload_rollups(survey_id: str, rollups: Optional[RollupAccumulator], destinations: List[Dict[str, str]],
+                   load_id: str) -> None:
+    """Load a run's rollups into each destination's summary table.
+
+    Incremental runs only saw new responses, so their counts are added to
+    what the table holds; full exports replace the days they cover. The
+    counts are added under `load_id`, the export's request key: a run retried
+    before its checkpoint was saved requests the same export, so its rollups
+    replace the ones the failed attempt added rather than adding to them.
+    """
+    if rollups is None or rollups.empty:
+        return
+    frame = rollups.rollups
+    rollup_destinations = [{**d, "table_id": f"{d['table_id']}{config.ROLLUP_TABLE_SUFFIX}"} for d in destinations]
+    log.info(f"📊 [{survey_id}] Loading {len(frame):,} rollup rows to {[d['table_id'] for d in rollup_destinations]}")
+    upload_to_destinations(frame, rollup_destinations,
+                           write_mode="rollup_add" if config.INCREMENTAL_EXPORT else "rollup_replace", load_id=load_id)
+
+
+def load_full_export(survey_id: str, zip_file: BinaryIO, plan: TransformPlan,
+                     destinations: List[Dict[str, str]], cleaned_key: Optional[str] = None,
+                     rollups: Optional[RollupAccumulator] = None) -> Optional[pd.Timestamp]:
+    """Parse, clean and upload the export in one piece. Returns the last recorded_date."""
+    cache = get_export_cache()
+    final_df = cache.get_cleaned(cleaned_key) if cache and cleaned_key else None
+    if final_df is None:
+        raw_df = read_export(zip_file, plan)
+        if raw_df.empty:
+            log.info(f"[{survey_id}] No new responses in export; skipping upload.")
+            return None
+        final_df = clean_dataframe_parallel(raw_df, plan, config.TRANSFORM_WORKERS, has_header_rows=False)
+        if cache and cleaned_key:
+            cache.put_cleaned(cleaned_key, final_df)
+    log.info(f"✅ [{survey_id}] DataFrame ready.")
+    log.info(final_df.head())
+    log.info(f"Shape: {final_df.shape}")
+    last_recorded = final_df["recorded_date"].max()
+    upload_validated(survey_id, final_df, plan, destinations, rollups)
+    return last_recorded
+
+
+def load_streaming_export(survey_id: str, zip_file: BinaryIO, plan: TransformPlan,
+                          destinations: List[Dict[str, str]],
+                          rollups: Optional[RollupAccumulator] = None) -> Optional[pd.Timestamp]:
+    """Clean and upload the export chunk by chunk so memory stays bounded.
+
+    The chunks are staged and written to the targets together once the last
+    one has loaded (see StagedLoad), so a failure leaves the targets untouched.
+    """
+    last_recorded, total_rows, staged = None, 0, StagedLoad()
+    raw_chunks = read_export_chunks(zip_file, config.STREAM_CHUNK_ROWS, plan)
+    if config.TRANSFORM_WORKERS > 1:
+        final_chunks = clean_chunks_parallel(raw_chunks, plan, config.TRANSFORM_WORKERS)
+    else:
+        final_chunks = (clean_dataframe(chunk, plan, has_header_rows=False) for chunk in raw_chunks)
+    try:
+        for final_chunk in final_chunks:
+            upload_validated(survey_id, final_chunk, plan, destinations, rollups, staged)
+            total_rows += len(final_chunk)
+            chunk_max = final_chunk["recorded_date"].max()
+            if pd.notnull(chunk_max) and (last_recorded is None or chunk_max > last_recorded):
+                last_recorded = chunk_max
+            log.info(f"✅ [{survey_id}] Staged chunk of {len(final_chunk):,} rows ({total_rows:,} total)")
+    except BaseException:
+        abort_staged(survey_id, staged)
+        raise
+    commit_staged(survey_id, staged)
+    if not total_rows:
+        log.info(f"[{survey_id}] No new responses in export; skipping upload.")
+    return last_recorded
+
+
+def await_export(survey_id: str, export: Dict[str, Any]) -> Dict[str, Any]:
+    """Wait for a requested export to complete and record its file id for a restarted run."""
+    export_result = export.get("result") or wait_for_export(survey_id, export["progress_id"])
+    save_pending_export(config.CHECKPOINT_PATH, survey_id, file_id=export_result["fileId"])
+    return export_result
+
+
+def fetch_export(survey_id: str, export: Dict[str, Any]) -> Tuple[BinaryIO, Dict[str, Any], Optional[str]]:
+    """Wait for and download the export, or open it from the cache.
+
+    Returns the open ZIP, the Qualtrics export result and the content hash of
+    the ZIP (None when caching is off). Only incremental exports are copied
+    into the cache; a full export is just hashed, for the cleaned-result cache.
+    """
+    cache = get_export_cache()
+    if export["progress_id"] is None:
+        zip_file, meta = cache.open_export(export["cache_key"])
+        return zip_file, meta["result"], meta["sha256"]
+    export_result = await_export(survey_id, export)
+    zip_file = download_export_file(survey_id, export_result["fileId"])
+    if not cache:
+        return zip_file, export_result, None
+    if not config.INCREMENTAL_EXPORT:
+        return zip_file, export_result, file_sha256(zip_file)
+    zip_file, meta = cache.put_export(export["cache_key"], zip_file, export_result)
+    return zip_file, export_result, meta["sha256"]
+
+
+def save_export(survey_id: str, export: Dict[str, Any], output_dir: str) -> str:
+    """Wait for and download a started export and copy its ZIP into `output_dir`; returns the path.
+
+    Nothing is cleaned or loaded, so the incremental checkpoint stays where it was.
+    """
+    zip_file, export_result, _ = fetch_export(survey_id, export)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{survey_id}_{export_result['fileId']}.zip")
+    with zip_file, open(path, "wb") as out:
+        zip_file.seek(0)
+        shutil.copyfileobj(zip_file, out, 1 << 20)
+    clear_pending_export(config.CHECKPOINT_PATH, survey_id)
+    log.info(f"📁 [{survey_id}] Export saved to {path}")
+    return path
+
+
+def run_survey(survey_id: str, plan: TransformPlan, destinations: List[Dict[str, str]],
+               export: Optional[Dict[str, Any]] = None) -> None:
+    """Run poll -> download -> pre-flight -> clean -> upload for one survey, starting the export if needed.
+
+    Any stage whose output is already cached locally is skipped, so re-running
+    after a failed upload goes straight back to the upload.
+    """
+    if export is None:
+        export = start_export(survey_id, plan)
+    zip_file, export_result, file_sha256 = fetch_export(survey_id, export)
+    with zip_file:
+        if config.EXPORT_FORMAT == "csv":
+            # JSON exports key values by import id, which survives renames, and have no header to check
+            plan = check_export_header(survey_id, zip_file, plan)
+        rollups = start_rollups(survey_id, plan)
+        if config.STREAMING_EXPORT:
+            last_recorded = load_streaming_export(survey_id, zip_file, plan, destinations, rollups)
+        else:
+            cache = get_export_cache()
+            cleaned_key = cache.cleaned_key(file_sha256, plan) if cache else None
+            last_recorded = load_full_export(survey_id, zip_file, plan, destinations, cleaned_key, rollups)
+    upload_rollups(survey_id, rollups, destinations, export["request_key"])
+    # Only advance the checkpoint once the new responses are safely in BigQuery
+    if config.INCREMENTAL_EXPORT:
+        save_checkpoint(
+            config.CHECKPOINT_PATH,
+            survey_id,
+            export_result.get("continuationToken"),
+            last_recorded.strftime("%Y-%m-%dT%H:%M:%SZ") if pd.notnull(last_recorded) else None
+        )
+    clear_pending_export(config.CHECKPOINT_PATH, survey_id)
@@ -1,54 +1,381 @@
+import csv
+import os
 import time
 import zipfile
+import zlib
 import io
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import requests
-from config import API_TOKEN, DATA_CENTER, EXPORT_FORMAT
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+import config
+from config import (
+    CSV_ENGINE,
+    EXPORT_POLL_MIN_INTERVAL, EXPORT_POLL_MAX_INTERVAL, EXPORT_POLL_TIMEOUT
+)
+from schema_registry import TransformPlan
 from logger import setup_logger
+from http_client import get_client
+from instrumentation import stage
+from json_export import json_field_keys, read_json_export, read_json_export_chunks
 
 log = setup_logger()
 
-def verify_authentication() -> None:
-    url = f"https://{DATA_CENTER}.qualtrics.com/API/v3/whoami"
-    resp = requests.get(url, headers={"X-API-TOKEN": API_TOKEN})
+QUALTRICS_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def api_url(path: str) -> str:
+    # Looked up per call so QUALTRICS_BASE_URL can be pointed at a local server after import
+    return f"{config.QUALTRICS_BASE_URL}/API/v3/{path}"
+
+# time.monotonic() of the last successful whoami
+_authenticated_at: Optional[float] = None
+
+def verify_authentication(max_age: float = 0) -> None:
+    """Check the API token with whoami.
+
+    With `max_age`, the call is skipped while the token was confirmed less
+    than `max_age` seconds ago and Qualtrics hasn't answered 401 since.
+    """
+    global _authenticated_at
+    client = get_client()
+    if (max_age and _authenticated_at is not None and not client.unauthorized
+            and time.monotonic() - _authenticated_at < max_age):
+        return
+    url = api_url("whoami")
+    with stage("authenticate"):
+        resp = client.get(url)
     if resp.ok:
+        _authenticated_at = time.monotonic()
+        client.unauthorized = False
         user = resp.json()["result"]
         log.info(f"Authenticated as {user['userId']} (Brand: {user['brandId']})")
     else:
         log.error("Authentication failed.")
         resp.raise_for_status()
 
-def initiate_export(survey_id: str) -> str:
-    url = f"https://{DATA_CENTER}.qualtrics.com/API/v3/surveys/{survey_id}/export-responses"
-    resp = requests.post(
-        url,
-        headers={"X-API-TOKEN": API_TOKEN, "Content-Type": "application/json"},
-        json={"format": EXPORT_FORMAT}
-    )
+def build_export_payload(schema: TransformPlan, continuation_token: Optional[str] = None,
+                         start_date: Optional[str] = None, allow_continuation: bool = False) -> Dict[str, Any]:
+    """The export-responses request body for a survey schema.
+
+    Asks only for the questions, embedded data and metadata the schema maps
+    (where it can tell which they are), with its filter, date range, label and
+    recode options, so Qualtrics generates and ships nothing that is dropped
+    on arrival. `start_date` (the checkpoint) narrows the schema's start date.
+    """
+    if config.EXPORT_FORMAT != "csv":
+        json_field_keys(schema)  # fail before requesting an export the schema can't read
+    request = schema.export
+    payload: Dict[str, Any] = {"format": config.EXPORT_FORMAT, "useLabels": request.use_labels}
+    for key, ids in (("questionIds", request.question_ids), ("embeddedDataIds", request.embedded_data_ids),
+                     ("surveyMetadataIds", request.survey_metadata_ids)):
+        if ids is not None:
+            payload[key] = ids
+    if request.filter_id:
+        payload["filterId"] = request.filter_id
+    if request.seen_unanswered_recode is not None:
+        payload["seenUnansweredRecode"] = request.seen_unanswered_recode
+    if continuation_token:
+        # Qualtrics only returns responses recorded since the token was issued
+        payload["continuationToken"] = continuation_token
+    else:
+        # Both are UTC "%Y-%m-%dT%H:%M:%SZ" strings, so the later one sorts last
+        start = max(filter(None, (start_date, request.start_date)), default=None)
+        if start:
+            payload["startDate"] = start
+        if request.end_date:
+            payload["endDate"] = request.end_date
+        if allow_continuation:
+            payload["allowContinuation"] = True
+    return payload
+
+def initiate_export(survey_id: str, payload: Dict[str, Any]) -> str:
+    url = api_url(f"surveys/{survey_id}/export-responses")
+    with stage("initiate_export", survey_id=survey_id):
+        resp = get_client().post(url, json=payload)
     resp.raise_for_status()
     progress_id = resp.json()["result"]["progressId"]
     log.info(f"Export initiated (Progress ID: {progress_id})")
     return progress_id
 
-def wait_for_export(survey_id: str, progress_id: str) -> str:
-    url = f"https://{DATA_CENTER}.qualtrics.com/API/v3/surveys/{survey_id}/export-responses/{progress_id}"
-    while True:
-        time.sleep(2)
-        resp = requests.get(url, headers={"X-API-TOKEN": API_TOKEN})
-        resp.raise_for_status()
-        status = resp.json()["result"]["status"]
-        log.info(f"Export Status: {status}")
-        if status == "complete":
-            return resp.json()["result"]["fileId"]
-        elif status == "failed":
-            raise RuntimeError("Export failed.")
-
-def download_responses(survey_id: str, file_id: str) -> pd.DataFrame:
-    url = f"https://{DATA_CENTER}.qualtrics.com/API/v3/surveys/{survey_id}/export-responses/{file_id}/file"
-    resp = requests.get(url, headers={"X-API-TOKEN": API_TOKEN})
+def export_status(survey_id: str, progress_id: str) -> Optional[Dict[str, Any]]:
+    """One status check of an export; None if Qualtrics no longer knows it."""
+    resp = get_client().get(api_url(f"surveys/{survey_id}/export-responses/{progress_id}"))
+    if resp.status_code == 404:
+        return None
     resp.raise_for_status()
-    with zipfile.ZipFile(io.BytesIO(resp.content)) as z:
+    return resp.json()["result"]
+
+def next_poll_interval(elapsed: float, percent_complete: float,
+                       min_interval: float, max_interval: float) -> float:
+    """Schedule the next status check at half the estimated time remaining.
+
+    The estimate assumes the export keeps progressing at the rate observed so
+    far; halving it lets the poller close in on completion without overshooting.
+    """
+    if percent_complete <= 0 or elapsed <= 0:
+        return min_interval
+    remaining = elapsed * (100 - percent_complete) / percent_complete
+    return min(max_interval, max(min_interval, remaining / 2))
+
+
+def wait_for_export(survey_id: str, progress_id: str) -> Dict[str, Any]:
+    """Poll until the export finishes and return its result (fileId, continuationToken)."""
+    url = api_url(f"surveys/{survey_id}/export-responses/{progress_id}")
+    with stage("wait_for_export", survey_id=survey_id) as record:
+        started = time.monotonic()
+        deadline = started + EXPORT_POLL_TIMEOUT
+        interval, polls = EXPORT_POLL_MIN_INTERVAL, 0
+        while True:
+            time.sleep(interval)
+            resp = get_client().get(url)
+            resp.raise_for_status()
+            polls += 1
+            record["polls"] = polls
+            result = resp.json()["result"]
+            status, percent = result["status"], float(result.get("percentComplete") or 0)
+            elapsed = time.monotonic() - started
+            log.info(f"Export Status: {status} ({percent:.0f}%)")
+            if status == "complete":
+                log.info(f"📈 Export {progress_id} complete in {elapsed:.1f}s after {polls} status requests")
+                return result
+            elif status == "failed":
+                raise RuntimeError("Export failed.")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Export {progress_id} not complete after {elapsed:.0f}s ({percent:.0f}%).")
+            # The last wait is cut short so there is always one poll right at the deadline
+            interval = min(next_poll_interval(elapsed, percent, EXPORT_POLL_MIN_INTERVAL, EXPORT_POLL_MAX_INTERVAL),
+                           remaining)
+
+
+def read_export_header(zip_file: BinaryIO, n_rows: int = 3) -> List[List[str]]:
+    """Read only the first rows of the CSV member: column ids, question text, import ids."""
+    with zipfile.ZipFile(zip_file) as z:
+        with z.open(z.namelist()[0]) as f:
+            reader = csv.reader(io.TextIOWrapper(f, encoding="utf-8-sig", newline=""))
+            rows = [row for _, row in zip(range(n_rows), reader)]
+    zip_file.seek(0)
+    return rows
+
+
+def csv_read_plan(header: List[str], schema: TransformPlan) -> Dict[str, str]:
+    """Map each schema column present in the export to "datetime", "Int64" or "str"."""
+    return {raw_col: schema.dtypes[schema.rename[raw_col]] for raw_col in header if raw_col in schema.rename}
+
+
+def _pandas_read_options(plan: Dict[str, str], codes_as_text: bool = False) -> Dict[str, Any]:
+    """read_csv options for the mapped columns of an export.
+
+    Codes are parsed as float64 (the C parser's masked Int64 path is several
+    times slower) and enforce_column_types converts them to Int64 without
+    re-parsing text; one malformed code makes the whole parse fail. With
+    `codes_as_text` they are read as text instead and enforce_column_types
+    coerces them, reporting any code that isn't a number as a per-row error.
+    """
+    code_dtype = str if codes_as_text else "float64"
+    return {
+        "usecols": list(plan),
+        # The two Qualtrics header rows (question text and import ids) are skipped at parse time
+        "skiprows": [1, 2],
+        "dtype": {col: (code_dtype if kind == "Int64" else str) for col, kind in plan.items() if kind != "datetime"},
+        "parse_dates": [col for col, kind in plan.items() if kind == "datetime"],
+        "date_format": QUALTRICS_DATE_FORMAT,
+    }
+
+
+def _read_csv_arrow(f: BinaryIO, plan: Dict[str, str]) -> pd.DataFrame:
+    arrow_types = {"datetime": pa.timestamp("ns"), "Int64": pa.int64(), "str": pa.string()}
+    table = pacsv.read_csv(
+        f,
+        read_options=pacsv.ReadOptions(skip_rows_after_names=2),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=list(plan),
+            column_types={col: arrow_types[kind] for col, kind in plan.items()},
+            timestamp_parsers=[QUALTRICS_DATE_FORMAT],
+            strings_can_be_null=True,
+        ),
+    )
+    df = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    # Match the C parser, which leaves NaN rather than None in missing text cells
+    str_cols = [col for col, kind in plan.items() if kind == "str"]
+    df[str_cols] = df[str_cols].where(df[str_cols].notna(), np.nan)
+    return df
+
+
+def read_export(zip_file: BinaryIO, schema: TransformPlan, engine: str = CSV_ENGINE) -> pd.DataFrame:
+    """Parse the mapped columns of an export ZIP with their final dtypes.
+
+    Reads straight from the ZIP member without materialising the CSV. If a
+    column does not parse as its declared type, falls back to reading every
+    column as text and leaves coercion to clean_dataframe. JSON exports are
+    decoded in batches of JSON_BATCH_ROWS responses.
+    """
+    if config.EXPORT_FORMAT != "csv":
+        return read_json_export(zip_file, schema, config.EXPORT_FORMAT, config.JSON_BATCH_ROWS)
+    with stage("parse", engine=engine) as record:
+        df = _read_export(zip_file, schema, engine)
+        record["rows"] = len(df)
+    return df
+
+
+def _read_export(zip_file: BinaryIO, schema: TransformPlan, engine: str) -> pd.DataFrame:
+    plan = csv_read_plan(read_export_header(zip_file, n_rows=1)[0], schema)
+    with zipfile.ZipFile(zip_file) as z:
+        csv_filename = z.namelist()[0]
+        try:
+            with z.open(csv_filename) as f:
+                if engine == "pyarrow":
+                    return _read_csv_arrow(f, plan)
+                return pd.read_csv(f, **_pandas_read_options(plan))
+        except (ValueError, pa.ArrowInvalid) as e:
+            log.warning(f"⚠️ Typed parse failed ({e}); re-reading export as text")
+            with z.open(csv_filename) as f:
+                return pd.read_csv(f, usecols=list(plan), skiprows=[1, 2], dtype=str)
+
+
+def download_responses(survey_id: str, file_id: str, schema: TransformPlan) -> pd.DataFrame:
+    with download_export_file(survey_id, file_id) as spool:
+        return read_export(spool, schema)
+
+
+def export_file_url(survey_id: str, file_id: str) -> str:
+    return api_url(f"surveys/{survey_id}/export-responses/{file_id}/file")
+
+
+# A dropped connection surfaces as one of these while the body is being read
+_INTERRUPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def _file_size(resp: requests.Response, position: int) -> Optional[int]:
+    """Size of the whole export file according to a (possibly partial) response."""
+    if resp.status_code == 206:
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        if total.isdigit():
+            return int(total)
+        length = resp.headers.get("Content-Length")
+        return position + int(length) if length else None
+    length = resp.headers.get("Content-Length")
+    return int(length) if length else None
+
+
+def iter_export_file(survey_id: str, file_id: str, offset: int = 0) -> Iterator[bytes]:
+    """Yield the export ZIP from byte `offset` on, resuming wherever the connection drops.
+
+    Each resume asks for the rest of the file with a Range request; if the
+    server ignores Range and sends the whole file, the bytes already yielded
+    are skipped. An interruption that made progress resumes straight away;
+    after DOWNLOAD_MAX_STALLS in a row that made none, the error is raised.
+    """
+    url = export_file_url(survey_id, file_id)
+    position, size, stalls = offset, None, 0
+    while True:
+        started_at = position
+        headers = {"Accept-Encoding": "identity"}
+        if position:
+            headers["Range"] = f"bytes={position}-"
+        try:
+            with get_client().get(url, stream=True, headers=headers) as resp:
+                if resp.status_code == 416 and position:
+                    return  # nothing left past `position`; the ZIP check decides if it's whole
+                resp.raise_for_status()
+                skip = 0 if resp.status_code == 206 else position
+                size = _file_size(resp, position)
+                # A block cut short is lost, so keep them small enough that little is re-fetched
+                for block in resp.iter_content(chunk_size=256 * 1024):
+                    if skip:
+                        block, skip = block[skip:], max(0, skip - len(block))
+                        if not block:
+                            continue
+                    position += len(block)
+                    yield block
+        except _INTERRUPTIONS as e:
+            error = e
+        else:
+            if size is None or position >= size:
+                return
+            error = f"connection closed at byte {position:,} of {size:,}"
+        stalls = 0 if position > started_at else stalls + 1
+        if stalls > config.DOWNLOAD_MAX_STALLS:
+            raise IOError(f"Export download stalled at byte {position:,}: {error}")
+        log.warning(f"⚠️ Export download interrupted at byte {position:,} ({error}); resuming")
+        if stalls:
+            time.sleep(min(config.HTTP_BACKOFF_MAX, config.HTTP_BACKOFF_BASE * 2 ** (stalls - 1)))
+
+
+def verify_export_zip(zip_file: BinaryIO) -> None:
+    """Raise zipfile.BadZipFile unless the archive is whole and every member matches its CRC-32 and size."""
+    try:
+        with zipfile.ZipFile(zip_file) as z:
+            bad = z.testzip()
+    except (EOFError, zlib.error) as e:
+        raise zipfile.BadZipFile(f"Export ZIP is truncated or corrupt: {e}") from e
+    if bad is not None:
+        raise zipfile.BadZipFile(f"CRC-32 mismatch in export member {bad}")
+    zip_file.seek(0)
+
+
+def download_export_file(survey_id: str, file_id: str) -> BinaryIO:
+    """Download the export ZIP to EXPORT_DOWNLOAD_DIR and return it open once it checks out.
+
+    The partial file is named after the file id, so a run restarted against
+    the same export (see pipeline.start_export) continues from its last byte.
+    A download that fails the ZIP's CRC and size checks is deleted and
+    fetched once more from scratch.
+    """
+    os.makedirs(config.EXPORT_DOWNLOAD_DIR, exist_ok=True)
+    path = os.path.join(config.EXPORT_DOWNLOAD_DIR, f"{survey_id}_{file_id}.zip.part")
+    for attempt in range(2):
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if offset:
+            log.info(f"⏯️ Resuming export download at byte {offset:,}")
+        with stage("download", survey_id=survey_id) as record, open(path, "ab") as out:
+            for block in iter_export_file(survey_id, file_id, offset):
+                out.write(block)
+            record["bytes"] = out.tell() - offset
+        zip_file = open(path, "rb")
+        try:
+            with stage("verify_download", survey_id=survey_id):
+                verify_export_zip(zip_file)
+            break
+        except zipfile.BadZipFile as e:
+            zip_file.close()
+            os.remove(path)
+            if attempt:
+                raise
+            log.warning(f"⚠️ Downloaded export failed its integrity check ({e}); downloading it again")
+    log.info(f"Downloaded export file ({os.path.getsize(path):,} bytes)")
+    # The open handle keeps the data readable; the file itself is done with
+    os.remove(path)
+    return zip_file
+
+
+def read_export_chunks(zip_file: BinaryIO, chunksize: int, schema: TransformPlan) -> Iterator[pd.DataFrame]:
+    """Yield the mapped columns of an export ZIP in typed chunks of `chunksize` rows."""
+    if config.EXPORT_FORMAT != "csv":
+        yield from read_json_export_chunks(zip_file, schema, config.EXPORT_FORMAT, chunksize)
+        return
+    header = read_export_header(zip_file, n_rows=1)[0]
+    with zipfile.ZipFile(zip_file) as z:
         csv_filename = z.namelist()[0]
         with z.open(csv_filename) as f:
-            df = pd.read_csv(f)
-    return df
+            yield from read_csv_chunks(f, header, chunksize, schema)
+
+
+def read_csv_chunks(f: BinaryIO, header: List[str], chunksize: int, schema: TransformPlan) -> Iterator[pd.DataFrame]:
+    """Yield typed chunks from an export CSV stream whose column ids are `header`.
+
+    A stream can't be re-read as text if a later chunk turns out not to parse
+    (as read_export does), so codes are read as text from the start.
+    """
+    plan = csv_read_plan(header, schema)
+    reader = pd.read_csv(f, chunksize=chunksize, **_pandas_read_options(plan, codes_as_text=True))
+    while True:
+        with stage("parse", engine="c") as record:
+            chunk = next(reader, None)
+            record["rows"] = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            return
+        yield chunk
+
@@ -0,0 +1,91 @@
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from instrumentation import stage
+from schema_registry import RollupSpec
+
+
+def count_column(code: int) -> str:
+    """Summary table column counting the answers labelled with `code` (count_3, count_minus_1)."""
+    return f"count_{code}".replace("-", "minus_")
+
+
+def rollup_codes(spec: RollupSpec) -> List[int]:
+    """Every label code of the spec's metrics, in order; each has a count column."""
+    return sorted({code for metric in spec.metrics for code in metric.labels})
+
+
+def compute_rollups(df: pd.DataFrame, survey_id: str, spec: RollupSpec) -> pd.DataFrame:
+    """Summarise each metric of a cleaned frame per group and day.
+
+    One row per (group, day, metric) with the number of answers, the sum and
+    mean of their scores and a histogram: count_<code> answers per label. An
+    answer's score is the code of its label in the metric's label set, so a
+    scale recoded before a cutoff counts the same as after it; labels the set
+    doesn't know are left out.
+
+    Every answer is encoded as one integer (group, day, metric, code) and all
+    metrics are counted together with one np.unique and one bincount, instead
+    of a groupby per metric.
+    """
+    codes = rollup_codes(spec)
+    group_codes, groups = pd.factorize(df[spec.group_by], use_na_sentinel=False)
+    day_codes, days = pd.factorize(df[spec.date_column].dt.floor("D"), use_na_sentinel=False)
+    group_day = group_codes.astype(np.int64) * len(days) + day_codes
+    n_metrics, width = len(spec.metrics), len(codes)
+    keys = []
+    for i, metric in enumerate(spec.metrics):
+        positions = pd.Categorical(df[metric.target], categories=list(metric.labels.values())).codes
+        answered = positions >= 0
+        # Label position within the metric's set -> column of its code
+        columns = np.array([codes.index(code) for code in metric.labels], dtype=np.int64)
+        keys.append((group_day[answered] * n_metrics + i) * width + columns[positions[answered]])
+    keys = np.concatenate(keys)
+    rows, row_of_answer = np.unique(keys // width, return_inverse=True)
+    histogram = np.bincount(row_of_answer * width + keys % width, minlength=len(rows) * width).reshape(len(rows), width)
+
+    group_values = np.asarray(groups, dtype=object)
+    group_values[pd.isna(group_values)] = None  # NaN or pd.NA, depending on the frame's string dtype
+    group_day, metric = np.divmod(rows, n_metrics)
+    group, day = np.divmod(group_day, len(days))
+    responses = histogram.sum(axis=1)
+    score_sum = histogram @ np.array(codes, dtype=np.int64)
+    frame = pd.DataFrame({
+        "survey_id": survey_id,
+        spec.group_by: group_values[group],
+        "response_date": pd.DatetimeIndex(days)[day],
+        "metric": np.array([m.source for m in spec.metrics], dtype=object)[metric],
+        "responses": responses,
+        "score_sum": score_sum,
+        "score_mean": score_sum / responses,
+    })
+    for j, code in enumerate(codes):
+        frame[count_column(code)] = histogram[:, j]
+    return frame
+
+
+def combine_rollups(frames: List[pd.DataFrame], spec: RollupSpec) -> pd.DataFrame:
+    """Add up rollups of the same group, day and metric, as loading them with rollup_add does."""
+    keys = ["survey_id", spec.group_by, "response_date", "metric"]
+    measures = ["responses", "score_sum"] + [count_column(code) for code in rollup_codes(spec)]
+    combined = pd.concat(frames, ignore_index=True).groupby(keys, dropna=False, sort=False, as_index=False)[measures].sum()
+    combined.insert(len(keys) + 2, "score_mean", combined["score_sum"] / combined["responses"])
+    return combined
+
+
+class RollupAccumulator:
+    """Rollups of every batch a run loads, combined as they arrive."""
+
+    def __init__(self, survey_id: str, spec: RollupSpec):
+        self.survey_id = survey_id
+        self.spec = spec
+        self.rollups: Optional[pd.DataFrame] = None
+
+    @property
+    def empty(self) -> bool:
+        return self.rollups is None or self.rollups.empty
+
+    def add(self, df: pd.DataFrame) -> None:
+        with stage("rollup", rows=len(df)):
+            batch = compute_rollups(df, self.survey_id, self.spec)
+            self.rollups = batch if self.rollups is None else combine_rollups([self.rollups, batch], self.spec)
@@ -0,0 +1,141 @@
+import hashlib
+import json
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
+from config import SCHEMA_DRIFT_POLICY
+from instrumentation import stage
+from logger import setup_logger
+from qualtrics_api import read_export_header
+from schema_registry import TransformPlan
+
+log = setup_logger()
+
+# The pipeline itself needs these (checkpoint high-water mark, MERGE key), so they can never be adapted away
+REQUIRED_COLUMNS = ("recorded_date", "response_id")
+
+
+class DriftReport(NamedTuple):
+    added: List[str]             # export columns the schema does not map
+    removed: List[str]           # schema columns missing from the export
+    renamed: Dict[str, str]      # schema column id -> export column id carrying the same question
+    question_changed: List[str]  # same column id, different question text
+
+    @property
+    def breaking(self) -> bool:
+        return bool(self.removed or self.renamed)
+
+
+class SchemaDriftError(ValueError):
+    """Raised when an export no longer matches its survey schema and the drift can't be adapted to."""
+
+    def __init__(self, survey_id: str, report: DriftReport):
+        self.report = report
+        super().__init__(f"Export for {survey_id} does not match the survey schema: {json.dumps(report._asdict())}")
+
+
+def _import_id(cell: str) -> Optional[str]:
+    # Third header row cells look like {"ImportId":"QID4_1"}
+    try:
+        return json.loads(cell).get("ImportId")
+    except (ValueError, AttributeError):
+        return None
+
+
+def detect_drift(header_rows: List[List[str]], plan: TransformPlan) -> DriftReport:
+    """Compare the export's column ids, question text and import ids against the plan.
+
+    A schema column that disappeared is reported as renamed when an unmapped
+    export column carries its ImportId (stable across Qualtrics renames) or,
+    failing that, exactly its question text.
+    """
+    ids = header_rows[0]
+    questions = dict(zip(ids, header_rows[1])) if len(header_rows) > 1 else {}
+    import_ids = {col: _import_id(cell) for col, cell in zip(ids, header_rows[2])} if len(header_rows) > 2 else {}
+
+    present = set(ids)
+    added = [col for col in ids if col not in plan.rename]
+    missing = [src for src in plan.rename if src not in present]
+    renamed = {}
+    for src in missing:
+        question, import_id = plan.questions.get(src, (None, None))
+        candidates = [col for col in added if col not in renamed.values()]
+        match = [col for col in candidates if import_id and import_ids.get(col) == import_id]
+        if not match and question:
+            match = [col for col in candidates if questions.get(col, "").strip() == question.strip()]
+        if len(match) == 1:
+            renamed[src] = match[0]
+    question_changed = [
+        src for src, (question, _) in plan.questions.items()
+        if question and src in questions and questions[src].strip() != question.strip()
+    ]
+    return DriftReport(
+        added=[col for col in added if col not in renamed.values()],
+        removed=[src for src in missing if src not in renamed],
+        renamed=renamed,
+        question_changed=question_changed,
+    )
+
+
+def _adapt_rollups(plan: TransformPlan, kept: set):
+    rollups = plan.rollups
+    if rollups is None or not {rollups.group_by, rollups.date_column} <= kept:
+        return None
+    metrics = [spec for spec in rollups.metrics if spec.source in kept]
+    return rollups._replace(metrics=metrics) if metrics else None
+
+
+def adapt_plan(plan: TransformPlan, report: DriftReport) -> TransformPlan:
+    """Follow renamed columns to their new ids and drop removed ones (with any labels built on them)."""
+    rename = {report.renamed.get(src, src): name for src, name in plan.rename.items() if src not in report.removed}
+    kept = set(rename.values())
+    return plan._replace(
+        rename=rename,
+        dtypes={name: dtype for name, dtype in plan.dtypes.items() if name in kept},
+        datetime_columns=[name for name in plan.datetime_columns if name in kept],
+        int_columns=[name for name in plan.int_columns if name in kept],
+        str_columns=[name for name in plan.str_columns if name in kept],
+        label_specs=[
+            spec for spec in plan.label_specs
+            if spec.source in kept and (spec.before_cutoff is None or spec.before_cutoff[0] in kept)
+        ],
+        questions={report.renamed.get(src, src): q for src, q in plan.questions.items() if src not in report.removed},
+        rollups=_adapt_rollups(plan, kept),
+        validation=plan.validation._replace(
+            ranges={col: r for col, r in plan.validation.ranges.items() if col in kept},
+            max_null_rates={col: r for col, r in plan.validation.max_null_rates.items() if col in kept},
+            date_order=[pair for pair in plan.validation.date_order if set(pair) <= kept],
+            unique=[col for col in plan.validation.unique if col in kept],
+        ),
+        fingerprint=hashlib.sha256(json.dumps([plan.fingerprint, report._asdict()]).encode()).hexdigest(),
+    )
+
+
+def check_export_header(survey_id: str, zip_file: BinaryIO, plan: TransformPlan,
+                        policy: str = SCHEMA_DRIFT_POLICY) -> TransformPlan:
+    """Pre-flight an export against its schema using only the first three CSV rows.
+
+    Returns the plan to clean the export with: unchanged when nothing breaking
+    drifted, adapted when policy is "adapt". Raises SchemaDriftError when
+    policy is "fail" (or a column the pipeline depends on is gone).
+    """
+    return check_header_rows(survey_id, read_export_header(zip_file, n_rows=3), plan, policy)
+
+
+def check_header_rows(survey_id: str, header_rows: List[List[str]], plan: TransformPlan,
+                      policy: str = SCHEMA_DRIFT_POLICY) -> TransformPlan:
+    """check_export_header for header rows already read from the export stream."""
+    with stage("preflight", survey_id=survey_id) as record:
+        report = detect_drift(header_rows, plan)
+        record["drift"] = report._asdict()
+
+    if report.added or report.question_changed:
+        log.info(f"🔎 [{survey_id}] Unmapped export columns: {report.added}; "
+                 f"changed question text: {report.question_changed}")
+    if not report.breaking:
+        return plan
+
+    log.warning(f"⚠️ [{survey_id}] Schema drift: removed={report.removed} renamed={report.renamed}")
+    lost_required = [plan.rename[src] for src in report.removed if plan.rename[src] in REQUIRED_COLUMNS]
+    if policy != "adapt" or lost_required:
+        raise SchemaDriftError(survey_id, report)
+    log.warning(f"🩹 [{survey_id}] Adapting schema '{plan.name}' v{plan.version} to the export header")
+    return adapt_plan(plan, report)
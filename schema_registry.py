@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import pandas as pd
+from config import SCHEMA_PATH
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+DEFAULT_SCHEMA_PATH = os.path.join(SCHEMA_DIR, "course_feedback.json")
+
+DTYPES = ("datetime", "Int64", "str")
+
+# Qualtrics' fixed metadata columns: CSV header -> surveyMetadataIds value (also the column's ImportId)
+SURVEY_METADATA_IDS = {
+    "StartDate": "startDate",
+    "EndDate": "endDate",
+    "Status": "status",
+    "IPAddress": "ipAddress",
+    "Progress": "progress",
+    "Duration (in seconds)": "duration",
+    "Finished": "finished",
+    "RecordedDate": "recordedDate",
+    "ResponseId": "_recordId",
+    "RecipientLastName": "recipientLastName",
+    "RecipientFirstName": "recipientFirstName",
+    "RecipientEmail": "recipientEmail",
+    "ExternalReference": "externalDataReference",
+    "LocationLatitude": "locationLatitude",
+    "LocationLongitude": "locationLongitude",
+    "DistributionChannel": "distributionChannel",
+    "UserLanguage": "userLanguage",
+}
+
+EXPORT_OPTIONS = ("pushdown", "filter_id", "start_date", "end_date", "use_labels", "seen_unanswered_recode",
+                  "labels_from_export")
+QUALTRICS_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+_QUESTION_ID = re.compile(r"QID\d+")
+
+
+class SchemaError(ValueError):
+    """Raised when a survey schema file is invalid; lists every problem found."""
+
+    def __init__(self, path: str, errors: List[str]):
+        self.errors = errors
+        super().__init__(f"Invalid survey schema {path}:\n  - " + "\n  - ".join(errors))
+
+
+class LabelSpec(NamedTuple):
+    source: str
+    target: str
+    labels: Dict[int, str]
+    # (date column, cutoff, labels used for rows recorded before the cutoff)
+    before_cutoff: Optional[Tuple[str, pd.Timestamp, Dict[int, str]]]
+
+
+class ValidationRules(NamedTuple):
+    ranges: Dict[str, Tuple[Optional[float], Optional[float]]]
+    max_null_rates: Dict[str, float]
+    date_order: List[Tuple[str, str]]
+    unique: List[str]
+
+
+class ExportRequest(NamedTuple):
+    """What to ask Qualtrics to export; a None id list means every field of that kind."""
+    question_ids: Optional[List[str]]
+    embedded_data_ids: Optional[List[str]]
+    survey_metadata_ids: Optional[List[str]]
+    filter_id: Optional[str]
+    start_date: Optional[str]
+    end_date: Optional[str]
+    use_labels: bool
+    seen_unanswered_recode: Optional[int]
+    # JSON exports only: label coded columns with Qualtrics' labels instead of the schema's label sets
+    labels_from_export: bool
+
+
+class RollupSpec(NamedTuple):
+    """Per-group, per-day summaries of labelled columns to compute while loading."""
+    group_by: str
+    date_column: str
+    # Label specs of the summarised columns; a metric's score is its label's code in spec.labels
+    metrics: List[LabelSpec]
+
+
+class TransformPlan(NamedTuple):
+    """A survey schema compiled into the lookups clean_dataframe runs."""
+    name: str
+    version: int
+    rename: Dict[str, str]
+    dtypes: Dict[str, str]
+    datetime_columns: List[str]
+    int_columns: List[str]
+    str_columns: List[str]
+    label_specs: List[LabelSpec]
+    # Source column -> (question text, Qualtrics ImportId) from the export header, where declared
+    questions: Dict[str, Tuple[Optional[str], Optional[str]]]
+    validation: ValidationRules
+    export: ExportRequest
+    rollups: Optional[RollupSpec]
+    fingerprint: str
+
+
+def validate_schema(schema: Dict[str, Any]) -> List[str]:
+    """Return every problem with a parsed schema; an empty list means it is valid."""
+    errors = []
+    for key in ("name", "version", "columns"):
+        if key not in schema:
+            errors.append(f"missing required key '{key}'")
+    columns = schema.get("columns", [])
+    label_sets = schema.get("label_sets", {})
+
+    dtypes, sources = {}, set()
+    for i, col in enumerate(columns):
+        if not isinstance(col, dict) or not {"source", "name", "dtype"} <= col.keys():
+            errors.append(f"columns[{i}] needs 'source', 'name' and 'dtype'")
+            continue
+        for key in ("question", "import_id"):
+            if not isinstance(col.get(key, ""), str):
+                errors.append(f"column '{col['name']}' has a non-string '{key}'")
+        if "range" in col:
+            bounds = col["range"]
+            if (not isinstance(bounds, list) or len(bounds) != 2
+                    or not all(b is None or isinstance(b, (int, float)) for b in bounds)
+                    or None not in bounds and bounds[0] > bounds[1]):
+                errors.append(f"column '{col['name']}' range must be [min, max] (either may be null)")
+        if not 0 <= col.get("max_null_rate", 0) <= 1:
+            errors.append(f"column '{col['name']}' max_null_rate must be between 0 and 1")
+        if col["dtype"] not in DTYPES:
+            errors.append(f"column '{col['name']}' has unknown dtype '{col['dtype']}' (expected one of {DTYPES})")
+        if col["source"] in sources:
+            errors.append(f"source column '{col['source']}' is mapped twice")
+        if col["name"] in dtypes:
+            errors.append(f"output column '{col['name']}' is defined twice")
+        sources.add(col["source"])
+        dtypes[col["name"]] = col["dtype"]
+
+    for set_name, labels in label_sets.items():
+        if not all(str(code).lstrip("-").isdigit() for code in labels):
+            errors.append(f"label set '{set_name}' has non-integer codes")
+
+    for i, spec in enumerate(schema.get("labels", [])):
+        where = f"labels[{i}] ({spec.get('target', '?')})"
+        if not {"source", "target", "label_set"} <= spec.keys():
+            errors.append(f"{where} needs 'source', 'target' and 'label_set'")
+            continue
+        if dtypes.get(spec["source"]) != "Int64":
+            errors.append(f"{where} source '{spec['source']}' must be an Int64 column")
+        rule = spec.get("before_cutoff")
+        for set_name in [spec["label_set"]] + ([rule.get("label_set")] if rule else []):
+            if set_name not in label_sets:
+                errors.append(f"{where} uses undefined label set '{set_name}'")
+        if rule:
+            if dtypes.get(rule.get("date_column")) != "datetime":
+                errors.append(f"{where} cutoff column '{rule.get('date_column')}' must be a datetime column")
+            try:
+                pd.Timestamp(rule.get("cutoff"))
+            except (TypeError, ValueError):
+                errors.append(f"{where} has an unparseable cutoff '{rule.get('cutoff')}'")
+
+    checks = schema.get("checks", {})
+    for pair in checks.get("date_order", []):
+        if len(pair) != 2 or any(dtypes.get(col) != "datetime" for col in pair):
+            errors.append(f"date_order check {pair} must name two datetime columns")
+    for col in checks.get("unique", []):
+        if col not in dtypes:
+            errors.append(f"unique check names unknown column '{col}'")
+
+    rollups = schema.get("rollups")
+    if rollups is not None:
+        labelled = {spec.get("source") for spec in schema.get("labels", [])}
+        if dtypes.get(rollups.get("group_by")) != "str":
+            errors.append(f"rollups group_by '{rollups.get('group_by')}' must be a str column")
+        if dtypes.get(rollups.get("date_column")) != "datetime":
+            errors.append(f"rollups date_column '{rollups.get('date_column')}' must be a datetime column")
+        if not rollups.get("metrics"):
+            errors.append("rollups needs at least one metric")
+        for metric in rollups.get("metrics", []):
+            if metric not in labelled:
+                errors.append(f"rollups metric '{metric}' must be the source of a label spec")
+
+    export = schema.get("export", {})
+    for key in export:
+        if key not in EXPORT_OPTIONS:
+            errors.append(f"unknown export option '{key}' (expected one of {EXPORT_OPTIONS})")
+    for key in ("pushdown", "use_labels", "labels_from_export"):
+        if not isinstance(export.get(key, False), bool):
+            errors.append(f"export option '{key}' must be true or false")
+    if not isinstance(export.get("filter_id", ""), (str, type(None))):
+        errors.append("export option 'filter_id' must be a string")
+    recode = export.get("seen_unanswered_recode")
+    if recode is not None and (not isinstance(recode, int) or isinstance(recode, bool)):
+        errors.append("export option 'seen_unanswered_recode' must be an integer")
+    for key in ("start_date", "end_date"):
+        if export.get(key) is not None:
+            try:
+                pd.Timestamp(export[key])
+            except (TypeError, ValueError):
+                errors.append(f"export option '{key}' has an unparseable date '{export[key]}'")
+    if export.get("use_labels") and any(dtype == "Int64" for dtype in dtypes.values()):
+        # Labels replace choice codes with their text, which the Int64 columns can't hold
+        errors.append("export option 'use_labels' needs a schema without Int64 columns")
+    return errors
+
+
+def _dedupe(ids: Optional[List[str]]) -> Optional[List[str]]:
+    return None if ids is None else list(dict.fromkeys(ids))
+
+
+def _qualtrics_timestamp(value: Optional[str]) -> Optional[str]:
+    return None if value is None else pd.Timestamp(value).strftime(QUALTRICS_TIMESTAMP_FORMAT)
+
+
+def compile_export_request(schema: Dict[str, Any]) -> ExportRequest:
+    """Work out which Qualtrics fields the schema's columns come from.
+
+    A column is identified by its import_id (what the export's third header
+    row carries: "QID4_1" for a question, the field name for embedded data)
+    or, for Qualtrics' fixed metadata columns, by its header. Questions and
+    embedded data are only narrowed down when every non-metadata column is
+    identified; otherwise all of them are requested, since an unidentified
+    column could be either.
+    """
+    options = schema.get("export", {})
+    question_ids: Optional[List[str]] = []
+    embedded_data_ids: Optional[List[str]] = []
+    survey_metadata_ids: Optional[List[str]] = []
+    unidentified = False
+    metadata_values = set(SURVEY_METADATA_IDS.values())
+    for col in schema["columns"]:
+        import_id = col.get("import_id") or SURVEY_METADATA_IDS.get(col["source"])
+        if import_id in metadata_values:
+            survey_metadata_ids.append(import_id)
+        elif import_id and _QUESTION_ID.match(import_id):
+            # Sub-question and text-entry columns (QID4_1, QID4_6_TEXT) all come from question QID4
+            question_ids.append(_QUESTION_ID.match(import_id).group())
+        elif import_id:
+            embedded_data_ids.append(import_id)
+        else:
+            unidentified = True
+    if unidentified:
+        question_ids = embedded_data_ids = None
+    if not options.get("pushdown", True):
+        question_ids = embedded_data_ids = survey_metadata_ids = None
+    return ExportRequest(
+        question_ids=_dedupe(question_ids),
+        embedded_data_ids=_dedupe(embedded_data_ids),
+        survey_metadata_ids=_dedupe(survey_metadata_ids),
+        filter_id=options.get("filter_id"),
+        start_date=_qualtrics_timestamp(options.get("start_date")),
+        end_date=_qualtrics_timestamp(options.get("end_date")),
+        use_labels=options.get("use_labels", False),
+        seen_unanswered_recode=options.get("seen_unanswered_recode"),
+        labels_from_export=options.get("labels_from_export", False),
+    )
+
+
+def compile_schema(schema: Dict[str, Any]) -> TransformPlan:
+    """Turn a validated schema into a TransformPlan."""
+    columns = schema["columns"]
+    label_sets = {name: {int(code): label for code, label in labels.items()}
+                  for name, labels in schema.get("label_sets", {}).items()}
+    label_specs = []
+    for spec in schema.get("labels", []):
+        rule = spec.get("before_cutoff")
+        before = (rule["date_column"], pd.Timestamp(rule["cutoff"]), label_sets[rule["label_set"]]) if rule else None
+        label_specs.append(LabelSpec(spec["source"], spec["target"], label_sets[spec["label_set"]], before))
+    checks = schema.get("checks", {})
+    rollups = schema.get("rollups")
+    specs_by_source = {spec.source: spec for spec in label_specs}
+    return TransformPlan(
+        name=schema["name"],
+        version=schema["version"],
+        rename={col["source"]: col["name"] for col in columns},
+        dtypes={col["name"]: col["dtype"] for col in columns},
+        datetime_columns=[col["name"] for col in columns if col["dtype"] == "datetime"],
+        int_columns=[col["name"] for col in columns if col["dtype"] == "Int64"],
+        str_columns=[col["name"] for col in columns if col["dtype"] == "str"],
+        label_specs=label_specs,
+        questions={col["source"]: (col.get("question"), col.get("import_id")) for col in columns},
+        validation=ValidationRules(
+            ranges={col["name"]: tuple(col["range"]) for col in columns if "range" in col},
+            max_null_rates={col["name"]: col["max_null_rate"] for col in columns if "max_null_rate" in col},
+            date_order=[tuple(pair) for pair in checks.get("date_order", [])],
+            unique=list(checks.get("unique", [])),
+        ),
+        export=compile_export_request(schema),
+        rollups=RollupSpec(
+            group_by=rollups["group_by"],
+            date_column=rollups["date_column"],
+            metrics=[specs_by_source[metric] for metric in rollups["metrics"]],
+        ) if rollups else None,
+        fingerprint=hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest(),
+    )
+
+
+@lru_cache(maxsize=None)
+def load_plan(path: str = DEFAULT_SCHEMA_PATH) -> TransformPlan:
+    """Load, validate and compile a schema file once; raises SchemaError on any problem."""
+    try:
+        with open(path, "r") as f:
+            schema = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise SchemaError(path, [str(e)]) from e
+    errors = validate_schema(schema)
+    if errors:
+        raise SchemaError(path, errors)
+    return compile_schema(schema)
+
+
+def default_plan() -> TransformPlan:
+    """The plan for the configured survey schema (PIPELINE_SCHEMA_PATH)."""
+    return load_plan(SCHEMA_PATH or DEFAULT_SCHEMA_PATH)
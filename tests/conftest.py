@@ -0,0 +1,63 @@
+import logging
+import os
+import sys
+import pytest
+
+# The modules are flat at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from bigquery_uploader import get_uploader  # noqa: E402
+
+logging.disable(logging.INFO)
+
+
+class _Job:
+    def result(self):
+        return None
+
+
+class FakeBigQueryClient:
+    """Records what an uploader asks BigQuery to do; `fail_on_load` raises on that load (1-based)."""
+
+    def __init__(self, fail_on_load=None):
+        self.calls = []
+        self.loads = 0
+        self.fail_on_load = fail_on_load
+
+    def create_table(self, table, exists_ok=False):
+        self.calls.append(("create", table.table_id))
+
+    def load_table_from_file(self, f, table_ref, job_config):
+        self.loads += 1
+        if self.loads == self.fail_on_load:
+            raise RuntimeError("load failed")
+        self.calls.append(("load", table_ref))
+        return _Job()
+
+    def query(self, sql):
+        self.calls.append(("query", sql))
+        return _Job()
+
+    def delete_table(self, table_ref, not_found_ok=False):
+        self.calls.append(("delete", table_ref))
+
+
+@pytest.fixture
+def fake_bigquery(monkeypatch):
+    """Point the shared uploader at a FakeBigQueryClient instead of BigQuery."""
+    client = FakeBigQueryClient()
+    monkeypatch.setattr(config, "BQ_LOCAL_PARQUET_DIR", None)
+    monkeypatch.setattr(get_uploader(), "client", lambda project_id, credentials_path: client)
+    monkeypatch.setattr(get_uploader(), "_tables", set())
+    return client
+
+
+@pytest.fixture
+def tmp_config(tmp_path, monkeypatch):
+    """Checkpoint, download and cache paths in a temporary directory."""
+    monkeypatch.setattr(config, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.json"))
+    monkeypatch.setattr(config, "EXPORT_DOWNLOAD_DIR", str(tmp_path / "downloads"))
+    monkeypatch.setattr(config, "EXPORT_CACHE_DIR", None)
+    monkeypatch.setattr(config, "INCREMENTAL_EXPORT", False)
+    return tmp_path
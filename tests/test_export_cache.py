@@ -0,0 +1,64 @@
+import hashlib
+import io
+import os
+import pytest
+import config
+import export_cache
+from checkpoint import clear_pending_export
+from export_cache import ExportCache
+from pipeline import fetch_export, start_export
+from schema_registry import default_plan
+from benchmarks.fake_qualtrics import FakeQualtrics
+
+
+@pytest.fixture
+def cache_dir(tmp_config, monkeypatch):
+    monkeypatch.setattr(config, "EXPORT_CACHE_DIR", str(tmp_config / "cache"))
+    monkeypatch.setattr(export_cache, "_cache", None)
+    return tmp_config / "cache"
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    with FakeQualtrics(500) as server:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", server.base_url)
+        yield server
+
+
+def test_an_entry_over_the_size_limit_is_still_readable_and_evicts_the_rest(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=1_500, ttl_seconds=60)
+    first, _ = cache.put_export("first", io.BytesIO(b"a" * 1_000), {"fileId": "F1"})
+    first.close()
+    second, meta = cache.put_export("second", io.BytesIO(b"b" * 2_000), {"fileId": "F2"})
+    with second:
+        assert second.read() == b"b" * 2_000
+    assert meta["result"] == {"fileId": "F2"}
+    assert cache.has_export("second") and not cache.has_export("first")
+
+
+def export_and_download(survey_id: str) -> dict:
+    export = start_export(survey_id, default_plan())
+    if export["progress_id"] is not None:
+        fetch_export(survey_id, export)[0].close()
+        clear_pending_export(config.CHECKPOINT_PATH, survey_id)
+    return export
+
+
+def test_full_exports_are_requested_again_and_only_hashed(cache_dir, fake):
+    export_and_download("SV_1")
+    export = start_export("SV_1", default_plan())
+    assert export["progress_id"] is not None
+    assert fake.requests["export-responses"] == 2
+    zip_file, _, sha256 = fetch_export("SV_1", export)
+    with zip_file:
+        assert zip_file.read() == fake.export_zip()
+    assert sha256 == hashlib.sha256(fake.export_zip()).hexdigest()
+    assert not os.listdir(cache_dir / "exports")
+
+
+def test_incremental_exports_are_served_from_the_cache_until_the_checkpoint_moves(cache_dir, fake, monkeypatch):
+    monkeypatch.setattr(config, "INCREMENTAL_EXPORT", True)
+    export_and_download("SV_1")
+    second = export_and_download("SV_1")
+    assert second["progress_id"] is None
+    assert fake.requests["export-responses"] == 1
@@ -0,0 +1,121 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from http_client import QualtricsClient
+
+
+class ScriptedServer:
+    """Answers each request with the next (status, headers) in `script`, then 200s.
+
+    A status of None hangs up after reading the request, as a connection dropped mid-request does.
+    """
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _answer(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                server.requests.append(self.command)
+                status, headers = server.script.pop(0) if server.script else (200, {})
+                if status is None:
+                    self.close_connection = True
+                    return
+                body = b'{"result": {}}'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _answer
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/API/v3/whoami"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def make_client(max_retries: int = 3) -> QualtricsClient:
+    return QualtricsClient(api_token="token", connect_timeout=1, read_timeout=2, max_retries=max_retries,
+                           backoff_base=0.01, backoff_max=0.05, rate_per_sec=0, pool_size=2)
+
+
+def test_get_retries_rate_limits_server_errors_and_dropped_connections():
+    with ScriptedServer((429, {"Retry-After": "0.2"}), (503, {}), (None, {}), (502, {})) as server:
+        started = time.monotonic()
+        resp = make_client(max_retries=4).get(server.url)
+    assert resp.status_code == 200
+    assert server.requests == ["GET"] * 5
+    assert time.monotonic() - started >= 0.2  # Retry-After is honoured as given
+
+
+def test_get_returns_the_last_response_once_retries_run_out():
+    with ScriptedServer(*[(503, {})] * 5) as server:
+        resp = make_client(max_retries=2).get(server.url)
+    assert resp.status_code == 503
+    assert len(server.requests) == 3
+
+
+def test_client_errors_are_not_retried_and_401_is_remembered():
+    client = make_client()
+    with ScriptedServer((404, {}), (401, {})) as server:
+        assert client.get(server.url).status_code == 404
+        assert not client.unauthorized
+        assert client.get(server.url).status_code == 401
+    assert client.unauthorized
+    assert len(server.requests) == 2
+
+
+def test_get_retries_refused_connections_then_raises():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    with pytest.raises(requests.ConnectionError):
+        make_client(max_retries=2).get(f"http://127.0.0.1:{port}/API/v3/whoami")
+
+
+def test_post_is_not_retried_once_the_server_may_have_acted_on_it():
+    with ScriptedServer((503, {}), (None, {})) as server:
+        client = make_client()
+        assert client.post(server.url, json={}).status_code == 503
+        with pytest.raises(requests.ConnectionError):
+            client.post(server.url, json={})
+    assert server.requests == ["POST", "POST"]
+
+
+def test_post_is_retried_on_rate_limits():
+    with ScriptedServer((429, {"Retry-After": "0"}), (429, {})) as server:
+        assert make_client().post(server.url, json={}).status_code == 200
+    assert server.requests == ["POST"] * 3
+
+
+def test_post_is_retried_when_the_connection_cannot_be_made():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    client = make_client(max_retries=2)
+    attempts = []
+    send = client.session.request
+    client.session.request = lambda *args, **kwargs: attempts.append(args) or send(*args, **kwargs)
+    with pytest.raises(requests.ConnectionError):
+        client.post(f"http://127.0.0.1:{port}/API/v3/surveys/SV_1/export-responses", json={})
+    assert len(attempts) == 3
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from instrumentation import _peak_rss_mb, count_http_request, finish_run, stage, start_run
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+
+
+@pytest.fixture
+def report():
+    report = start_run()
+    yield report
+    finish_run(None)
+
+
+def test_requests_after_a_nested_stage_count_toward_the_outer_one(report):
+    with stage("outer") as outer:
+        count_http_request()
+        with stage("inner") as inner:
+            count_http_request()
+        count_http_request()
+    count_http_request()  # outside any stage
+    assert inner["http_requests"] == 1
+    assert outer["http_requests"] == 2
+    assert [record["stage"] for record in report.stages] == ["inner", "outer"]
+
+
+def test_stages_report_the_process_peak_and_their_own_growth(report):
+    with stage("small") as small:
+        pass
+    # Enough to rise 64 MiB above the peak earlier tests left, touched so it is resident
+    headroom_mb = _peak_rss_mb() - rss_mb()
+    with stage("large") as large:
+        block = np.ones(int((headroom_mb + 64) * 1024 ** 2 / 8))
+        del block
+    assert small["peak_rss_growth_mb"] == 0
+    assert large["peak_rss_growth_mb"] >= 50
+    assert large["process_peak_rss_mb"] >= small["process_peak_rss_mb"] + large["peak_rss_growth_mb"] - 0.2
+
@@ -0,0 +1,68 @@
+import time
+import pytest
+import config
+import pipeline
+from checkpoint import load_checkpoint, load_pending_export, save_checkpoint, save_pending_export
+from pipeline import export_request, run_survey, start_after, start_export
+from schema_registry import default_plan
+from benchmarks.fake_qualtrics import FakeQualtrics
+
+
+def test_start_after_is_one_second_past_the_last_recorded_response():
+    assert start_after("2024-02-10T08:00:00Z") == "2024-02-10T08:00:01Z"
+    assert start_after("2024-02-29T23:59:59Z") == "2024-03-01T00:00:00Z"
+    assert start_after(None) is None
+
+
+def test_incremental_request_starts_after_the_checkpoint(tmp_config, monkeypatch):
+    monkeypatch.setattr(config, "INCREMENTAL_EXPORT", True)
+    assert "startDate" not in export_request("SV_1", default_plan())
+
+    save_checkpoint(config.CHECKPOINT_PATH, "SV_1", None, "2024-02-10T08:00:00Z")
+    payload = export_request("SV_1", default_plan())
+    assert payload["startDate"] == "2024-02-10T08:00:01Z" and payload["allowContinuation"] is True
+
+    save_checkpoint(config.CHECKPOINT_PATH, "SV_1", "CT_1", "2024-02-11T08:00:00Z")
+    payload = export_request("SV_1", default_plan())
+    assert payload["continuationToken"] == "CT_1" and "startDate" not in payload
+
+
+def test_full_exports_ignore_the_checkpoint(tmp_config):
+    save_checkpoint(config.CHECKPOINT_PATH, "SV_1", "CT_1", "2024-02-10T08:00:00Z")
+    payload = export_request("SV_1", default_plan())
+    assert not {"startDate", "continuationToken", "allowContinuation"} & set(payload)
+
+
+@pytest.mark.parametrize("incremental, reused", [(False, False), (True, True)])
+def test_an_hour_old_pending_export_is_only_reused_by_incremental_runs(tmp_config, monkeypatch, incremental, reused):
+    monkeypatch.setattr(config, "INCREMENTAL_EXPORT", incremental)
+    with FakeQualtrics(100) as fake:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", fake.base_url)
+        first = start_export("SV_1", default_plan())
+        assert start_export("SV_1", default_plan())["progress_id"] == first["progress_id"]
+        save_pending_export(config.CHECKPOINT_PATH, "SV_1", created=time.time() - 3600)
+        second = start_export("SV_1", default_plan())
+    assert (second["progress_id"] == first["progress_id"]) is reused
+    assert fake.requests["export-responses"] == (1 if reused else 2)
+    assert load_pending_export(config.CHECKPOINT_PATH, "SV_1")["progress_id"] == second["progress_id"]
+
+
+def test_incremental_runs_export_about_the_same_bytes_as_the_survey_grows(tmp_config, monkeypatch):
+    monkeypatch.setattr(config, "INCREMENTAL_EXPORT", True)
+    monkeypatch.setattr(config, "VALIDATE_DATA", False)
+    loaded = []
+    monkeypatch.setattr(pipeline, "upload_to_destinations", lambda df, destinations, **kwargs: loaded.append(len(df)))
+    exported = []
+    with FakeQualtrics(2_000) as fake:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", fake.base_url)
+        for new_responses in (0, 500, 500):
+            fake.add_responses(new_responses)
+            before = fake.requests["file_bytes"]
+            run_survey("SV_1", default_plan(), [{"project_id": "p", "dataset_id": "d", "table_id": "t"}])
+            exported.append(fake.requests["file_bytes"] - before)
+        full = len(fake.export_zip())
+    assert loaded == [2_000, 500, 500]
+    assert load_checkpoint(config.CHECKPOINT_PATH, "SV_1")["continuation_token"] == "CT_3000"
+    # Each run downloads only what was added since the last one, not the whole, growing history
+    assert abs(exported[2] - exported[1]) < 0.05 * exported[1]
+    assert exported[2] < full / 4
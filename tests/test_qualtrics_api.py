@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import pandas as pd
+import pytest
+import config
+import qualtrics_api
+from qualtrics_api import (
+    build_export_payload, download_export_file, initiate_export, iter_export_file, next_poll_interval, read_export,
+    read_export_chunks, wait_for_export
+)
+from schema_registry import DEFAULT_SCHEMA_PATH, default_plan, load_plan
+from transformer import clean_dataframe
+from validator import ERRORS_COLUMN
+from benchmarks.bench_json_export import plan_with_import_ids
+from benchmarks.fake_qualtrics import FakeQualtrics
+from benchmarks.synthetic_export import make_export_zip, make_raw_export, zip_export
+
+
+def test_export_payload_asks_only_for_mapped_fields():
+    payload = build_export_payload(plan_with_import_ids(filter_id="F1"))
+    assert payload["format"] == "csv" and payload["useLabels"] is False
+    assert "QID1" in payload["questionIds"] and "QID100" not in payload["questionIds"]
+    assert payload["embeddedDataIds"] == ["uid", "course_id", "outcomes_id"]
+    assert "recordedDate" in payload["surveyMetadataIds"]
+    assert payload["filterId"] == "F1"
+    assert "startDate" not in payload and "continuationToken" not in payload
+
+
+def test_export_payload_without_import_ids_requests_every_question():
+    payload = build_export_payload(default_plan())
+    assert "questionIds" not in payload and "embeddedDataIds" not in payload
+
+
+def test_a_partly_identified_schema_compiles_and_requests_every_question(tmp_path):
+    with open(DEFAULT_SCHEMA_PATH) as f:
+        schema = json.load(f)
+    next(col for col in schema["columns"] if col["source"] == "Q4_1")["import_id"] = "QID4_1"
+    path = tmp_path / "schema.json"
+    path.write_text(json.dumps(schema))
+    payload = build_export_payload(load_plan(str(path)))
+    assert "questionIds" not in payload and "embeddedDataIds" not in payload
+    assert "recordedDate" in payload["surveyMetadataIds"]
+
+
+def test_export_payload_uses_the_later_of_checkpoint_and_schema_start():
+    plan = plan_with_import_ids(start_date="2024-02-01", end_date="2024-03-01")
+    assert build_export_payload(plan)["startDate"] == "2024-02-01T00:00:00Z"
+    assert build_export_payload(plan, start_date="2024-01-10T08:00:00Z")["startDate"] == "2024-02-01T00:00:00Z"
+    payload = build_export_payload(plan, start_date="2024-02-10T08:00:00Z", allow_continuation=True)
+    assert payload["startDate"] == "2024-02-10T08:00:00Z"
+    assert payload["endDate"] == "2024-03-01T00:00:00Z"
+    assert payload["allowContinuation"] is True
+
+
+def test_export_payload_with_a_continuation_token_has_no_date_range():
+    payload = build_export_payload(plan_with_import_ids(start_date="2024-02-01"), continuation_token="CT_1",
+                                   start_date="2024-02-10T08:00:00Z", allow_continuation=True)
+    assert payload["continuationToken"] == "CT_1"
+    assert not {"startDate", "endDate", "allowContinuation"} & set(payload)
+
+
+def test_json_export_format_needs_import_ids(monkeypatch):
+    monkeypatch.setattr(config, "EXPORT_FORMAT", "json")
+    assert build_export_payload(plan_with_import_ids())["format"] == "json"
+    with pytest.raises(ValueError, match="needs an import_id"):
+        build_export_payload(default_plan())
+
+
+@pytest.mark.parametrize("elapsed, percent, expected", [
+    (0, 0, 1.0),        # nothing to extrapolate from yet
+    (10, 0, 1.0),
+    (10, 50, 5.0),      # half of the 10s estimated to remain
+    (10, 99, 1.0),      # never below the minimum
+    (10, 1, 30.0),      # never above the maximum
+])
+def test_next_poll_interval(elapsed, percent, expected):
+    assert next_poll_interval(elapsed, percent, min_interval=1.0, max_interval=30.0) == pytest.approx(expected)
+
+
+@pytest.fixture
+def poll_every_second(monkeypatch):
+    monkeypatch.setattr(qualtrics_api, "EXPORT_POLL_MIN_INTERVAL", 1.0)
+    monkeypatch.setattr(qualtrics_api, "EXPORT_POLL_MAX_INTERVAL", 1.0)
+    monkeypatch.setattr(qualtrics_api, "EXPORT_POLL_TIMEOUT", 1.6)
+
+
+def test_an_export_finishing_just_before_the_deadline_is_polled_once_more(monkeypatch, poll_every_second):
+    with FakeQualtrics(100, export_seconds=1.2) as fake:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", fake.base_url)
+        result = wait_for_export("SV_1", initiate_export("SV_1", {"format": "csv"}))
+    assert result["status"] == "complete"
+    assert fake.requests["progress"] == 2
+
+
+def test_an_export_still_running_at_the_deadline_times_out(monkeypatch, poll_every_second):
+    with FakeQualtrics(100, export_seconds=5) as fake:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", fake.base_url)
+        with pytest.raises(TimeoutError):
+            wait_for_export("SV_1", initiate_export("SV_1", {"format": "csv"}))
+    assert fake.requests["progress"] == 2
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_iter_export_file_resumes_after_the_connection_is_cut(monkeypatch, ranges):
+    with FakeQualtrics(8_000, ranges=ranges, cut_after=300_000, cuts=2) as fake:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", fake.base_url)
+        data = b"".join(iter_export_file("SV_1", "ES_1-file"))
+    assert data == fake.export_zip()
+    assert fake.requests["file"] == 3
+    if ranges:
+        # Only the bytes after the last whole block read are sent again
+        assert fake.requests["file_bytes"] < len(data) + 2 * 256 * 1024
+
+
+def test_iter_export_file_gives_up_after_repeated_stalls(monkeypatch):
+    monkeypatch.setattr(config, "DOWNLOAD_MAX_STALLS", 1)
+    monkeypatch.setattr(config, "HTTP_BACKOFF_BASE", 0)
+    with FakeQualtrics(2_000, cut_after=0) as fake:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", fake.base_url)
+        with pytest.raises(IOError, match="stalled at byte 0"):
+            b"".join(iter_export_file("SV_1", "ES_1-file"))
+
+
+def test_download_continues_a_partial_file_from_an_earlier_run(monkeypatch, tmp_config):
+    with FakeQualtrics(2_000) as fake:
+        monkeypatch.setattr(config, "QUALTRICS_BASE_URL", fake.base_url)
+        data = fake.export_zip()
+        os.makedirs(config.EXPORT_DOWNLOAD_DIR)
+        with open(os.path.join(config.EXPORT_DOWNLOAD_DIR, "SV_1_ES_1-file.zip.part"), "wb") as f:
+            f.write(data[:100_000])
+        with download_export_file("SV_1", "ES_1-file") as zip_file:
+            assert zip_file.read() == data
+    assert fake.requests["file_bytes"] == len(data) - 100_000
+    assert not os.listdir(config.EXPORT_DOWNLOAD_DIR)
+
+
+@pytest.mark.parametrize("fmt", ["json", "ndjson"])
+def test_json_exports_clean_to_the_same_frame_as_csv(monkeypatch, fmt):
+    raw, plan = make_raw_export(1_000), plan_with_import_ids()
+    expected = clean_dataframe(read_export(io.BytesIO(zip_export(raw, "csv")), plan), plan, has_header_rows=False)
+    monkeypatch.setattr(config, "EXPORT_FORMAT", fmt)
+    cleaned = clean_dataframe(read_export(io.BytesIO(zip_export(raw, fmt)), plan), plan, has_header_rows=False)
+    assert cleaned.equals(expected)
+
+
+def test_streamed_chunks_clean_to_the_same_frame_as_a_full_read():
+    data, plan = make_export_zip(2_500), default_plan()
+    expected = clean_dataframe(read_export(io.BytesIO(data), plan), plan, has_header_rows=False)
+    chunks = [clean_dataframe(chunk, plan, has_header_rows=False)
+              for chunk in read_export_chunks(io.BytesIO(data), 1_000, plan)]
+    assert [len(chunk) for chunk in chunks] == [1_000, 1_000, 500]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_a_malformed_code_in_a_later_chunk_is_reported_on_its_row():
+    raw, plan = make_raw_export(2_500), default_plan()
+    raw.loc[2 + 2_100, "Q5_3"] = "2.5x"
+    chunks = list(read_export_chunks(io.BytesIO(zip_export(raw)), 1_000, plan))
+    cleaned = clean_dataframe(chunks[2], plan, has_header_rows=False)
+    errors = cleaned[ERRORS_COLUMN].dropna()
+    assert list(errors.index) == [2_100]
+    assert errors[2_100].startswith("useful_discussion_boards=2.5x is not a valid Int64")
@@ -0,0 +1,64 @@
+import pytest
+from bigquery_uploader import build_merge_sql, build_partition_overwrite_sql, build_rollup_add_sql
+
+COLUMNS = ["response_id", "recorded_date", "progress_percent"]
+ROLLUP_COLUMNS = ["survey_id", "course_id", "response_date", "responses", "score_sum", "score_mean", "count_1"]
+
+
+def test_merge_upserts_the_latest_row_per_key():
+    sql = build_merge_sql("p.d.t", "p.d.t__staging", COLUMNS)
+    assert sql.startswith("DECLARE min_recorded_date DATETIME DEFAULT (SELECT MIN(recorded_date) FROM `p.d.t__staging`);")
+    assert "MERGE `p.d.t` T" in sql
+    assert "PARTITION BY `response_id` ORDER BY recorded_date DESC" in sql
+    assert "WHERE _row_number = 1" in sql
+    assert "ON T.`response_id` = S.`response_id` AND T.recorded_date >= min_recorded_date" in sql
+    # The key is matched on, never updated
+    assert "`response_id` = S.`response_id`," not in sql
+    assert "`recorded_date` = S.`recorded_date`,\n    `progress_percent` = S.`progress_percent`" in sql
+    assert ("WHEN NOT MATCHED THEN INSERT (`response_id`, `recorded_date`, `progress_percent`)\n"
+            "  VALUES (S.`response_id`, S.`recorded_date`, S.`progress_percent`);") in sql
+
+
+def test_merge_on_another_key():
+    sql = build_merge_sql("p.d.t", "p.d.t__staging", ["uid", "recorded_date"], key="uid")
+    assert "PARTITION BY `uid`" in sql and "ON T.`uid` = S.`uid`" in sql
+
+
+def test_partition_overwrite_replaces_the_batch_days_in_one_transaction():
+    sql = build_partition_overwrite_sql("p.d.t", "p.d.t__staging", COLUMNS)
+    assert sql.splitlines() == [
+        "BEGIN TRANSACTION;",
+        "DELETE FROM `p.d.t`",
+        "WHERE DATE(recorded_date) IN (SELECT DISTINCT DATE(recorded_date) FROM `p.d.t__staging`);",
+        "INSERT INTO `p.d.t` (`response_id`, `recorded_date`, `progress_percent`)",
+        "SELECT `response_id`, `recorded_date`, `progress_percent` FROM `p.d.t__staging`;",
+        "COMMIT TRANSACTION;",
+    ]
+
+
+def test_rollup_add_sums_measures_and_matches_on_the_other_columns():
+    sql = build_rollup_add_sql("p.d.t_rollups", "p.d.t_rollups__staging", ROLLUP_COLUMNS, "abc123")
+    assert ("ON T.`survey_id` IS NOT DISTINCT FROM S.`survey_id` AND T.`course_id` IS NOT DISTINCT FROM S.`course_id` "
+            "AND T.`response_date` IS NOT DISTINCT FROM S.`response_date` AND T.response_date >= min_response_date") in sql
+    for col in ("responses", "score_sum", "count_1"):
+        assert f"`{col}` = T.`{col}` + S.`{col}`" in sql
+    assert "`score_mean` = T." not in sql
+    assert "score_mean = SAFE_DIVIDE(T.score_sum + S.score_sum, T.responses + S.responses)" in sql
+    assert f"INSERT ({', '.join(f'`{col}`' for col in ROLLUP_COLUMNS)})" in sql
+    assert "SAFE_DIVIDE(SUM(score_sum), SUM(responses)) AS score_mean" in sql
+
+
+def test_rollup_add_takes_out_what_an_earlier_attempt_at_the_same_load_added():
+    sql = build_rollup_add_sql("p.d.t_rollups", "p.d.t_rollups__staging", ROLLUP_COLUMNS, "abc123")
+    ledger = "`p.d.t_rollups__applied_loads`"
+    assert (f"SELECT `survey_id`, `course_id`, `response_date`, -`responses` AS `responses`, "
+            f"-`score_sum` AS `score_sum`, -`count_1` AS `count_1` FROM {ledger} WHERE load_id = 'abc123'") in sql
+    assert "WHEN MATCHED AND T.responses + S.responses = 0 THEN DELETE" in sql
+    # The ledger is rewritten with this load in the same transaction as the merge
+    assert sql.index("MERGE") < sql.index(f"DELETE FROM {ledger}") < sql.index(f"INSERT INTO {ledger}")
+    assert sql.index("BEGIN TRANSACTION;") < sql.index("MERGE") and sql.endswith("COMMIT TRANSACTION;")
+
+
+def test_rollup_add_rejects_a_load_id_that_is_not_a_plain_token():
+    with pytest.raises(ValueError, match="Invalid rollup load id"):
+        build_rollup_add_sql("p.d.t_rollups", "p.d.t_rollups__staging", ROLLUP_COLUMNS, "x' OR TRUE --")
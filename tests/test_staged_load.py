@@ -0,0 +1,60 @@
+import functools
+import io
+import pytest
+import bigquery_uploader
+import config
+import pipeline
+from schema_registry import default_plan
+from validator import DataQualityError
+from benchmarks.synthetic_export import make_export_zip, make_raw_export, zip_export
+
+DESTINATION = [{"project_id": "p", "dataset_id": "d", "table_id": "t", "credentials_path": None}]
+
+
+@pytest.fixture
+def streaming(monkeypatch, fake_bigquery):
+    monkeypatch.setattr(config, "STREAM_CHUNK_ROWS", 1_000)
+    monkeypatch.setattr(config, "VALIDATE_DATA", False)
+    monkeypatch.setattr(pipeline, "upload_to_destinations",
+                        functools.partial(bigquery_uploader.upload_to_destinations, write_mode="partition_overwrite"))
+    return fake_bigquery
+
+
+def test_streaming_chunks_reach_the_target_in_one_statement(streaming):
+    pipeline.load_streaming_export("SV_1", io.BytesIO(make_export_zip(3_500)), default_plan(), DESTINATION)
+
+    loads = [call[1] for call in streaming.calls if call[0] == "load"]
+    queries = [call[1] for call in streaming.calls if call[0] == "query"]
+    assert len(loads) == 4 and all("__staging_" in ref for ref in loads)
+    assert len(set(loads)) == 1
+    assert len(queries) == 1 and "DELETE FROM `p.d.t`" in queries[0] and loads[0] in queries[0]
+    assert streaming.calls[-1] == ("delete", loads[0])
+
+
+def test_failed_chunk_leaves_the_target_untouched(streaming):
+    streaming.fail_on_load = 3
+    with pytest.raises(RuntimeError):
+        pipeline.load_streaming_export("SV_1", io.BytesIO(make_export_zip(3_500)), default_plan(), DESTINATION)
+
+    assert not [call for call in streaming.calls if call[0] == "query"]
+    staging = [call[1] for call in streaming.calls if call[0] == "load"][0]
+    assert streaming.calls[-1] == ("delete", staging)
+
+
+def test_null_rate_failure_in_a_later_chunk_leaves_the_target_untouched(streaming, monkeypatch):
+    monkeypatch.setattr(config, "VALIDATE_DATA", True)
+    raw = make_raw_export(3_500)
+    raw.loc[2 + 2_500, "RecordedDate"] = None  # recorded_date may not be null, in the third chunk
+    with pytest.raises(DataQualityError):
+        pipeline.load_streaming_export("SV_1", io.BytesIO(zip_export(raw)), default_plan(), DESTINATION)
+
+    loads = [call[1] for call in streaming.calls if call[0] == "load"]
+    assert len(loads) == 2
+    assert not [call for call in streaming.calls if call[0] == "query"]
+    assert streaming.calls[-1] == ("delete", loads[0])
+
+
+def test_append_with_write_truncate_replaces_the_target_once():
+    sql = bigquery_uploader.build_append_sql("p.d.t", "p.d.t__staging_1", ["a", "b"], truncate=True)
+    assert "DELETE FROM `p.d.t` WHERE TRUE" in sql
+    assert "INSERT INTO `p.d.t` (`a`, `b`)\nSELECT `a`, `b` FROM `p.d.t__staging_1`" in sql
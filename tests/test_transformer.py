@@ -0,0 +1,66 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+from bigquery_uploader import write_parquet
+from schema_registry import default_plan
+from transformer import clean_dataframe, clean_dataframe_parallel
+from benchmarks.bench_compact import assert_equivalent
+from benchmarks.synthetic_export import make_raw_export
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return make_raw_export(2_000)
+
+
+LABEL_COLUMNS = {spec.target for spec in default_plan().label_specs}
+
+
+def write_table(df: pd.DataFrame) -> pa.Table:
+    buffer = io.BytesIO()
+    write_parquet(df, buffer, LABEL_COLUMNS)
+    buffer.seek(0)
+    return pq.read_table(buffer)
+
+
+def parquet_round_trip(df: pd.DataFrame) -> pa.Table:
+    table = write_table(df)
+    # Compare label columns by value, whether they were written dictionary encoded or not
+    columns = [pc.cast(col, col.type.value_type) if pa.types.is_dictionary(col.type) else col for col in table.columns]
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def test_parallel_transform_matches_serial(raw):
+    serial = clean_dataframe(raw, default_plan(), compact=False)
+    parallel = clean_dataframe_parallel(raw, default_plan(), workers=2, compact=False)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_compact_output_holds_the_same_values(raw):
+    default = clean_dataframe(raw, default_plan(), compact=False)
+    compact = clean_dataframe(raw, default_plan(), compact=True)
+    assert_equivalent(default, compact)
+    assert compact.memory_usage(deep=True).sum() < default.memory_usage(deep=True).sum() / 2
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_label_columns_are_written_dictionary_encoded(raw, compact):
+    table = write_table(clean_dataframe(raw, default_plan(), compact=compact))
+    for col in ("satisfaction_course_rating_label", "willing_followup_call"):
+        assert pa.types.is_dictionary(table.schema.field(col).type), col
+    assert not pa.types.is_dictionary(table.schema.field("course_id").type)
+
+
+def test_compact_and_default_output_write_the_same_parquet(raw):
+    default = parquet_round_trip(clean_dataframe(raw, default_plan(), compact=False))
+    compact = parquet_round_trip(clean_dataframe(raw, default_plan(), compact=True))
+    assert default.schema.equals(compact.schema)
+    assert default.equals(compact)
+    assert default.schema.field("progress_percent").type == pa.int64()
+    assert default.schema.field("recorded_date").type == pa.timestamp("us")
+    # 'nan' text left by astype(str) is written as a real null
+    assert default.column("course_id").null_count > 0
+    assert "nan" not in default.column("course_id").to_pylist()
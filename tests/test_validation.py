@@ -0,0 +1,22 @@
+import pandas as pd
+from benchmarks.synthetic_export import make_raw_export
+from schema_registry import default_plan
+from transformer import clean_dataframe
+from validator import ERRORS_COLUMN, validate_frame
+
+
+def test_failed_cast_quarantines_rows_with_a_value(monkeypatch):
+    plan = default_plan()
+    raw = make_raw_export(20)
+
+    def broken_to_datetime(*args, **kwargs):
+        raise ValueError("unsupported format")
+
+    monkeypatch.setattr(pd, "to_datetime", broken_to_datetime)
+    cleaned = clean_dataframe(raw, plan)
+    monkeypatch.undo()
+
+    valid, quarantine = validate_frame(cleaned, plan)
+    assert len(valid) == 0 and len(quarantine) == 20
+    assert str(quarantine["start_date"].dtype) == "datetime64[ns]" and quarantine["start_date"].isna().all()
+    assert quarantine[ERRORS_COLUMN].str.match(r"start_date=\S+ \S+ is not a valid datetime").all()
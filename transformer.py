@@ -1,101 +1,180 @@
 import pandas as pd
-from typing import Dict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional
 import numpy as np
-from column_datatype_mapping import COLUMN_TYPE_MAPPING  # Import your mapping
-
-
-def clean_dataframe(df: pd.DataFrame, col_mapping: Dict[str, str]) -> pd.DataFrame:
-
-    # Step 1: Rename columns and drop top 2 rows
-    df = df.rename(columns=col_mapping)
-    df = df.iloc[2:].reset_index(drop=True)
-
-     # Step 2: Enforce datatypes using COLUMN_TYPE_MAPPING
-    # Step 2: Enforce datatypes using COLUMN_TYPE_MAPPING
-    for col, dtype in COLUMN_TYPE_MAPPING.items():
-        if col in df.columns:
-            try:
-                if "datetime" in str(dtype):
-                    df[col] = pd.to_datetime(df[col], errors="coerce")
-
-                elif dtype == "Int64":
-                    df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
-                elif dtype == str:
-                    df[col] = df[col].astype(str)
-                else:
-                    df[col] = df[col].astype(dtype)
-
-            except Exception as e:
-                print(f"⚠️ Failed to cast column '{col}' to {dtype}: {e}")
-
-    # Step 3: Label mapping
-    satisfaction_map = {
-        '1': 'Highly Dissatisfied', '2': 'Dissatisfied', '3': 'Neither Satisfied nor Dissatisfied',
-        '4': 'Satisfied', '5': 'Highly Satisfied'
-    }
-    df["satisfaction_course_rating_label"] = df["satisfaction_course_rating"].apply(
-        lambda x: satisfaction_map.get(str(int(x))) if pd.notnull(x) else np.nan
-    )
-
-    recommendation_map = {
-        '1': 'Highly Unlikely', '2': 'Unlikely', '3': 'Neither Likely nor Unlikely',
-        '4': 'Likely', '5': 'Highly Likely'
-    }
-    df["recommendation_rating_label"] = df["recommendation_rating"].apply(
-        lambda x: recommendation_map.get(str(int(x))) if pd.notnull(x) else np.nan
-    )
-
-    usefulness_map = {
-        '1': 'Not at all Useful', '2': 'Not very Useful', '3': 'Neutral',
-        '4': 'Moderately Useful', '5': 'Extremely Useful'
-    }
-    usefulness_columns = {
-        "useful_video_lectures": "useful_video_lectures_label",
-        "useful_reading_materials": "useful_reading_materials_label",
-        "useful_discussion_boards": "useful_discussion_boards_label",
-        "useful_interactive_tools": "useful_interactive_tools_label",
-        "useful_projects": "useful_projects_label",
-        "useful_reflection_journaling": "useful_reflection_journaling_label",
-        "useful_engagement": "useful_engagement_label"
-    }
-    for src, tgt in usefulness_columns.items():
-        df[tgt] = df[src].apply(
-            lambda x: usefulness_map.get(str(int(x))) if pd.notnull(x) else np.nan
-        )
-
-    agree_standard = {
-        '1': 'Strongly Disagree', '2': 'Disagree', '3': 'Neither Agree nor Disagree',
-        '4': 'Agree', '5': 'Strongly Agree'
-    }
-    agree_reversed = {
-        '1': 'Strongly Agree', '2': 'Agree', '3': 'Neither Agree nor Disagree',
-        '4': 'Disagree', '5': 'Strongly Disagree'
-    }
-
-    cutoff = pd.to_datetime("2024-01-09")
-    def conditional_likert(row, col):
-        val = row[col]
-        if pd.isnull(val):
-            return np.nan
-        return agree_standard[str(int(val))] if row["recorded_date"] >= cutoff else agree_reversed[str(int(val))]
-
-    for col in [
-        "agree_content_useful_for_education",
-        "agree_content_relevant_to_career",
-        "agree_workload_reasonable",
-        "agree_deadlines_reasonable",
-        "agree_content_relevant_to_personal_experience",
-        "agree_assessments_alignment_with_course"
-    ]:
-        df[f"{col}_label"] = df.apply(lambda row: conditional_likert(row, col), axis=1)
-
-    # Binary columns
-    binary_map = {'1': 'Yes', '2': 'No'}
-    df["willing_followup_call"] = df["willing_followup_call"].apply(
-        lambda x: binary_map.get(str(int(x))) if pd.notnull(x) else np.nan
-    )
-    df["is_18_or_older"] = df["is_18_or_older"].apply(
-        lambda x: binary_map.get(str(int(x))) if pd.notnull(x) else np.nan
-    )
-
-    return df
\ No newline at end of file
+from instrumentation import stage
+from config import COMPACT_OUTPUT
+from logger import setup_logger
+from schema_registry import TransformPlan
+from validator import ERRORS_COLUMN, Check, join_errors
+
+log = setup_logger()
+
+# Prefix of the columns a JSON export parser adds with Qualtrics' own label for a coded column
+EXPORT_LABEL_PREFIX = "__export_label__"
+
+# What a column becomes when its cast fails, by declared dtype
+NULL_DTYPES = {"datetime": "datetime64[ns]", "Int64": "Int64", "str": object}
+
+
+def _smallest_int_dtype(series: pd.Series) -> str:
+    low, high = series.min(), series.max()
+    if pd.isna(low):
+        return "Int8"
+    for dtype in ("Int8", "Int16", "Int32"):
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+    return "Int64"
+
+
+def _to_int(series: pd.Series) -> pd.Series:
+    """Nullable Int64 codes. Builds the masked array directly, which is several
+    times faster than .astype("Int64"); non-integral codes (e.g. 2.5) become null.
+    Codes read as text take numpy's float parse, several times faster than
+    pd.to_numeric, which only runs if some code is not a number."""
+    try:
+        numeric = series.astype("float64")
+    except (TypeError, ValueError):
+        numeric = pd.to_numeric(series, errors="coerce")
+    values = numeric.to_numpy(dtype="float64", na_value=np.nan)
+    missing = np.isnan(values)
+    whole = np.where(missing, 0, values)
+    data = whole.astype("int64")
+    mask = missing | (data != whole)
+    data[mask] = 0
+    return pd.Series(pd.arrays.IntegerArray(data, mask), index=series.index, name=series.name)
+
+
+def _to_compact_int(series: pd.Series) -> pd.Series:
+    series = _to_int(series)
+    return series.astype(_smallest_int_dtype(series))
+
+
+def enforce_column_types(df: pd.DataFrame, plan: TransformPlan, compact: bool = False,
+                         failures: Optional[List[Check]] = None) -> pd.DataFrame:
+    """Cast every column of the plan to its declared dtype.
+
+    With compact=True integer codes are downcast to the smallest nullable int
+    that holds them and text columns become Arrow-backed strings (missing
+    values stay missing instead of turning into 'nan'). Values the casts turn
+    into nulls are reported to `failures` as (row mask, message) checks; a
+    column whose cast fails outright is nulled, so all its values are.
+    """
+    casts = [
+        (plan.datetime_columns, lambda s: pd.to_datetime(s, errors="coerce"), "datetime"),
+        (plan.int_columns, _to_compact_int if compact else _to_int, "Int64"),
+        (plan.str_columns, (lambda s: s.astype("string[pyarrow]")) if compact else (lambda s: s.astype(str)), "str"),
+    ]
+    for columns, cast, dtype in casts:
+        for col in columns:
+            if col in df.columns:
+                before = df[col]
+                try:
+                    df[col] = cast(before)
+                except Exception as e:
+                    log.warning(f"⚠️ Failed to cast column '{col}' to {dtype}, nulling it: {e}")
+                    df[col] = pd.Series(None, index=df.index, dtype=NULL_DTYPES[dtype])
+                if failures is not None and dtype != "str":
+                    lost = before.notna().to_numpy() & df[col].isna().to_numpy()
+                    if lost.any():
+                        values = before[lost].astype(str).to_numpy(dtype=object)
+                        failures.append((lost, f"{col}=" + values + f" is not a valid {dtype}"))
+    return df
+
+
+def apply_label_specs(df: pd.DataFrame, plan: TransformPlan, compact: bool = False,
+                      failures: Optional[List[Check]] = None) -> pd.DataFrame:
+    """Add the human-readable label columns described by the plan's label specs.
+
+    Specs with a before_cutoff rule use the alternate label set for rows whose
+    date column is earlier than the cutoff. Where a JSON export supplied
+    Qualtrics' label for the column (EXPORT_LABEL_PREFIX + source), that label
+    is used instead. With compact=True each label column is an ordered
+    Categorical whose categories follow the code order of its label set. Codes
+    missing from the label set are reported to `failures`.
+    """
+    after_cutoff = {}
+    for spec in plan.label_specs:
+        exported = f"{EXPORT_LABEL_PREFIX}{spec.source}"
+        if exported in df.columns:
+            mapped = df[exported]
+        else:
+            mapped = df[spec.source].map(spec.labels)
+        if spec.before_cutoff is not None and exported not in df.columns:
+            date_column, cutoff, labels_before_cutoff = spec.before_cutoff
+            if (date_column, cutoff) not in after_cutoff:
+                after_cutoff[date_column, cutoff] = (df[date_column] >= cutoff).to_numpy()
+            mapped = pd.Series(
+                np.where(after_cutoff[date_column, cutoff], mapped, df[spec.source].map(labels_before_cutoff)),
+                index=df.index
+            )
+        if failures is not None:
+            codes = list(spec.labels) + (list(spec.before_cutoff[2]) if spec.before_cutoff else [])
+            unlabelled = (~df[spec.source].isin(codes)).to_numpy(dtype=bool, na_value=False) & df[spec.source].notna().to_numpy()
+            if unlabelled.any():
+                codes = df[spec.source][unlabelled].astype(str).to_numpy(dtype=object)
+                failures.append((unlabelled, f"{spec.source}=" + codes + " has no label"))
+        if compact:
+            categories = list(spec.labels.values())
+            if exported in df.columns:
+                # Qualtrics' wording may differ from the schema's; keep it rather than null it out
+                categories += [label for label in mapped.dropna().unique() if label not in spec.labels.values()]
+            mapped = pd.Categorical(mapped, categories=categories, ordered=True)
+        df[spec.target] = mapped
+    exported = [col for col in df.columns if col.startswith(EXPORT_LABEL_PREFIX)]
+    return df.drop(columns=exported) if exported else df
+
+
+def clean_dataframe(df: pd.DataFrame, plan: TransformPlan, has_header_rows: bool = True,
+                    compact: bool = COMPACT_OUTPUT) -> pd.DataFrame:
+    """Rename, type and label an export. Rows with values that could not be
+    cast or labelled carry a message in ERRORS_COLUMN for validate_frame."""
+    with stage("transform", profile=True) as record:
+        failures: List[Check] = []
+
+        # Step 1: Rename columns and drop top 2 rows (already skipped when streaming chunks)
+        df = df.rename(columns=plan.rename)
+        if has_header_rows:
+            df = df.iloc[2:].reset_index(drop=True)
+
+        # Step 2: Enforce the declared datatypes
+        df = enforce_column_types(df, plan, compact, failures)
+
+        # Step 3: Label mapping
+        df = apply_label_specs(df, plan, compact, failures)
+        if failures:
+            df[ERRORS_COLUMN] = join_errors(len(df), failures)
+        record["rows"] = len(df)
+    return df
+
+
+def clean_chunks_parallel(chunks: Iterable[pd.DataFrame], plan: TransformPlan, workers: int,
+                          compact: bool = COMPACT_OUTPUT) -> Iterator[pd.DataFrame]:
+    """Clean header-free row partitions in a process pool, yielding results in input order.
+
+    At most 2 x workers partitions are in flight, so a streamed CSV is never
+    read far ahead of the consumer.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(clean_dataframe, chunk, plan, False, compact))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def clean_dataframe_parallel(df: pd.DataFrame, plan: TransformPlan, workers: int,
+                             has_header_rows: bool = True, compact: bool = COMPACT_OUTPUT) -> pd.DataFrame:
+    """clean_dataframe over `workers` row partitions of df; output matches the serial version."""
+    if has_header_rows:
+        df = df.iloc[2:]
+    if workers <= 1 or len(df) < 2 * workers:
+        return clean_dataframe(df.reset_index(drop=True), plan, has_header_rows=False, compact=compact)
+    with stage("transform_parallel", workers=workers, rows=len(df)):
+        bounds = np.linspace(0, len(df), workers + 1, dtype=int)
+        partitions = (df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]))
+        return pd.concat(clean_chunks_parallel(partitions, plan, workers, compact), ignore_index=True)
@@ -0,0 +1,99 @@
+from typing import List, Tuple, Union
+import numpy as np
+import pandas as pd
+from instrumentation import stage
+from schema_registry import TransformPlan
+
+# Per-row problems found while cleaning and validating; null on rows that passed
+ERRORS_COLUMN = "dq_errors"
+
+Check = Tuple[np.ndarray, Union[str, np.ndarray]]
+
+
+class DataQualityError(ValueError):
+    """Raised when a batch as a whole breaks a data-quality threshold (e.g. too many nulls)."""
+
+
+def join_errors(n_rows: int, checks: List[Check]) -> np.ndarray:
+    """Combine (row mask, message) checks into one message per row, None where every check passed.
+
+    A message is either one string for all flagged rows or an array with one
+    entry per flagged row. Only flagged rows are touched, so the cost follows
+    the number of failures rather than the frame size.
+    """
+    messages = np.full(n_rows, None, dtype=object)
+    for mask, text in checks:
+        rows = np.flatnonzero(mask)
+        for i, message in zip(rows, np.broadcast_to(np.asarray(text, dtype=object), rows.shape)):
+            messages[i] = message if messages[i] is None else f"{messages[i]}; {message}"
+    return messages
+
+
+def _null_mask(series: pd.Series) -> np.ndarray:
+    null = series.isna().to_numpy()
+    if series.dtype == object:
+        # astype(str) leaves missing text as the string 'nan'
+        null |= (series == "nan").to_numpy()
+    return null
+
+
+def validate_frame(df: pd.DataFrame, plan: TransformPlan) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Run the plan's data-quality rules over a cleaned frame in one vectorized pass.
+
+    Rows that failed a cast or label lookup during cleaning, fall outside a
+    column's range, have start/end dates out of order or repeat a unique key
+    (the last occurrence is kept) are split off into a quarantine frame with
+    an ERRORS_COLUMN explaining why. Null-rate thresholds are checked on the
+    remaining rows and raise DataQualityError, since they describe the batch
+    rather than any one row. Returns (valid rows, quarantined rows).
+    """
+    rules = plan.validation
+    with stage("validate", rows=len(df)) as record:
+        checks: List[Check] = []
+        if ERRORS_COLUMN in df.columns:
+            cleaning_errors = df.pop(ERRORS_COLUMN).to_numpy()
+            mask = pd.notna(cleaning_errors)
+            checks.append((mask, cleaning_errors[mask]))
+
+        for col, (low, high) in rules.ranges.items():
+            if col not in df.columns:
+                continue
+            values = df[col]
+            out_of_range = np.zeros(len(df), dtype=bool)
+            if low is not None:
+                out_of_range |= (values < low).to_numpy(dtype=bool, na_value=False)
+            if high is not None:
+                out_of_range |= (values > high).to_numpy(dtype=bool, na_value=False)
+            checks.append((out_of_range, f"{col}=" + values[out_of_range].astype(str).to_numpy(dtype=object)
+                           + f" outside [{low}, {high}]"))
+
+        for first, second in rules.date_order:
+            if first in df.columns and second in df.columns:
+                checks.append(((df[first] > df[second]).to_numpy(), f"{first} after {second}"))
+
+        nulls = {col: _null_mask(df[col]) for col in {*rules.unique, *rules.max_null_rates} if col in df.columns}
+        for col in rules.unique:
+            if col in df.columns:
+                duplicate = df[col].duplicated(keep="last").to_numpy() & ~nulls[col]
+                checks.append((duplicate, f"duplicate {col}"))
+
+        bad = np.zeros(len(df), dtype=bool)
+        for mask, _ in checks:
+            bad |= mask
+        if bad.any():
+            # Row selection keeps the original index; no reset, which would copy the frame again
+            quarantine = df[bad].assign(**{ERRORS_COLUMN: join_errors(len(df), checks)[bad]})
+            df = df[~bad]
+        else:
+            quarantine = df.iloc[:0].assign(**{ERRORS_COLUMN: pd.Series(dtype=object)})
+        record["quarantined"] = int(bad.sum())
+
+        too_sparse = {}
+        for col, max_rate in rules.max_null_rates.items():
+            null_rate = float(nulls[col][~bad].mean()) if col in nulls and len(df) else 0.0
+            if null_rate > max_rate:
+                too_sparse[col] = round(null_rate, 4)
+    if too_sparse:
+        raise DataQualityError(f"Null rate above threshold for {too_sparse} "
+                               f"(limits: { {col: rules.max_null_rates[col] for col in too_sparse} })")
+    return df, quarantine